@@ -0,0 +1,279 @@
+#!/usr/bin/env python
+"""batch_scheduler.py — run a conversion batch as a resource-aware dependency graph
+
+The batch front ends used to walk every model strictly in sequence (FP8,
+GGUF prep, each quant, upload, cleanup), so the CPU idled during uploads and
+the network idled during quantization. Here each step is a `Task` with
+
+* ``requires`` — tasks that must have finished DONE (a failed, skipped or
+  cancelled requirement skips the task),
+* ``after``    — tasks that only have to be finished, whatever their outcome,
+* ``needs``    — amounts of the ``cpu`` (cores), ``ram`` (bytes), ``disk``
+  (concurrent heavy-I/O streams) and ``net`` (concurrent uploads) budgets,
+* ``lock``     — a name; tasks sharing it never run at the same time,
+* ``space``    — bytes the task leaves on disk (its predicted output), held
+  from its start until a task listing it in ``frees`` finishes DONE,
+* ``scratch``  — bytes of disk it needs only while running,
+* ``where``    — a directory on the disk its output goes to,
+
+and `Scheduler.run` starts every ready task whose needs fit in what is left
+of the budgets, so independent steps of different models overlap. A task
+needing more than a whole budget still runs, alone; so does a task over the
+*disk_budget* once nothing else runs that could free space for it.
+
+A task with a disk need also waits until its disk really has that much free
+space beyond what the running tasks are still to write. A task failing with
+``ENOSPC`` (or returning ``DISK_FULL``) is put back to wait the same way,
+asking for more headroom each time, so a full disk pauses the batch
+(``WAIT_DISK``) instead of failing it; freeing space resumes it.
+
+Every state change is reported as *on_state(task, cell, state)* for each of
+the task's progress-grid ``cells``; a cell keeps the first final state it
+gets, so a skipped follow-up step can't hide the error before it.
+"""
+
+import errno
+import logging
+import os
+import shutil
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+
+FINAL_STATES = ("DONE", "ERROR", "SKIP", "CANCEL")
+DISK_FULL = "DISK_FULL"
+RESOURCES = ("cpu", "ram", "disk", "net")
+# How often (seconds) a waiting scheduler re-checks its should_stop callback
+_POLL = 0.5
+# An external tool that failed with less than this free on its output disk most likely ran out of it
+_LOW_SPACE = 512 << 20
+
+
+def total_ram() -> int:
+    """Physical memory in bytes; 16 GiB when it can't be determined."""
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (AttributeError, ValueError, OSError):
+        pass
+    try:
+        import psutil
+        return psutil.virtual_memory().total
+    except ImportError:
+        return 16 << 30
+
+
+def available_ram() -> int:
+    """Memory in bytes available to new processes without swapping; half of `total_ram` when unknown."""
+    try:
+        import psutil
+        return psutil.virtual_memory().available
+    except ImportError:
+        pass
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return total_ram() // 2
+
+
+def free_bytes(path: str) -> int:
+    """Free space on the disk holding *path* (or its nearest existing parent)."""
+    path = os.path.abspath(path)
+    while not os.path.exists(path) and os.path.dirname(path) != path:
+        path = os.path.dirname(path)
+    return shutil.disk_usage(path).free
+
+
+def raise_if_disk_full(path: str) -> None:
+    """After an external tool failed writing to *path*: raise ENOSPC if its disk is (nearly) full.
+
+    A task raising it waits for free space and runs again instead of failing.
+    """
+    if free_bytes(path) < _LOW_SPACE:
+        raise OSError(errno.ENOSPC, os.strerror(errno.ENOSPC), path)
+
+
+def default_budgets(*, ram_fraction: float = 0.8, disk_streams: int = 2, uploads: int = 1) -> dict:
+    return {"cpu": os.cpu_count() or 1, "ram": int(total_ram() * ram_fraction), "disk": disk_streams, "net": uploads}
+
+
+@dataclass
+class Task:
+    key: str
+    fn: object                          # () -> True / None (DONE), False (ERROR) or a state name
+    needs: dict = field(default_factory=dict)
+    requires: list = field(default_factory=list)
+    after: list = field(default_factory=list)
+    lock: str | None = None
+    cells: list = field(default_factory=list)   # [(model, step)] of the progress grid
+    report_done: bool = True            # False when a later task finishes the same cells
+    space: int = 0
+    scratch: int = 0
+    frees: list = field(default_factory=list)
+    where: str | None = None
+    state: str = "PENDING"
+
+    @property
+    def disk(self) -> int:
+        return self.space + self.scratch
+
+
+class Scheduler:
+    def __init__(self, budgets: dict | None = None, *, disk_budget: int | None = None, on_state=None, should_stop=None):
+        self.budgets = dict(default_budgets(), **(budgets or {}))
+        self.disk_budget = disk_budget
+        self.on_state = on_state
+        self.should_stop = should_stop
+        self.tasks = {}
+        self._used = dict.fromkeys(RESOURCES, 0)
+        self._locks = set()
+        self._final_cells = set()
+        self._held = {}         # key -> space of started tasks not freed yet
+        self._writing = {}      # key -> disk of running tasks
+        self._waiting = set()   # keys reported WAIT_DISK
+
+    def add(self, key: str, fn, **kw) -> Task:
+        if key in self.tasks:
+            raise ValueError(f"Duplicate task '{key}'")
+        for dep in [*kw.get("requires", ()), *kw.get("after", ()), *kw.get("frees", ())]:
+            if dep not in self.tasks:
+                raise ValueError(f"Task '{key}' depends on unknown task '{dep}'")
+        task = self.tasks[key] = Task(key, fn, **kw)
+        return task
+
+    def _set(self, task: Task, state: str) -> None:
+        task.state = state
+        if not self.on_state or (state == "DONE" and not task.report_done):
+            return
+        for cell in task.cells:
+            if cell in self._final_cells:
+                continue
+            if state in FINAL_STATES:
+                self._final_cells.add(cell)
+            self.on_state(task, cell, state)
+
+    def _fits(self, task: Task, *, over_disk_budget: bool = False) -> bool:
+        if task.lock and task.lock in self._locks:
+            return False
+        # Only the first task may overshoot a budget, so an oversized one still runs (alone)
+        if not all(not self._used[r] or self._used[r] + n <= self.budgets[r] for r, n in task.needs.items()):
+            return False
+        if not task.disk:
+            return True
+        used = sum(self._held.values()) + sum(self._writing.values()) - sum(self._held.get(k, 0) for k in self._writing)
+        if self.disk_budget is not None and used + task.disk > self.disk_budget and not over_disk_budget:
+            return False
+        if task.where and free_bytes(task.where) < task.disk + sum(self._writing.values()):
+            if task.key not in self._waiting:
+                self._waiting.add(task.key)
+                logging.warning(f"{task.key}: waiting for {task.disk / 2**30:.1f} GiB free on {task.where}")
+                self._set(task, "WAIT_DISK")
+            return False
+        return True
+
+    def _claim(self, task: Task, sign: int) -> None:
+        for r, n in task.needs.items():
+            self._used[r] += sign * n
+        if task.lock:
+            (self._locks.add if sign > 0 else self._locks.discard)(task.lock)
+        if sign > 0:
+            self._waiting.discard(task.key)
+            if task.disk:
+                self._writing[task.key] = task.disk
+                self._held[task.key] = task.space
+        else:
+            self._writing.pop(task.key, None)
+
+    def _finish(self, task: Task, state: str) -> None:
+        """Settle the disk claims of a finished *task*: its output stays held only if DONE."""
+        if state != "DONE":
+            self._held.pop(task.key, None)
+            return
+        for key in task.frees:
+            self._held.pop(key, None)
+
+    def _blocked(self, task: Task) -> str | None:
+        """The state *task* ends in without running, or None while it may still run."""
+        for dep in task.requires:
+            state = self.tasks[dep].state
+            if state == "CANCEL": return "CANCEL"
+            if state in ("ERROR", "SKIP"): return "SKIP"
+        return None
+
+    def _ready(self, task: Task) -> bool:
+        return (all(self.tasks[d].state == "DONE" for d in task.requires)
+                and all(self.tasks[d].state in FINAL_STATES for d in task.after))
+
+    @staticmethod
+    def _call(task: Task) -> str:
+        try:
+            result = task.fn()
+        except OSError as e:
+            if e.errno != errno.ENOSPC:
+                logging.exception(f"{task.key}: {e}")
+                return "ERROR"
+            return DISK_FULL
+        except Exception as e:
+            logging.exception(f"{task.key}: {e}")
+            return "ERROR"
+        if result is None or result is True: return "DONE"
+        if result is False: return "ERROR"
+        return result
+
+    def run(self) -> dict:
+        """Run every task; returns ``{key: final state}``."""
+        pending = list(self.tasks.values())
+        running = {}
+        with ThreadPoolExecutor(max_workers=max(1, len(pending))) as pool:
+            while pending or running:
+                stop = bool(self.should_stop and self.should_stop())
+                progressed = True
+                over_disk_budget = False
+                while progressed:
+                    progressed = False
+                    for task in list(pending):
+                        state = "CANCEL" if stop else self._blocked(task)
+                        if state:
+                            pending.remove(task)
+                            self._waiting.discard(task.key)
+                            self._set(task, state)
+                            progressed = True
+                        elif self._ready(task) and self._fits(task, over_disk_budget=over_disk_budget):
+                            if over_disk_budget:
+                                logging.warning(f"{task.key}: over the disk budget, running it alone")
+                            pending.remove(task)
+                            self._claim(task, +1)
+                            self._set(task, "RUNNING")
+                            running[pool.submit(self._call, task)] = task
+                            progressed = True
+                            over_disk_budget = False
+                    # Nothing runs that could free space: admit one task over the disk budget
+                    if not progressed and not running and pending and not over_disk_budget:
+                        progressed = over_disk_budget = True
+                if not running:
+                    if not pending:
+                        break
+                    if self._waiting:  # paused on a full disk until space is freed (or stop)
+                        time.sleep(_POLL)
+                        continue
+                    for task in pending: self._set(task, "SKIP")  # unreachable with a valid graph
+                    break
+                done, _ = wait(running, timeout=_POLL, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    task = running.pop(fut)
+                    self._claim(task, -1)
+                    state = fut.result()
+                    self._finish(task, state)
+                    if state == DISK_FULL and not stop:
+                        # Back in line, asking for more headroom so an underestimate can't loop
+                        task.scratch += max(task.space, 1 << 30)
+                        logging.warning(f"{task.key}: disk full, paused until space is freed")
+                        self._waiting.add(task.key)
+                        self._set(task, "WAIT_DISK")
+                        pending.append(task)
+                        continue
+                    self._set(task, "ERROR" if state == DISK_FULL else state)
+        return {key: task.state for key, task in self.tasks.items()}
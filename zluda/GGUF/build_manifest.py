@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+"""build_manifest.py — per-output build records, so reruns skip what is already up to date
+
+A rerun used to regenerate every output (the CLI only reused an existing
+``-CONVERT.gguf``). Each output now gets a record in a ``.manifest`` folder
+next to it with everything that decides its bytes:
+
+* the source fingerprint — per shard its size, mtime and a hash of its
+  first and last MiB (the header and the tail of the data), so a 20 GB
+  source is fingerprinted without reading it,
+* the target (quant type, ``CONVERT``) and its conversion parameters,
+* the tools — a hash of the converter sources (these modules plus
+  ``convert.py`` / ``fix_5d_tensors.py``) and, for llama-quantize levels, of
+  the llama-quantize binary,
+* the output's size, mtime and SHA-256 (the hash the Hub keeps for LFS files).
+
+`Manifest.status` then says whether an output is current locally (the
+record matches and the file is unchanged) or on the Hub (the record matches
+and the remote file's LFS SHA-256 is the recorded one), so a batch only
+schedules the missing steps: adding a quant level to a converted batch only
+runs that level.
+
+    python build_manifest.py --dir output/MyModel     # list the records and whether their files are intact
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from functools import lru_cache
+
+from safetensors_stream import shard_paths
+
+MANIFEST_DIR = ".manifest"
+# Bytes hashed at each end of a source file for its fingerprint
+_EDGE_BYTES = 1 << 20
+# The modules whose code decides the bytes of an output, next to this file
+_CONVERTER_MODULES = ("conversion_plan.py", "direct_gguf.py", "dequantize_fp8v2.py", "fp8_engine.py",
+                      "quant_policy.py", "safetensors_stream.py")
+# Scripts run from the working directory
+_CONVERTER_SCRIPTS = ("convert.py", "fix_5d_tensors.py")
+
+
+def manifest_path(output: str) -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(output)), MANIFEST_DIR, os.path.basename(output) + ".json")
+
+
+def _edge_digest(path: str, size: int) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        h.update(f.read(_EDGE_BYTES))
+        if size > 2 * _EDGE_BYTES:
+            f.seek(size - _EDGE_BYTES)
+            h.update(f.read(_EDGE_BYTES))
+    return h.hexdigest()
+
+
+def source_fingerprint(src: str) -> list[dict]:
+    """Fingerprint of *src* (all shards of an index), without reading more than 2 MiB per file."""
+    fp = []
+    for path in shard_paths(src):
+        st = os.stat(path)
+        fp.append({"name": os.path.basename(path), "size": st.st_size, "mtime_ns": st.st_mtime_ns,
+                   "edges": _edge_digest(path, st.st_size)})
+    return fp
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(16 << 20):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+@lru_cache(maxsize=None)
+def converter_version() -> str:
+    """Hash of the converter sources; any change to them rebuilds the outputs they made."""
+    h = hashlib.blake2b(digest_size=16)
+    here = os.path.dirname(os.path.abspath(__file__))
+    for path in [os.path.join(here, m) for m in _CONVERTER_MODULES] + list(_CONVERTER_SCRIPTS):
+        h.update(os.path.basename(path).encode())
+        try:
+            with open(path, "rb") as f: h.update(f.read())
+        except OSError:
+            h.update(b"-")
+    return h.hexdigest()
+
+
+@lru_cache(maxsize=None)
+def binary_sha256(cmd: str) -> str | None:
+    """SHA-256 of the executable *cmd* resolves to, or None if it can't be found."""
+    path = shutil.which(cmd) or (cmd if os.path.isfile(cmd) else None)
+    return file_sha256(path) if path else None
+
+
+def _atomic_write_json(path: str, data: dict) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+def read_record(output: str) -> dict | None:
+    try:
+        with open(manifest_path(output), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class RemoteFiles:
+    """LFS SHA-256 of the files in Hub repos, one `list_repo_tree` call per repo folder; thread-safe."""
+
+    def __init__(self, token: str | None = None):
+        self.token = token
+        self._trees = {}
+        self._lock = threading.Lock()
+
+    def _tree(self, repo_id: str, folder: str) -> dict:
+        with self._lock:
+            if (repo_id, folder) not in self._trees:
+                hashes = {}
+                try:
+                    from huggingface_hub import HfApi
+                    for entry in HfApi(token=self.token).list_repo_tree(repo_id, path_in_repo=folder or None,
+                                                                        recursive=True, expand=True):
+                        lfs = getattr(entry, "lfs", None)
+                        if lfs:
+                            hashes[entry.path] = lfs["sha256"] if isinstance(lfs, dict) else lfs.sha256
+                except Exception:
+                    pass  # offline, missing repo or folder: nothing counts as uploaded
+                self._trees[(repo_id, folder)] = hashes
+            return self._trees[(repo_id, folder)]
+
+    def sha256(self, repo_id: str, folder: str, filename: str) -> str | None:
+        """LFS SHA-256 of *filename* in *folder* of *repo_id*, or None if it isn't there."""
+        if not repo_id: return None
+        folder = folder.strip("/")
+        return self._tree(repo_id, folder).get(f"{folder}/{filename}" if folder else filename)
+
+
+class Manifest:
+    """Build records of the outputs made from source *src*; *quant_cmd* is the llama-quantize command."""
+
+    def __init__(self, src: str, quant_cmd: str | None = None):
+        self.src = src
+        self.quant_cmd = quant_cmd
+        try:
+            self.source = source_fingerprint(src)
+        except OSError:
+            self.source = None  # a missing source can't make anything current
+
+    def _expected(self, quant: str, params: dict | None) -> dict:
+        tools = {"converter": converter_version()}
+        if quant not in ("CONVERT", "F16", "BF16") and "FP8" not in quant:
+            tools["llama_quantize"] = binary_sha256(self.quant_cmd) if self.quant_cmd else None
+        return {"source": self.source, "quant": quant, "params": params or {}, "tools": tools}
+
+    def status(self, output: str, quant: str, params: dict | None = None, remote_sha256: str | None = None) -> str | None:
+        """``"remote"`` / ``"local"`` if *output* is up to date on the Hub / on disk, else None."""
+        rec = read_record(output)
+        if not rec or self.source is None or any(rec.get(k) != v for k, v in self._expected(quant, params).items()):
+            return None
+        if remote_sha256 and remote_sha256 == rec.get("sha256"):
+            return "remote"
+        try:
+            st = os.stat(output)
+        except OSError:
+            return None
+        if st.st_size == rec.get("size") and st.st_mtime_ns == rec.get("mtime_ns"):
+            return "local"
+        return None
+
+    def record(self, output: str, quant: str, params: dict | None = None, *, sha256: bool = True,
+               extra: dict | None = None) -> None:
+        """Record the just-written *output*; *sha256* False skips hashing outputs never uploaded."""
+        if self.source is None: return
+        st = os.stat(output)
+        rec = {"output": os.path.basename(output), **self._expected(quant, params), "size": st.st_size,
+               "mtime_ns": st.st_mtime_ns, "sha256": file_sha256(output) if sha256 else None, **(extra or {})}
+        _atomic_write_json(manifest_path(output), rec)
+
+    def adopt(self, output: str, quant: str, params: dict | None = None, *, extra: dict | None = None) -> bool:
+        """Record an existing *output* that has no build record (kept by an older version, or put there
+        by hand) as current, so it is reused instead of rebuilt over; False if there is nothing to adopt.
+
+        The record is marked ``"adopted"``: the file wasn't made here, so it is never cleaned up.
+        """
+        if self.source is None or read_record(output) is not None or not os.path.isfile(output):
+            return False
+        self.record(output, quant, params, sha256=False, extra={**(extra or {}), "adopted": True})
+        return True
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="List the build records of an output folder")
+    ap.add_argument("--dir", required=True, help="Output folder")
+    args = ap.parse_args()
+
+    folder = os.path.join(args.dir, MANIFEST_DIR)
+    names = sorted(n[:-5] for n in os.listdir(folder) if n.endswith(".json")) if os.path.isdir(folder) else []
+    for name in names:
+        rec = read_record(os.path.join(args.dir, name)) or {}
+        path = os.path.join(args.dir, name)
+        try:
+            st = os.stat(path)
+            state = "ok" if (st.st_size, st.st_mtime_ns) == (rec.get("size"), rec.get("mtime_ns")) else "changed"
+        except OSError:
+            state = "not on disk"
+        print(f"  {rec.get('quant', '?'):<18} {state:<12} {name}")
+    print(f"{len(names)} record(s) in {folder}")
+
+
+if __name__ == "__main__":
+    main()
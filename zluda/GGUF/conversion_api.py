@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+"""conversion_api.py — in-process entry points for the conversion pipeline stages
+
+The batch front ends used to run every stage as ``subprocess([sys.executable,
+...])`` and judge it by ``os.path.exists``. Each function here runs one stage
+in the calling interpreter (reusing its already-imported torch) and returns
+a `StageResult` instead; exceptions never escape, they end up in
+``result.error``.
+
+    res = dequantize("model-fp8.safetensors", "model-dequant.safetensors", dtype="fp16")
+    if not res: print(res.error)
+
+Torch-dependent modules are imported lazily, so importing this module is
+cheap and works without torch installed.
+"""
+
+import errno
+import os
+import runpy
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+from safetensors_stream import shard_paths
+
+# sys.argv is process-global; scripts run through `_run_script` one at a time
+_SCRIPT_LOCK = threading.Lock()
+
+
+class ConversionCancelled(Exception):
+    """Raised by a stage that stopped because its *should_stop* callback returned true."""
+
+
+@dataclass
+class StageResult:
+    stage: str
+    output: str
+    ok: bool = False
+    cancelled: bool = False
+    disk_full: bool = False
+    tensors: int = 0
+    bytes_written: int = 0
+    duration: float = 0.0
+    error: str | None = None
+    details: dict = field(default_factory=dict)
+
+    def __bool__(self) -> bool:
+        return self.ok
+
+    def raise_disk_full(self) -> None:
+        """Re-raise a failure caused by a full disk, e.g. so the batch scheduler waits for space."""
+        if self.disk_full:
+            raise OSError(errno.ENOSPC, self.error, self.output)
+
+    def describe(self) -> str:
+        if not self.ok:
+            why = "cancelled" if self.cancelled else "disk full" if self.disk_full else "failed"
+            return f"{self.stage}: {why} after {self.duration:.1f}s — {self.error}"
+        return (f"{self.stage}: {self.tensors} tensors, {self.bytes_written / 2**30:.2f} GiB "
+                f"in {self.duration:.1f}s → {os.path.basename(self.output)}")
+
+
+@contextmanager
+def _stage(name: str, output: str):
+    """Time the body and fill in the result; a missing *output* counts as a failure."""
+    res = StageResult(name, output)
+    start = time.perf_counter()
+    try:
+        yield res
+        if not os.path.exists(output):
+            raise FileNotFoundError(f"{output} was not written")
+        res.bytes_written = sum(os.path.getsize(p) for p in shard_paths(output))
+        res.ok = True
+    except Exception as e:
+        res.error = str(e) or type(e).__name__
+        res.cancelled = isinstance(e, ConversionCancelled)
+        res.disk_full = isinstance(e, OSError) and e.errno == errno.ENOSPC
+    finally:
+        res.duration = time.perf_counter() - start
+
+
+def _run_script(path: str, args: list[str]) -> None:
+    """Run the script at *path* as ``__main__`` in this interpreter with *args* as its argv."""
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"{path} not found")
+    with _SCRIPT_LOCK:
+        saved = sys.argv
+        sys.argv = [path, *args]
+        try:
+            runpy.run_path(path, run_name="__main__")
+        except SystemExit as e:
+            if e.code not in (None, 0):
+                raise RuntimeError(f"{os.path.basename(path)} exited with status {e.code}") from None
+        finally:
+            sys.argv = saved
+
+
+def _gguf_tensor_count(path: str) -> int:
+    try:
+        from gguf import GGUFReader
+    except ImportError:
+        return 0
+    return len(GGUFReader(path).tensors)
+
+
+def gguf_readable(path: str) -> bool:
+    """Whether *path* parses as a GGUF file; True if the gguf package isn't there to tell."""
+    try:
+        _gguf_tensor_count(path)
+    except Exception:
+        return False
+    return True
+
+
+# --------- stages ---------
+
+def dequantize(src: str, dst: str, *, dtype: str = "fp16", strip_fp8: bool = True, stream: bool = True,
+               jobs: int = 0, **opts) -> StageResult:
+    """`dequantize_fp8v2.dequantize_file` on *src* → *dst*; *opts* as accepted there."""
+    with _stage("dequantize", dst) as res:
+        import dequantize_fp8v2
+        stats = dequantize_fp8v2.dequantize_file(src, dst, out_dtype=dequantize_fp8v2.DTYPE_MAP[dtype],
+                                                 strip_fp8=strip_fp8, stream=stream, jobs=jobs, **opts)
+        res.tensors = stats["tensors"]
+        res.details = stats
+    return res
+
+
+def convert_direct(src: str, dst: str, *, dtype: str = "fp16", convert_py: str = "convert.py",
+                   should_stop=None, cache=None) -> StageResult:
+    """(FP8) safetensors → GGUF in one pass via `direct_gguf`, no dequant file in between."""
+    with _stage("convert (direct)", dst) as res:
+        import direct_gguf
+        stats = direct_gguf.convert_direct(src, dst, dtype=dtype, convert_py=convert_py, should_stop=should_stop,
+                                           cache=cache)
+        res.tensors = stats["tensors"]
+        res.details = stats
+    return res
+
+
+def convert_gguf(src: str, dst: str, *, convert_py: str = "convert.py") -> StageResult:
+    """Run convert.py on an already dequantized *src*."""
+    with _stage("convert", dst) as res:
+        _run_script(convert_py, ["--src", src, "--dst", dst])
+        res.tensors = _gguf_tensor_count(dst)
+    return res
+
+
+def fix_5d(src: str, dst: str, fix: str, *, script: str = "fix_5d_tensors.py") -> StageResult:
+    """Run fix_5d_tensors.py to restore the 5-D tensors listed in *fix* into the quantized *src*."""
+    with _stage("fix 5D", dst) as res:
+        _run_script(script, ["--src", src, "--dst", dst, "--fix", fix, "--overwrite"])
+        res.tensors = _gguf_tensor_count(dst)
+    return res
@@ -0,0 +1,412 @@
+#!/usr/bin/env python
+"""conversion_plan.py — header-only dry-run planner for FP8 conversions
+
+Everything here works from the safetensors JSON header alone: no tensor data
+is read and torch is never imported, so a batch can validate its inputs and
+size its outputs in milliseconds before any multi-hour work starts.
+`predict_outputs` sizes the GGUF side the same way (from the GGUF header for
+.gguf sources), so the batch scheduler can keep a run within a disk budget.
+
+    python conversion_plan.py --src model.safetensors --dtype fp16 --strip-fp8
+    python conversion_plan.py --src model.safetensors --fp8 float8_e4m3fn [--all]
+"""
+
+import argparse
+import math
+import os
+import struct
+import sys
+
+from quant_policy import QuantPolicy
+from safetensors_stream import planned_size, read_header, shard_paths, tensor_nbytes
+
+_INDEX_SUFFIXES  = {"weight", "scale_weight", "scale_input", "scale_reciprocal", "scale"}
+_STRIP_SUFFIXES  = ("scale_weight", "scale_input")
+FP8_ST_DTYPES    = {"F8_E4M3", "F8_E5M2"}
+FLOAT_ST_DTYPES  = {"F16", "BF16", "F32", "F64"} | FP8_ST_DTYPES
+OUT_ST_DTYPES    = {"fp32": "F32", "fp16": "F16", "bf16": "BF16"}
+QUANT_ST_DTYPES  = {"float8_e4m3fn": "F8_E4M3", "float8_e5m2": "F8_E5M2"}
+_DEFAULT_POLICY  = None
+# Average bits per weight of llama-quantize's types and mixes (llama.cpp's own figures)
+GGUF_BPW = {
+    "IQ2_XS": 2.31, "IQ2_S": 2.5, "Q2_K": 2.96,
+    "IQ3_XXS": 3.06, "IQ3_S": 3.44, "IQ3_M": 3.66, "Q3_K_S": 3.5, "Q3_K_M": 3.91, "Q3_K_L": 4.27,
+    "IQ4_NL": 4.5, "IQ4_XS": 4.25, "Q4_0": 4.5, "Q4_K_S": 4.58, "Q4_K_M": 4.89,
+    "Q5_0": 5.5, "Q5_K_S": 5.54, "Q5_K_M": 5.7,
+    "Q6_K": 6.56, "Q8_0": 8.5, "BF16": 16.0, "F16": 16.0,
+}
+# Diffusion models keep more tensors (biases, norms, 5-D weights) above the mix's type than LLMs do
+_GGUF_MARGIN     = 1.1
+# GGUF metadata value type -> struct format; 8 (string) and 9 (array) are variable-sized
+_GGUF_SCALARS    = {0: "B", 1: "b", 2: "H", 3: "h", 4: "I", 5: "i", 6: "f", 7: "?", 10: "Q", 11: "q", 12: "d"}
+
+
+# --------- FP8 key index (shared with dequantize_fp8v2) ---------
+
+def build_key_index(keys) -> tuple[dict[str, dict[str, str]], list[str]]:
+    """Group *keys* by base name in a single pass.
+
+    Returns ``(groups, markers)``: *groups* maps each base to
+    ``{suffix: key}`` for the suffixes in ``_INDEX_SUFFIXES``; *markers* lists
+    the ``scaled_fp8`` keys, prefixed (ComfyUI) or bare (WanVideo).
+    """
+    groups: dict[str, dict[str, str]] = {}
+    markers = []
+    for key in keys:
+        base, _, suffix = key.rpartition(".")
+        if not base:
+            if key == "scaled_fp8":
+                markers.append(key)
+            continue
+        if suffix in _INDEX_SUFFIXES:
+            groups.setdefault(base, {})[suffix] = key
+        elif suffix == "scaled_fp8":
+            markers.append(key)
+    return groups, markers
+
+
+def strip_keys(groups: dict[str, dict[str, str]], markers: list[str]) -> set[str]:
+    """Keys that ``--strip-fp8`` removes: FP8 markers plus every scale_weight / scale_input."""
+    drop = set(markers)
+    for g in groups.values():
+        drop.update(g[suf] for suf in _STRIP_SUFFIXES if suf in g)
+    return drop
+
+
+def _has_scale(group: dict[str, str]) -> bool:
+    return any(suf in group for suf in ("scale_weight", "scale_reciprocal", "scale"))
+
+
+# --------- planners ---------
+
+def _read_shards(src: str) -> list[tuple[str, dict, dict]]:
+    return [(path, *read_header(path)[:2]) for path in shard_paths(src)]
+
+
+def _tile_buffer_bytes(shape, tile_bytes: int) -> int:
+    """Size of the float32 buffer `dequantize_fp8v2.dequantize_tiled` allocates for *shape*."""
+    numel = 1
+    for dim in shape:
+        numel *= dim
+    if numel == 0:
+        return 0
+    rows_total = shape[0] if shape else 1
+    cols = numel // rows_total
+    return max(1, min(rows_total, tile_bytes // (cols * 4))) * cols * 4
+
+
+def _stream_peak(costs: list[int], workers: int, inflight_bytes: int) -> int:
+    """Largest amount of tensor data `tensor_pool.ordered_map` can hold at once."""
+    if not costs:
+        return 0
+    if workers <= 1:
+        return max(costs)
+    window = sum(sorted(costs)[-2 * workers:])
+    return max(max(costs), min(window, inflight_bytes))
+
+
+def _new_plan(src: str, action: str) -> dict:
+    return {"src": src, "action": action, "tensors": 0, "output_tensors": 0, "output_bytes": 0,
+            "peak_bytes": 0, "notes": {}, "errors": []}
+
+
+def plan_dequantize(src: str, *, dtype: str = "bf16", strip_fp8: bool = False, zero_copy: bool = True,
+                    stream: bool = True, tile_bytes: int = 64 << 20, workers: int = 1,
+                    inflight_bytes: int = 4096 << 20, jobs: int = 0, merge: bool = True) -> dict:
+    """Plan `dequantize_fp8v2` on *src* (a .safetensors file or shard index) from headers only."""
+    plan = _new_plan(src, f"dequantize → {dtype}" + (", strip FP8" if strip_fp8 else ""))
+    try:
+        shards = _read_shards(src)
+    except (OSError, ValueError, KeyError) as e:
+        plan["errors"].append(f"Unreadable header: {e}")
+        return plan
+
+    dtypes = {k: info["dtype"] for _, tensors, _ in shards for k, info in tensors.items()}
+    groups, markers = build_key_index(dtypes)
+    fp8_weights = [g["weight"] for g in groups.values() if "weight" in g and dtypes[g["weight"]] in FP8_ST_DTYPES]
+    missing = [g["weight"][:-7] for g in groups.values()
+               if "weight" in g and dtypes[g["weight"]] in FP8_ST_DTYPES and not _has_scale(g)]
+    dropped = strip_keys(groups, markers) if strip_fp8 else set()
+    out_st = OUT_ST_DTYPES[dtype]
+    fp8_set = set(fp8_weights)
+
+    layouts, peaks, src_total = [], [], 0
+    for _, tensors, _ in shards:
+        layout, costs, tile = [], [], 0
+        for k, info in tensors.items():
+            src_bytes = tensor_nbytes(info["dtype"], info["shape"])
+            src_total += src_bytes
+            if k in dropped:
+                continue
+            layout.append((k, out_st, info["shape"]))
+            if not (zero_copy and info["dtype"] == out_st):
+                costs.append(src_bytes + tensor_nbytes(out_st, info["shape"]))
+            if k in fp8_set:
+                tile = max(tile, _tile_buffer_bytes(info["shape"], tile_bytes))
+        layouts.append(layout)
+        peaks.append(_stream_peak(costs, workers, inflight_bytes) + tile * max(1, workers))
+
+    metadata = shards[0][2]
+    if len(shards) == 1 or merge:
+        plan["output_bytes"] = planned_size([e for layout in layouts for e in layout], metadata)
+    else:
+        plan["output_bytes"] = sum(planned_size(layout, metadata) for layout in layouts)
+
+    if not stream:
+        plan["peak_bytes"] = src_total + sum(tensor_nbytes(d, s) for layout in layouts for _, d, s in layout)
+    else:
+        n_jobs = max(1, min(jobs or (os.cpu_count() or 1), len(shards))) if len(shards) > 1 else 1
+        plan["peak_bytes"] = sum(sorted(peaks)[-n_jobs:])
+
+    plan["tensors"] = len(dtypes)
+    plan["output_tensors"] = sum(len(layout) for layout in layouts)
+    plan["notes"] = {"FP8 weights found": fp8_weights, "Missing scales": missing,
+                     "Dropped by --strip-fp8": sorted(dropped)}
+    if len(shards) > 1:
+        plan["notes"]["Shards"] = [os.path.basename(p) for p, _, _ in shards]
+    if missing:
+        plan["errors"].append(f"{len(missing)} FP8 weight(s) have no scale tensor")
+    return plan
+
+
+def fp8_output_dtype(name: str, info: dict, quant_st: str, *, policy: QuantPolicy | None = None,
+                     scaled: bool = False) -> str | None:
+    """safetensors dtype an `FP8Quantizer` writes for tensor *name* with header entry *info*, None if skipped.
+
+    Floating-point tensors go through *policy* (the built-in one by default),
+    with *quant_st* standing in for its ``fp8`` action; everything else keeps
+    its dtype. With *scaled*, only 2-D ``.weight`` tensors (the Linear layers
+    scaled-FP8 loaders rescale) may be FP8, any other tensor the policy would
+    quantize is stored as F16.
+    """
+    if info["dtype"] not in FLOAT_ST_DTYPES:
+        return info["dtype"]
+    out = (policy or _default_policy()).output_dtype(name, info, quant_st)
+    if scaled and out in FP8_ST_DTYPES and not (len(info["shape"]) == 2 and name.endswith(".weight")):
+        return "F16"
+    return out
+
+
+def _default_policy() -> QuantPolicy:
+    global _DEFAULT_POLICY
+    if _DEFAULT_POLICY is None:
+        _DEFAULT_POLICY = QuantPolicy.load()
+    return _DEFAULT_POLICY
+
+
+def scale_key(weight_name: str) -> str:
+    """``X.weight`` → ``X.scale_weight``."""
+    return weight_name[:-len("weight")] + "scale_weight"
+
+
+def fp8_layout(shards, *, quant_dtype: str, unet_only: bool = True, policy: QuantPolicy | None = None,
+               scaled: bool = False) -> list[tuple[str | None, str, str, list]]:
+    """Output of an `FP8Quantizer` run as ``[(shard path, name, out dtype, shape)]``, in source order.
+
+    *shards* is ``[(path, tensors)]`` with *tensors* as returned by `read_header`;
+    tensors outside ``model.diffusion_model`` are left out when *unet_only*, and
+    so are those *policy* skips.
+    With *scaled*, a float32 ``scale_weight`` follows each quantized weight and
+    the ``scaled_fp8`` marker comes last; their shard path is None. Keeping each
+    scale next to its weight lets a resumed conversion restart at any weight.
+    """
+    quant_st = QUANT_ST_DTYPES[quant_dtype]
+    layout = [(path, name, out, info["shape"])
+              for path, tensors in shards for name, info in tensors.items()
+              if not (unet_only and "model.diffusion_model" not in name)
+              and (out := fp8_output_dtype(name, info, quant_st, policy=policy, scaled=scaled)) is not None]
+    if scaled and layout:
+        prefixed = any(name.startswith("model.diffusion_model.") for _, name, _, _ in layout)
+        marker = (None, "model.diffusion_model.scaled_fp8" if prefixed else "scaled_fp8", quant_st, [0])
+        # scales / marker already in the source are superseded by the fresh ones
+        fresh = {scale_key(name) for _, name, dtype, _ in layout if dtype in FP8_ST_DTYPES} | {marker[1]}
+        scaled_layout = []
+        for entry in layout:
+            if entry[1] in fresh:
+                continue
+            scaled_layout.append(entry)
+            if entry[2] in FP8_ST_DTYPES:
+                scaled_layout.append((None, scale_key(entry[1]), "F32", []))
+        layout = scaled_layout + [marker]
+    return layout
+
+
+def plan_fp8_quantize(src: str, *, quant_dtype: str, unet_only: bool = True, policy: QuantPolicy | None = None,
+                      scaled: bool = False, tile_bytes: int = 64 << 20, workers: int = 1,
+                      inflight_bytes: int = 4096 << 20) -> dict:
+    """Plan an `FP8Quantizer` run on *src* from headers only (see `fp8_output_dtype`).
+
+    Tensors are read lazily and written as soon as they are quantized, so the
+    peak is the largest source tensor plus its output and one tile buffer, or
+    what *workers* threads can hold within *inflight_bytes*.
+    """
+    plan = _new_plan(src, f"FP8 quantize → {quant_dtype}" + (" scaled" if scaled else "") + ("" if unet_only else " (All)"))
+    try:
+        shards = _read_shards(src)
+    except (OSError, ValueError, KeyError) as e:
+        plan["errors"].append(f"Unreadable header: {e}")
+        return plan
+
+    layout = fp8_layout([(path, tensors) for path, tensors, _ in shards], quant_dtype=quant_dtype,
+                        unet_only=unet_only, policy=policy, scaled=scaled)
+    src_info = {name: info for _, tensors, _ in shards for name, info in tensors.items()}
+    kept_names = {name for _, name, _, _ in layout}
+    in_scope = [n for n in src_info if not (unet_only and "model.diffusion_model" not in n)]
+
+    quantized, kept, copied, added, costs = [], [], [], [], []
+    for path, name, out, shape in layout:
+        if path is None:
+            added.append(name)
+            continue
+        info = src_info[name]
+        src_bytes = tensor_nbytes(info["dtype"], shape)
+        if out in FP8_ST_DTYPES and (out != info["dtype"] or scaled):
+            quantized.append(name)
+            costs.append(src_bytes + tensor_nbytes(out, shape) + min(tile_bytes, src_bytes))
+        elif out != info["dtype"]:
+            kept.append(name)
+            costs.append(src_bytes + tensor_nbytes(out, shape))
+        else:
+            (kept if info["dtype"] in FLOAT_ST_DTYPES - FP8_ST_DTYPES else copied).append(name)
+    plan["peak_bytes"] = _stream_peak(costs, workers, inflight_bytes)
+
+    plan["tensors"] = len(src_info)
+    plan["output_tensors"] = len(layout)
+    plan["output_bytes"] = planned_size([(n, d, s) for _, n, d, s in layout])
+    plan["notes"] = {"Quantized to FP8": quantized, "Kept unquantized": kept, "Copied unchanged": copied,
+                     "Skipped (not in unet)": [n for n in src_info if n not in in_scope],
+                     "Skipped (policy)": [n for n in in_scope if n not in kept_names]}
+    if scaled:
+        plan["notes"]["Scales + marker added"] = added
+    if not layout:
+        plan["errors"].append("No tensors would be written" + (" (no model.diffusion_model.* keys)" if unet_only else ""))
+    return plan
+
+
+# --------- output sizes for the disk budget ---------
+
+def read_gguf_tensors(path: str) -> list[tuple[str, list[int], int]]:
+    """``[(name, shape, ggml type)]`` from the header of the GGUF file at *path*; no tensor data is read."""
+    with open(path, "rb") as f:
+        def unpack(fmt):
+            return struct.unpack("<" + fmt, f.read(struct.calcsize(fmt)))[0]
+
+        def skip_value(vtype):
+            if vtype == 8:
+                f.seek(unpack("Q"), 1)
+            elif vtype == 9:
+                item, n = unpack("I"), unpack("Q")
+                if item in _GGUF_SCALARS:
+                    f.seek(n * struct.calcsize(_GGUF_SCALARS[item]), 1)
+                else:
+                    for _ in range(n): skip_value(item)
+            elif vtype in _GGUF_SCALARS:
+                f.seek(struct.calcsize(_GGUF_SCALARS[vtype]), 1)
+            else:
+                raise ValueError(f"{path}: unknown GGUF value type {vtype}")
+
+        try:
+            if f.read(4) != b"GGUF":
+                raise ValueError(f"{path}: not a GGUF file")
+            if (version := unpack("I")) < 2:
+                raise ValueError(f"{path}: GGUF v{version} is not supported")
+            n_tensors, n_kv = unpack("Q"), unpack("Q")
+            for _ in range(n_kv):
+                f.seek(unpack("Q"), 1)  # key
+                skip_value(unpack("I"))
+            tensors = []
+            for _ in range(n_tensors):
+                name = f.read(unpack("Q")).decode("utf-8", "replace")
+                shape = [unpack("Q") for _ in range(unpack("I"))]
+                tensors.append((name, shape, unpack("I")))
+                f.seek(8, 1)  # data offset
+        except struct.error:
+            raise ValueError(f"{path}: truncated GGUF header") from None
+    return tensors
+
+
+def source_params(src: str) -> int:
+    """Number of weights in *src* (.safetensors, shard index or .gguf), from its header(s)."""
+    if src.lower().endswith(".gguf"):
+        return sum(math.prod(shape) for _, shape, _ in read_gguf_tensors(src))
+    return sum(math.prod(info["shape"]) for _, tensors, _ in _read_shards(src) for info in tensors.values())
+
+
+def predict_gguf_bytes(params: int, quant: str) -> int:
+    """Predicted size of the *quant* GGUF of a model with *params* weights."""
+    return int(params * GGUF_BPW.get(quant, 16.0) / 8 * _GGUF_MARGIN)
+
+
+def predict_outputs(src: str, quants, *, scaled: bool = False, policy: QuantPolicy | None = None) -> dict:
+    """Predicted bytes on disk of each target in *quants* made from *src*.
+
+    Also has the F16 intermediates under ``"CONVERT"`` and ``"dequant"``.
+    Empty when the source header can't be read (e.g. .pt inputs): nothing is
+    then predicted and the disk budget doesn't constrain that model.
+    """
+    try:
+        params = source_params(src)
+    except (OSError, ValueError, KeyError):
+        return {}
+    sizes = {"CONVERT": predict_gguf_bytes(params, "F16"), "dequant": params * 2}
+    for q in quants:
+        if "FP8" not in q:
+            sizes[q] = predict_gguf_bytes(params, q)
+            continue
+        plan = plan_fp8_quantize(src, quant_dtype="float8_e5m2" if "E5M2" in q else "float8_e4m3fn",
+                                 unet_only="(All)" not in q, policy=policy, scaled=scaled)
+        sizes[q] = plan["output_bytes"] or params  # one byte per weight
+    return sizes
+
+
+def _fmt_bytes(n: int) -> str:
+    return f"{n / 2**30:.2f} GiB ({n:,} bytes)"
+
+
+def print_plan(plan: dict, *, verbose: bool = False) -> None:
+    print(f"\n== PLAN: {os.path.basename(plan['src'])} — {plan['action']} ==")
+    print(f"  Tensors in source     : {plan['tensors']}")
+    for label, names in plan["notes"].items():
+        print(f"  {label:<22}: {len(names)}")
+        if names and (verbose or label == "Missing scales"):
+            for n in names[:50]:
+                print(f"      {n}")
+            if len(names) > 50:
+                print(f"      ... {len(names) - 50} more")
+    print(f"  Output tensors        : {plan['output_tensors']}")
+    print(f"  Output size           : {_fmt_bytes(plan['output_bytes'])}")
+    print(f"  Est. peak memory      : {_fmt_bytes(plan['peak_bytes'])}")
+    for err in plan["errors"]:
+        print(f"  ❌ {err}")
+
+
+# ---------------- CLI ----------------
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Header-only plan for an FP8 dequantize or FP8 quantize run")
+    ap.add_argument("--src", required=True, help="Input .safetensors file or *.safetensors.index.json")
+    ap.add_argument("--dtype", choices=OUT_ST_DTYPES.keys(), default="bf16", help="Dequantize target dtype (default: bf16)")
+    ap.add_argument("--strip-fp8", action="store_true", help="Plan with --strip-fp8")
+    ap.add_argument("--fp8", choices=QUANT_ST_DTYPES.keys(), help="Plan an FP8 quantization to this dtype instead")
+    ap.add_argument("--all", action="store_true", help="With --fp8: keep all tensors, not just model.diffusion_model.*")
+    ap.add_argument("--scaled", action="store_true", help="With --fp8: plan a scaled-FP8 output (scale_weight per weight)")
+    ap.add_argument("--policy", help="With --fp8: per-layer policy JSON (see quant_policy.py; default: built-in)")
+    ap.add_argument("-v", "--verbose", action="store_true", help="List tensor names for every category")
+    args = ap.parse_args()
+
+    if args.fp8:
+        try:
+            policy = QuantPolicy.load(args.policy)
+        except (OSError, ValueError) as e:
+            print(f"❌ Policy: {e}")
+            sys.exit(1)
+        plan = plan_fp8_quantize(args.src, quant_dtype=args.fp8, unet_only=not args.all, policy=policy,
+                                 scaled=args.scaled)
+    else:
+        plan = plan_dequantize(args.src, dtype=args.dtype, strip_fp8=args.strip_fp8)
+    print_plan(plan, verbose=args.verbose)
+    sys.exit(1 if plan["errors"] else 0)
+
+
+if __name__ == "__main__":
+    main()
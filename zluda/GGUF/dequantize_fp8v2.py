@@ -1,6 +1,45 @@
 #!/usr/bin/env python
-"""dequantize_fp8.py — *streaming* FP8 → full‑precision converter (v3.2 - Modified)
+"""dequantize_fp8.py — *streaming* FP8 → full‑precision converter (v3.3 - Modified)
 
+### What’s new in **v3.3**
+* **Real streaming is now the default**: tensors are read one at a time
+  from a memory map and written straight into an incrementally built
+  `.safetensors` file, so peak RAM stays near the largest single tensor
+  instead of the whole model. `--no-stream` restores the old
+  load-everything path (`in_place_convert`).
+* **Zero-copy passthrough**: tensors that already have the target dtype are
+  never decoded; their raw byte ranges are copied from the source file into
+  the output (`copy_file_range` / `sendfile` / mmap slices). Only FP8 weights
+  and tensors whose dtype actually changes go through PyTorch. Disable with
+  `--no-zero-copy`.
+* **Tiled dequantization**: FP8 weights are restored in row tiles through one
+  reused float32 buffer into a preallocated output of the target dtype,
+  instead of two full-size float32 temporaries per weight. The tile size is
+  set with `--tile-mb`; the summary reports the peak temporary memory.
+* **Single-pass key index**: one scan groups every base name with its
+  `weight` / `scale_weight` / `scale_input` / `scale_reciprocal` / `scale`
+  entries; all reciprocals are resolved in one vectorised step and both the
+  restore and the strip pass are driven from that index.
+* **`--workers N`**: independent tensors are converted concurrently on a
+  thread pool (torch ops release the GIL). Output order stays deterministic
+  and `--max-inflight-mb` bounds the bytes held by in-flight tensors.
+* **Sharded checkpoints**: `--src` may be a `*.safetensors.index.json`. Shards
+  are converted in parallel worker processes (`--jobs`); scales that live in
+  another shard than their weight still resolve. A `--dst` ending in
+  `.index.json` re-shards the output into `<dst stem>-0000i-of-0000n` shards
+  (never over the source shards), anything else merges it into one file.
+* **`--plan`**: dry run from the safetensors header only — FP8 weights found,
+  missing scales, tensors `--strip-fp8` drops, exact output size and the
+  estimated peak memory. Exits non-zero when the input can't be converted.
+* **Importable**: `dequantize_file` picks the right converter for a path and,
+  like every converter here, returns its stats (`restored`, `copied`,
+  `tensors`, `peak_tmp`); `conversion_api.py` wraps it for the batch tools.
+* **`--cache-dir`**: restored weights go through a `tensor_cache.TensorCache`
+  keyed by the hash of the FP8 bytes, their scale and the target dtype, so a
+  rerun (or a finetune sharing most tensors) reuses them; `--cache-gb` caps
+  the cache, least recently used entries are evicted first.
+* **Bare `scaled_fp8` marker** (WanVideo layout, no ``model.diffusion_model.``
+  prefix) is recognised and stripped like the prefixed one.
 ### What’s new in **v3.2**
 * **`scaled_fp8` is now always removed** when `--strip-fp8` is set,
   regardless of its dtype.
@@ -9,16 +48,24 @@
 """
 
 import argparse
-import re
+import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
+
 import torch
 from safetensors.torch import load_file, save_file
+from safetensors_stream import (StreamWriter, TensorReader, checkpoint_stem, discard_partial, finalize, is_shard_index,
+                                preallocate, shard_paths, tensor_bytes, tensor_nbytes, write_shard_index)
+from tensor_cache import DEFAULT_CACHE_GB, TensorCache, source_digest
+from tensor_pool import intra_op_threads, ordered_map
+from conversion_plan import FP8_ST_DTYPES, build_key_index, plan_dequantize, print_plan, strip_keys
 
 # --------- helpers & constants ---------
-_WEIGHT_RE       = re.compile(r"\.weight$")
 _FP8_DTYPES      = {torch.float8_e4m3fn, torch.float8_e5m2}
-_SCALE_PAT       = re.compile(r"\.(?:scale_weight|scale_input)$")
 DTYPE_MAP        = {"fp32": torch.float32, "fp16": torch.float16, "bf16": torch.bfloat16}
+ST_DTYPE_MAP     = {torch.float32: "F32", torch.float16: "F16", torch.bfloat16: "BF16"}
+DEFAULT_TILE_MB  = 64
+DEFAULT_INFLIGHT_MB = 4096
 
 
 def find_reciprocal_scale(state: dict[str, torch.Tensor], base: str) -> float:
@@ -35,44 +82,322 @@ def find_reciprocal_scale(state: dict[str, torch.Tensor], base: str) -> float:
     raise KeyError(f"No scale tensor found for base '{base}'")
 
 
-def in_place_convert(state: dict[str, torch.Tensor], *, out_dtype: torch.dtype, strip_fp8: bool):
-    """Cast **all** tensors to *out_dtype* in‑place, restoring FP8 weights."""
+def resolve_reciprocals(groups: dict[str, dict[str, str]], bases, get_tensor) -> dict[str, float]:
+    """Resolve the reciprocal scale of every base in *bases* in one vectorised step.
+
+    Same precedence as :func:`find_reciprocal_scale` (``scale_weight``, then
+    ``scale_reciprocal``, then ``1 / scale``); *get_tensor* maps a key to its tensor.
+    """
+    bases = list(bases)
+    if not bases:
+        return {}
+    values, invert = [], []
+    for base in bases:
+        g = groups[base]
+        key = g.get("scale_weight") or g.get("scale_reciprocal")
+        invert.append(key is None)
+        key = key or g.get("scale")
+        if key is None:
+            raise KeyError(f"No scale tensor found for base '{base}'")
+        values.append(get_tensor(key).to(torch.float32).reshape(()))
+
+    # float64 keeps this bit-identical to the old per-key ``1.0 / t.item()``
+    scales = torch.stack(values).to(torch.float64)
+    recips = torch.where(torch.tensor(invert), 1.0 / scales, scales)
+    return dict(zip(bases, recips.tolist()))
+
+
+def dequantize_tiled(tensor: torch.Tensor, recip: float, out_dtype: torch.dtype,
+                     tile_bytes: int = DEFAULT_TILE_MB << 20) -> tuple[torch.Tensor, int]:
+    """Return ``(tensor * recip).to(out_dtype)`` computed in row tiles.
+
+    Rows are upcast into a single reused float32 buffer of at most *tile_bytes*
+    (always at least one row), scaled in place and copied into a preallocated
+    *out_dtype* result. Returns ``(result, temp_bytes)`` where *temp_bytes* is
+    the size of that float32 buffer.
+    """
+    out = torch.empty(tensor.shape, dtype=out_dtype)
+    if tensor.numel() == 0:
+        return out, 0
+
+    rows_total = tensor.shape[0] if tensor.ndim else 1
+    src = tensor.reshape(rows_total, -1)
+    dst = out.view(src.shape)
+    cols = src.shape[1]
+    rows = max(1, min(rows_total, tile_bytes // (cols * 4)))
+
+    buf = torch.empty((rows, cols), dtype=torch.float32)
+    for i in range(0, rows_total, rows):
+        n = min(rows, rows_total - i)
+        tile = buf[:n]
+        tile.copy_(src[i:i + n])
+        tile.mul_(recip)
+        dst[i:i + n].copy_(tile)
+    return out, buf.numel() * 4
+
+
+def dequantize_cached(tensor: torch.Tensor, recip: float, out_dtype: torch.dtype,
+                      tile_bytes: int = DEFAULT_TILE_MB << 20, cache: TensorCache | None = None) -> tuple[torch.Tensor, int]:
+    """:func:`dequantize_tiled` backed by *cache*; a hit costs one hash of *tensor* and no temp buffer."""
+    if cache is None or tensor.numel() == 0:
+        return dequantize_tiled(tensor, recip, out_dtype, tile_bytes)
+    key = cache.key(source_digest(tensor_bytes(tensor)), op="dequant", src=str(tensor.dtype),
+                    shape=list(tensor.shape), recip=recip, dtype=str(out_dtype))
+    data = cache.get(key)
+    if data is not None:
+        return torch.frombuffer(data, dtype=out_dtype).reshape(tensor.shape), 0
+    out, tmp = dequantize_tiled(tensor, recip, out_dtype, tile_bytes)
+    cache.put(key, tensor_bytes(out))
+    return out, tmp
+
+
+def in_place_convert(state: dict[str, torch.Tensor], *, out_dtype: torch.dtype, strip_fp8: bool,
+                     tile_bytes: int = DEFAULT_TILE_MB << 20, workers: int = 1):
+    """Cast **all** tensors to *out_dtype* in‑place, restoring FP8 weights.
+
+    Returns the conversion stats: ``{"restored", "copied", "tensors", "peak_tmp"}``.
+    """
+    groups, markers = build_key_index(state)
+    fp8_bases = [b for b, g in groups.items() if "weight" in g and state[g["weight"]].dtype in _FP8_DTYPES]
+    recips = resolve_reciprocals(groups, fp8_bases, state.__getitem__)
+
     # ---- 1) Restore FP8 weights ----
-    fp8_weight_keys = [k for k, t in state.items() if _WEIGHT_RE.search(k) and t.dtype in _FP8_DTYPES]
+    def restore(base):
+        return dequantize_tiled(state[groups[base]["weight"]], recips[base], out_dtype, tile_bytes)
 
-    restored = 0
-    for key in fp8_weight_keys:
-        tensor = state[key]
-        base   = key[:-7]
-        recip  = find_reciprocal_scale(state, base)
+    restored = peak_tmp = 0
+    for base, (t, tmp) in ordered_map(restore, fp8_bases, workers=workers):
+        key   = groups[base]["weight"]
+        recip = recips[base]
 
-        state[key] = (tensor.to(torch.float32) * recip).to(out_dtype)
+        state[key] = t
+        peak_tmp = max(peak_tmp, tmp)
         restored += 1
         print(f"↩︎ {key:>60} | recip {recip:.6g} | → {out_dtype}")
 
-        if strip_fp8:
-            del tensor
-            for suf in ("scale_weight", "scale_input"):
-                state.pop(f"{base}.{suf}", None)
-
     # ---- 2) Cast remaining tensors & cleanup ----
-    for k in list(state.keys()):
-        t = state[k]
-
-        if strip_fp8:
-            if k.endswith(".scaled_fp8"):
-                del state[k]
-                continue
-            if _SCALE_PAT.search(k) or (_WEIGHT_RE.search(k) and t.dtype in _FP8_DTYPES):
-                del state[k]
-                continue
+    if strip_fp8:
+        for k in strip_keys(groups, markers):
+            del state[k]
 
+    for k, t in list(state.items()):
         if t.dtype != out_dtype:
             state[k] = t.to(out_dtype)
 
+    stats = {"restored": restored, "copied": None, "tensors": len(state), "peak_tmp": peak_tmp * max(1, workers)}
+    _print_summary(**stats)
+    return stats
+
+
+def stream_convert(src: str, dst: str, *, out_dtype: torch.dtype, strip_fp8: bool, zero_copy: bool = True,
+                   tile_bytes: int = DEFAULT_TILE_MB << 20, workers: int = 1,
+                   inflight_bytes: int = DEFAULT_INFLIGHT_MB << 20, cache: TensorCache | None = None):
+    """Streaming variant of :func:`in_place_convert`.
+
+    The layout of *dst* is planned from the header of *src*; tensors are then
+    read one at a time, converted and appended, so only the tensors in flight
+    (one, or up to *inflight_bytes* worth with *workers* > 1) are in memory.
+    With *zero_copy*, tensors already stored as *out_dtype* are copied byte
+    for byte; with *cache*, restored weights are looked up before computing.
+    Returns the same stats dict as :func:`in_place_convert`.
+    """
+    reader = TensorReader(src)
+    out_st = ST_DTYPE_MAP[out_dtype]
+
+    groups, markers = build_key_index(reader.tensors)
+    fp8_bases = [b for b, g in groups.items() if "weight" in g and reader.tensors[g["weight"]]["dtype"] in FP8_ST_DTYPES]
+    dropped = strip_keys(groups, markers) if strip_fp8 else set()
+    layout = [(k, out_st, info["shape"]) for k, info in reader.tensors.items() if k not in dropped]
+
+    with reader, StreamWriter(dst, layout, reader.metadata) as out:
+        recips = resolve_reciprocals(groups, fp8_bases, reader.get)
+        weight_recips = {groups[b]["weight"]: r for b, r in recips.items()}
+        restored, copied, peak_tmp = _stream_tensors(
+            reader, out, [k for k, _, _ in layout], weight_recips, out_dtype=out_dtype, zero_copy=zero_copy,
+            tile_bytes=tile_bytes, workers=workers, inflight_bytes=inflight_bytes, cache=cache)
+
+    stats = {"restored": restored, "copied": copied, "tensors": len(layout), "peak_tmp": peak_tmp * max(1, workers)}
+    _print_summary(**stats)
+    return stats
+
+
+def _stream_tensors(reader: TensorReader, out: StreamWriter, keys: list[str], weight_recips: dict[str, float], *,
+                    out_dtype: torch.dtype, zero_copy: bool, tile_bytes: int, workers: int,
+                    inflight_bytes: int, cache: TensorCache | None = None) -> tuple[int, int, int]:
+    """Convert *keys* of *reader* into *out* in order; FP8 weights are the keys of *weight_recips*.
+
+    Returns ``(restored, copied, peak_tmp)``.
+    """
+    tensors = reader.tensors
+    out_st = ST_DTYPE_MAP[out_dtype]
+
+    def passthrough(key):
+        return zero_copy and tensors[key]["dtype"] == out_st
+
+    def cost(key):
+        if passthrough(key):
+            return 0
+        info = tensors[key]
+        return tensor_nbytes(info["dtype"], info["shape"]) + tensor_nbytes(out_st, info["shape"])
+
+    def convert(key):
+        if passthrough(key):
+            return None, 0
+        t = reader.get(key)
+        if key in weight_recips:
+            return dequantize_cached(t, weight_recips[key], out_dtype, tile_bytes, cache)
+        return (t.to(out_dtype) if t.dtype != out_dtype else t), 0
+
+    restored = copied = peak_tmp = 0
+    for key, (t, tmp) in ordered_map(convert, keys, workers=workers, cost=cost, budget_bytes=inflight_bytes):
+        if t is None:
+            begin, end = tensors[key]["data_offsets"]
+            out.copy_from(key, reader.fileno(), reader.data_start + begin, end - begin)
+            copied += 1
+            continue
+
+        if key in weight_recips:
+            peak_tmp = max(peak_tmp, tmp)
+            restored += 1
+            print(f"↩︎ {key:>60} | recip {weight_recips[key]:.6g} | → {out_dtype}")
+        out.write(key, t)
+        del t
+    return restored, copied, peak_tmp
+
+
+def _shard_job(job: dict) -> tuple[int, int, int, dict]:
+    """Worker-process entry point for :func:`sharded_convert`: fill one shard's part of the output."""
+    torch.set_num_threads(job["threads"])
+    cache = TensorCache(*job["cache"]) if job["cache"] else None
+    with TensorReader(job["src"]) as reader, \
+         StreamWriter(job["dst"], job["layout"], job["metadata"], span=job["span"]) as out:
+        stats = _stream_tensors(reader, out, job["keys"], job["weight_recips"], cache=cache, **job["opts"])
+    return (*stats, cache.counters() if cache else {})
+
+
+def sharded_convert(index_path: str, dst: str, *, out_dtype: torch.dtype, strip_fp8: bool, jobs: int = 0,
+                    zero_copy: bool = True, tile_bytes: int = DEFAULT_TILE_MB << 20, workers: int = 1,
+                    inflight_bytes: int = DEFAULT_INFLIGHT_MB << 20, cache: TensorCache | None = None):
+    """Convert a sharded checkpoint (``*.safetensors.index.json``), one worker process per shard.
+
+    The key index and all reciprocal scales are resolved across every shard up
+    front, so a scale stored in a different shard than its weight still
+    applies. If *dst* ends in ``.index.json`` the output is re-sharded (one
+    ``<dst stem>-0000i-of-0000n.safetensors`` per source shard, next to *dst*,
+    plus a new index); otherwise all shards are merged into the single file
+    *dst*, each worker writing its own span.
+    Returns the same stats dict as :func:`in_place_convert`.
+    """
+    shards = shard_paths(index_path)
+    readers = {path: TensorReader(path) for path in shards}
+    try:
+        owner = {}
+        for path, reader in readers.items():
+            for k in reader.tensors:
+                if k in owner:
+                    raise ValueError(f"Tensor '{k}' appears in both {owner[k]} and {path}")
+                owner[k] = path
+
+        groups, markers = build_key_index(owner)
+        fp8_bases = [b for b, g in groups.items()
+                     if "weight" in g and readers[owner[g["weight"]]].tensors[g["weight"]]["dtype"] in FP8_ST_DTYPES]
+        recips = resolve_reciprocals(groups, fp8_bases, lambda k: readers[owner[k]].get(k))
+        weight_recips = {groups[b]["weight"]: r for b, r in recips.items()}
+        metadata = readers[shards[0]].metadata
+    finally:
+        for reader in readers.values():
+            reader.close()
+
+    dropped = strip_keys(groups, markers) if strip_fp8 else set()
+    out_st = ST_DTYPE_MAP[out_dtype]
+    shard_layouts = {path: [(k, out_st, info["shape"]) for k, info in readers[path].tensors.items() if k not in dropped]
+                     for path in shards}
+
+    jobs = max(1, min(jobs or (os.cpu_count() or 1), len(shards)))
+    opts = dict(out_dtype=out_dtype, zero_copy=zero_copy, tile_bytes=tile_bytes, workers=workers,
+                inflight_bytes=inflight_bytes)
+    # Worker processes open the same cache directory and report their counters back
+    common = dict(threads=intra_op_threads(jobs * max(1, workers)), opts=opts, metadata=metadata,
+                  weight_recips=weight_recips, cache=(cache.root, cache.max_bytes / 2**30) if cache else None)
+
+    merge = not dst.endswith(".index.json")
+    job_list = []
+    if merge:
+        layout = [entry for path in shards for entry in shard_layouts[path]]
+        preallocate(dst, layout, metadata)
+        start = 0
+        for path in shards:
+            stop = start + len(shard_layouts[path])
+            job_list.append(dict(common, src=path, dst=dst, layout=layout, span=(start, stop),
+                                 keys=[k for k, _, _ in shard_layouts[path]]))
+            start = stop
+    else:
+        out_dir = os.path.dirname(os.path.abspath(dst))
+        stem = checkpoint_stem(os.path.basename(dst))
+        sources = {os.path.realpath(path) for path in shards} | {os.path.realpath(index_path)}
+        for i, path in enumerate(shards, 1):
+            out = os.path.join(out_dir, f"{stem}-{i:05d}-of-{len(shards):05d}.safetensors")
+            job_list.append(dict(common, src=path, dst=out, layout=shard_layouts[path], span=None,
+                                 keys=[k for k, _, _ in shard_layouts[path]]))
+        clash = [job["dst"] for job in job_list if os.path.realpath(job["dst"]) in sources]
+        if os.path.realpath(dst) in sources: clash.append(dst)
+        if clash:
+            raise ValueError(f"Output would overwrite the source checkpoint: {', '.join(clash)}")
+
+    print(f"Converting {len(shards)} shard(s) with {jobs} worker process(es) → {'merged' if merge else 're-sharded'} output")
+    restored = copied = peak_tmp = 0
+    try:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            for r, c, p, counters in pool.map(_shard_job, job_list):
+                restored += r; copied += c; peak_tmp = max(peak_tmp, p)
+                if cache: cache.merge(counters)
+    except BaseException:
+        if merge:
+            discard_partial(dst)
+        raise
+
+    if merge:
+        finalize(dst)
+    else:
+        write_shard_index(dst, {job["dst"]: job["layout"] for job in job_list})
+
+    stats = {"restored": restored, "copied": copied, "tensors": sum(len(layout) for layout in shard_layouts.values()),
+             "peak_tmp": peak_tmp * jobs * max(1, workers)}
+    _print_summary(**stats)
+    return stats
+
+
+def dequantize_file(src: str, dst: str, *, out_dtype: torch.dtype, strip_fp8: bool, stream: bool = True,
+                    jobs: int = 0, **opts) -> dict:
+    """Convert *src* to *dst* with whichever of the three converters fits; returns their stats.
+
+    *opts* are passed on (``zero_copy``, ``tile_bytes``, ``workers``,
+    ``inflight_bytes``, ``cache``); the load-everything path only uses the ones it knows.
+    """
+    if is_shard_index(src):
+        if not stream:
+            raise ValueError("sharded input is always streamed")
+        return sharded_convert(src, dst, out_dtype=out_dtype, strip_fp8=strip_fp8, jobs=jobs, **opts)
+    if stream:
+        print("Streaming", src, "→", dst)
+        return stream_convert(src, dst, out_dtype=out_dtype, strip_fp8=strip_fp8, **opts)
+
+    print("Loading", src)
+    sd = load_file(src, device="cpu")
+    stats = in_place_convert(sd, out_dtype=out_dtype, strip_fp8=strip_fp8,
+                             **{k: v for k, v in opts.items() if k in ("tile_bytes", "workers")})
+    print("Saving", dst)
+    save_file(sd, dst)
+    return stats
+
+
+def _print_summary(restored: int, tensors: int, copied: int | None = None, *, peak_tmp: int = 0) -> None:
     print("\n―――――――― CONVERSION SUMMARY ―――――――")
     print(f"FP8 weights restored : {restored}")
-    print(f"Total tensors         : {len(state)} (after cast/clean)")
+    if copied is not None:
+        print(f"Copied as raw bytes   : {copied}")
+    print(f"Peak temp memory      : {peak_tmp / 2**20:.1f} MiB")
+    print(f"Total tensors         : {tensors} (after cast/clean)")
     print("――――――――――――――――――――――――――――――――")
 
 
@@ -83,29 +408,47 @@ def main() -> None:
     
     # --- THIS IS THE CORRECTED SECTION ---
     # Changed from positional arguments to named arguments for clarity and robustness
-    ap.add_argument("--src", required=True, help="Input FP8 .safetensors file")
-    ap.add_argument("--dst", required=True, help="Output .safetensors file")
+    ap.add_argument("--src", required=True, help="Input FP8 .safetensors file or *.safetensors.index.json shard index")
+    ap.add_argument("--dst", required=True, help="Output .safetensors file (or *.index.json to re-shard a sharded input)")
     # --- END OF CORRECTION ---
     
     ap.add_argument("--dtype", choices=DTYPE_MAP.keys(), default="bf16", help="Target dtype for *all* tensors (default: bf16)")
     ap.add_argument("--strip-fp8", action="store_true", help="Remove FP8 & scale tensors after convert to minimise size")
+    ap.add_argument("--no-stream", action="store_true", help="Load the whole state dict into RAM instead of streaming tensor by tensor")
+    ap.add_argument("--no-zero-copy", action="store_true", help="Decode every tensor, even those already stored in the target dtype")
+    ap.add_argument("--tile-mb", type=int, default=DEFAULT_TILE_MB, help=f"Float32 tile size for FP8 dequantization in MiB (default: {DEFAULT_TILE_MB})")
+    ap.add_argument("--workers", type=int, default=1, help="Convert this many tensors concurrently (default: 1)")
+    ap.add_argument("--jobs", type=int, default=0, help="Worker processes for sharded input (default: one per shard, up to the CPU count)")
+    ap.add_argument("--max-inflight-mb", type=int, default=DEFAULT_INFLIGHT_MB, help=f"Memory budget for tensors in flight with --workers > 1, in MiB (default: {DEFAULT_INFLIGHT_MB})")
+    ap.add_argument("--plan", action="store_true", help="Only read the header and print what the conversion would do")
+    ap.add_argument("--cache-dir", help="Reuse restored weights from / store them in this tensor cache directory")
+    ap.add_argument("--cache-gb", type=float, default=DEFAULT_CACHE_GB, help=f"Tensor cache size limit in GiB (default: {DEFAULT_CACHE_GB})")
     args = ap.parse_args()
 
-    out_dtype = DTYPE_MAP[args.dtype]
+    if args.plan:
+        plan = plan_dequantize(args.src, dtype=args.dtype, strip_fp8=args.strip_fp8, zero_copy=not args.no_zero_copy,
+                               stream=not args.no_stream, tile_bytes=args.tile_mb << 20, workers=args.workers,
+                               inflight_bytes=args.max_inflight_mb << 20, jobs=args.jobs,
+                               merge=not args.dst.endswith(".index.json"))
+        print_plan(plan)
+        sys.exit(1 if plan["errors"] else 0)
 
-    # --- Use the new argument names ---
-    print("Loading", args.src)
-    sd = load_file(args.src, device="cpu")
+    out_dtype = DTYPE_MAP[args.dtype]
+    if args.workers > 1:
+        torch.set_num_threads(intra_op_threads(args.workers))
 
-    in_place_convert(sd, out_dtype=out_dtype, strip_fp8=args.strip_fp8)
+    if is_shard_index(args.src) and args.no_stream:
+        ap.error("sharded input is always streamed; drop --no-stream")
 
-    print("Saving", args.dst)
+    cache = TensorCache(args.cache_dir, args.cache_gb) if args.cache_dir else None
     try:
-        # --- Use the new argument names ---
-        save_file(sd, args.dst)
+        dequantize_file(args.src, args.dst, out_dtype=out_dtype, strip_fp8=args.strip_fp8, stream=not args.no_stream,
+                        jobs=args.jobs, zero_copy=not args.no_zero_copy, tile_bytes=args.tile_mb << 20,
+                        workers=args.workers, inflight_bytes=args.max_inflight_mb << 20, cache=cache)
     except Exception as err:
-        print("❌ Failed to save .safetensors:", err, file=sys.stderr)
+        print("❌ Failed to convert", args.src + ":", err, file=sys.stderr)
         sys.exit(1)
+    if cache: print(cache.summary())
 
     print("Done ✅")
 
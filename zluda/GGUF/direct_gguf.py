@@ -0,0 +1,285 @@
+#!/usr/bin/env python
+"""direct_gguf.py — FP8 .safetensors → GGUF F16/BF16 in a single pass
+
+Replaces the ``dequantize_fp8v2.py`` → ``-dequant.safetensors`` → ``convert.py``
+round trip: tensors are read lazily from the source mapping, FP8 weights are
+dequantized on access and handed straight to convert.py's own architecture
+detection and tensor handling, so no intermediate file is ever written.
+
+convert.py (ComfyUI-GGUF) is loaded from the working directory as a module;
+its `detect_arch` / `handle_tensors` decide names, tensor types and the 5-D
+fix file exactly as a subprocess run would. Tensors convert.py keeps out of
+the GGUF (>4-D weights such as Wan's ``patch_embedding``) are written to
+``fix_5d_tensors_<arch>.safetensors`` in the working directory, as its
+``convert_file`` does, and the path is returned under ``"fix"``.
+
+    python direct_gguf.py --src model-fp8.safetensors --dst model-CONVERT.gguf
+    python direct_gguf.py --src model-fp8.safetensors --dst model-CONVERT.gguf --check   # compare with convert.py
+"""
+
+import argparse
+import glob
+import importlib.util
+import os
+import sys
+import tempfile
+from collections.abc import Mapping
+
+import torch
+from conversion_api import ConversionCancelled
+from safetensors_stream import TensorReader, discard_partial, finalize, read_header, shard_paths
+from conversion_plan import FP8_ST_DTYPES, build_key_index, strip_keys
+from dequantize_fp8v2 import DEFAULT_TILE_MB, DTYPE_MAP, dequantize_cached, resolve_reciprocals
+from tensor_cache import DEFAULT_CACHE_GB, TensorCache
+
+GGUF_DTYPES = ("fp16", "bf16")
+FIX_5D_PATTERN = "fix_5d_tensors_*.safetensors"
+
+
+def load_convert_module(path: str = "convert.py"):
+    """Import convert.py from *path* without running its CLI."""
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"{path} not found")
+    spec = importlib.util.spec_from_file_location("comfy_gguf_convert", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    for attr in ("detect_arch", "handle_tensors", "gguf"):
+        if not hasattr(module, attr):
+            raise AttributeError(f"{path} has no '{attr}'; cannot convert in-process")
+    return module
+
+
+def _strip_prefix(keys: list[str]) -> dict[str, str]:
+    """Same prefix rules as convert.py's ``strip_prefix``, on names only: ``{new name: source name}``."""
+    for pfx in ("model.diffusion_model.", "model."):
+        if any(k.startswith(pfx) for k in keys):
+            return {k.replace(pfx, ""): k for k in keys if pfx in k}
+    if keys and all(k.startswith("net.") for k in keys):
+        return {k.replace("net.", ""): k for k in keys}
+    return {k: k for k in keys}
+
+
+class DequantizedStateDict(Mapping):
+    """Read-only state dict over a checkpoint that dequantizes tensors on access.
+
+    Every value comes back as *out_dtype* (FP8 weights restored with their
+    scale), which is what convert.py would have seen in the ``-dequant``
+    file. Nothing is read until a value is requested; membership tests only
+    look at the headers. Restored weights are reused from *cache* when given.
+    """
+
+    def __init__(self, src: str, *, out_dtype: torch.dtype = torch.float16, strip_fp8: bool = True,
+                 tile_bytes: int = DEFAULT_TILE_MB << 20, should_stop=None, cache: TensorCache | None = None):
+        self.out_dtype = out_dtype
+        self.tile_bytes = tile_bytes
+        self.should_stop = should_stop
+        self.cache = cache
+        self.restored = 0
+        self._readers = [TensorReader(path) for path in shard_paths(src)]
+        try:
+            self._owner = {}
+            for reader in self._readers:
+                for k in reader.tensors:
+                    if k in self._owner:
+                        raise ValueError(f"Tensor '{k}' appears in both {self._owner[k].path} and {reader.path}")
+                    self._owner[k] = reader
+
+            groups, markers = build_key_index(self._owner)
+            fp8_bases = [b for b, g in groups.items()
+                         if "weight" in g and self._owner[g["weight"]].tensors[g["weight"]]["dtype"] in FP8_ST_DTYPES]
+            recips = resolve_reciprocals(groups, fp8_bases, self._get_raw)
+            self._recips = {groups[b]["weight"]: r for b, r in recips.items()}
+            dropped = strip_keys(groups, markers) if strip_fp8 else set()
+        except BaseException:
+            self.close()
+            raise
+        self._names = _strip_prefix([k for k in self._owner if k not in dropped])
+
+    def _get_raw(self, key: str) -> torch.Tensor:
+        return self._owner[key].get(key)
+
+    def __getitem__(self, name: str) -> torch.Tensor:
+        key = self._names[name]
+        if self.should_stop and self.should_stop():
+            raise ConversionCancelled("Conversion cancelled")
+        t = self._get_raw(key)
+        if key in self._recips:
+            self.restored += 1
+            return dequantize_cached(t, self._recips[key], self.out_dtype, self.tile_bytes, self.cache)[0]
+        return t.to(self.out_dtype) if t.dtype != self.out_dtype else t
+
+    def __contains__(self, name) -> bool:
+        return name in self._names
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def close(self) -> None:
+        for reader in self._readers:
+            reader.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def convert_direct(src: str, dst: str, *, dtype: str = "fp16", strip_fp8: bool = True,
+                   convert_py: str = "convert.py", tile_bytes: int = DEFAULT_TILE_MB << 20,
+                   should_stop=None, cache: TensorCache | None = None) -> dict:
+    """Write the GGUF that ``convert.py --src <dequantized src>`` would produce to *dst*.
+
+    *src* is a .safetensors file or a ``*.safetensors.index.json``. Returns
+    ``{"arch", "restored", "tensors", "fix"}``, *fix* being the 5-D fix file
+    written to the working directory, or None. Raises `ConversionCancelled`
+    when *should_stop* returns true; a partial *dst* is never left behind.
+    """
+    if dtype not in GGUF_DTYPES:
+        raise ValueError(f"Unsupported GGUF dtype: {dtype}")
+    conv = load_convert_module(convert_py)
+    gguf = conv.gguf
+    # Older convert.py versions write the fix file from handle_tensors, newer ones collect it
+    fixes_before = {p: os.stat(p).st_mtime_ns for p in glob.glob(FIX_5D_PATTERN)}
+
+    with DequantizedStateDict(src, out_dtype=DTYPE_MAP[dtype], strip_fp8=strip_fp8, tile_bytes=tile_bytes,
+                              should_stop=should_stop, cache=cache) as state:
+        model_arch = conv.detect_arch(state)
+        print(f"* Architecture detected from input: {model_arch.arch}")
+
+        ftype = gguf.LlamaFileType.MOSTLY_BF16 if dtype == "bf16" else gguf.LlamaFileType.MOSTLY_F16
+        writer = gguf.GGUFWriter(path=None, arch=model_arch.arch)
+        try:
+            writer.add_quantization_version(gguf.GGML_QUANT_VERSION)
+            writer.add_file_type(ftype)
+            conv.handle_tensors(writer, state, model_arch)
+
+            writer.write_header_to_file(path=dst + ".partial")
+            writer.write_kv_data_to_file()
+            writer.write_tensors_to_file(progress=True)
+        except BaseException:
+            writer.close()
+            discard_partial(dst)
+            raise
+        writer.close()
+        finalize(dst)
+        # The >4-D tensors handle_tensors kept out of the GGUF, as convert.py's convert_file writes them
+        if hasattr(model_arch, "save_nd_tensors"):
+            model_arch.save_nd_tensors()
+
+    fixes = sorted((p for p in glob.glob(FIX_5D_PATTERN) if os.stat(p).st_mtime_ns != fixes_before.get(p)),
+                   key=os.path.getmtime)
+    print(f"FP8 weights restored : {state.restored}")
+    print(f"Total tensors        : {len(state)}")
+    if fixes: print(f"5-D fix file         : {fixes[-1]}")
+    return {"arch": model_arch.arch, "restored": state.restored, "tensors": len(state),
+            "fix": os.path.abspath(fixes[-1]) if fixes else None}
+
+
+def check_parity(src: str, dst: str, fix: str | None, *, dtype: str = "fp16", convert_py: str = "convert.py") -> list[str]:
+    """Differences between *dst* / *fix* from `convert_direct` and the dequantize + convert.py path.
+
+    The subprocess path runs in a scratch folder (so its fix file can't clash
+    with *fix*); tensors are compared by name, shape, type and bytes.
+    """
+    import conversion_api
+
+    problems = []
+    src, convert_py = os.path.abspath(src), os.path.abspath(convert_py)
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(dst))) as tmp:
+        dq, ref = os.path.join(tmp, "dequant.safetensors"), os.path.join(tmp, "ref.gguf")
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            for res in (conversion_api.dequantize(src, dq, dtype=dtype, strip_fp8=True),
+                        conversion_api.convert_gguf(dq, ref, convert_py=convert_py)):
+                if not res: return [res.describe()]
+            ref_fix = glob.glob(FIX_5D_PATTERN)
+        finally:
+            os.chdir(cwd)
+
+        problems += _compare_gguf(dst, ref)
+        if bool(fix) != bool(ref_fix):
+            problems.append(f"5-D fix file: {'none' if not fix else os.path.basename(fix)} vs "
+                            f"{'none' if not ref_fix else ref_fix[0]} from convert.py")
+        elif fix:
+            ref_fix = os.path.join(tmp, ref_fix[0])
+            a, b = read_header(fix)[0], read_header(ref_fix)[0]
+            if {n: (i["dtype"], i["shape"]) for n, i in a.items()} != {n: (i["dtype"], i["shape"]) for n, i in b.items()}:
+                problems.append("5-D fix file: tensors differ")
+            elif _tensor_bytes(fix) != _tensor_bytes(ref_fix):
+                problems.append("5-D fix file: data differs")
+    return problems
+
+
+def _compare_gguf(ours: str, theirs: str) -> list[str]:
+    # Own function so the readers' mappings are gone before the scratch folder is removed
+    import numpy as np
+    from gguf import GGUFReader
+    a_all = {t.name: t for t in GGUFReader(ours).tensors}
+    b_all = {t.name: t for t in GGUFReader(theirs).tensors}
+    problems = [f"only in convert.py output: {n}" for n in b_all.keys() - a_all.keys()]
+    problems += [f"only in direct output: {n}" for n in a_all.keys() - b_all.keys()]
+    for name in sorted(a_all.keys() & b_all.keys()):
+        a, b = a_all[name], b_all[name]
+        if list(a.shape) != list(b.shape) or a.tensor_type != b.tensor_type:
+            problems.append(f"{name}: {list(a.shape)} {a.tensor_type.name} vs {list(b.shape)} {b.tensor_type.name}")
+        elif not np.array_equal(a.data, b.data):
+            problems.append(f"{name}: data differs")
+    return problems
+
+
+def _tensor_bytes(path: str) -> dict[str, bytes]:
+    """Raw payload of every tensor in the (small) safetensors file at *path*."""
+    tensors, _, data_start = read_header(path)
+    out = {}
+    with open(path, "rb") as f:
+        for name, info in tensors.items():
+            begin, end = info["data_offsets"]
+            f.seek(data_start + begin)
+            out[name] = f.read(end - begin)
+    return out
+
+
+# ---------------- CLI ----------------
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Convert an (FP8) .safetensors checkpoint straight to a GGUF F16/BF16 file")
+    ap.add_argument("--src", required=True, help="Input .safetensors file or *.safetensors.index.json")
+    ap.add_argument("--dst", required=True, help="Output .gguf file")
+    ap.add_argument("--dtype", choices=GGUF_DTYPES, default="fp16", help="GGUF tensor type (default: fp16)")
+    ap.add_argument("--keep-fp8-keys", action="store_true", help="Do not drop scale_weight / scale_input / scaled_fp8")
+    ap.add_argument("--convert-py", default="convert.py", help="Path to ComfyUI-GGUF's convert.py")
+    ap.add_argument("--tile-mb", type=int, default=DEFAULT_TILE_MB,
+                    help=f"Float32 scratch per FP8 weight during dequantization (default: {DEFAULT_TILE_MB})")
+    ap.add_argument("--cache-dir", help="Reuse restored weights from / store them in this tensor cache directory")
+    ap.add_argument("--cache-gb", type=float, default=DEFAULT_CACHE_GB, help=f"Tensor cache size limit in GiB (default: {DEFAULT_CACHE_GB})")
+    ap.add_argument("--check", action="store_true",
+                    help="Also run dequantize + convert.py and compare the GGUF and 5-D fix file, exit 1 on mismatch")
+    args = ap.parse_args()
+
+    cache = TensorCache(args.cache_dir, args.cache_gb) if args.cache_dir else None
+    try:
+        stats = convert_direct(args.src, args.dst, dtype=args.dtype, strip_fp8=not args.keep_fp8_keys,
+                               convert_py=args.convert_py, tile_bytes=args.tile_mb << 20, cache=cache)
+    except (OSError, ImportError, AttributeError, ValueError, KeyError) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    if cache: print(cache.summary())
+    print(f"✅ Saved → {args.dst}")
+
+    if args.check:
+        problems = check_parity(args.src, args.dst, stats["fix"], dtype=args.dtype, convert_py=args.convert_py)
+        for p in problems[:50]:
+            print(f"  ❌ {p}")
+        if problems:
+            sys.exit(1)
+        print("✅ Identical to the dequantize + convert.py output")
+
+
+if __name__ == "__main__":
+    main()
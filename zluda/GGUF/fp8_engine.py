@@ -0,0 +1,628 @@
+#!/usr/bin/env python
+"""fp8_engine.py — the FP8 quantizer shared by run_conversion.py and gui_run_conversion.py
+
+One `FP8Quantizer` with pluggable kernels:
+
+* ``numpy``      — NumPy + ml_dtypes on memory-mapped arrays; torch is never imported
+* ``torch-cuda`` — torch on the GPU
+* ``torch-cpu``  — torch on the CPU
+
+``backend="auto"`` takes ``torch-cuda`` when torch sees a CUDA device (ZLUDA
+included) and otherwise ``numpy`` ahead of ``torch-cpu``: on the CPU, NumPy
+keeps up with torch and saves the seconds importing torch costs, which
+dominate small conversions. Finding out whether there is a GPU takes that
+import too, so it is only paid where torch is installed.
+
+Every backend computes ``round(w / scale * 127) / 127 * scale`` with
+``scale = absmax / FP8 max`` tile by tile, or ``clamp(w / scale)`` plus a
+float32 ``scale_weight`` in scaled mode. Which tensors are quantized, kept
+in 16-bit, copied or skipped is decided by a `quant_policy.QuantPolicy`
+through `conversion_plan.fp8_layout`, so the plan, the streamed path and the
+``.pt`` path can't drift apart.
+
+With ``resume=True`` the safetensors path journals finished tensors next to
+each ``.partial`` output (see `safetensors_stream.StreamWriter`); rerunning
+with the same source, backend, policy and mode continues at the first
+unfinished tensor. ``.pt`` sources are memory-mapped and loaded weights-only
+(`pt_checkpoint`) and always start over, unless ``transcode=True`` converts
+them once to ``<src>.safetensors`` and takes the streamed path from there.
+With a `tensor_cache.TensorCache`, FP8 outputs of safetensors sources are
+reused across runs for source tensors whose bytes and parameters match.
+
+    python fp8_engine.py parity            # every backend against the reference, exit 1 on mismatch
+    python fp8_engine.py bench --mb 512    # throughput per backend in GB/s
+    python fp8_engine.py coldstart --src model.safetensors   # fresh-process conversion time per backend
+"""
+
+import argparse
+import importlib.util
+import json
+import logging
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from conversion_plan import FP8_ST_DTYPES, QUANT_ST_DTYPES, fp8_layout
+from pt_checkpoint import load_state_dict, tensor_infos, transcode
+from quant_policy import QuantPolicy
+from safetensors_stream import (TORCH_DTYPE_NAMES, StreamWriter, is_shard_index, read_header, shard_paths, tensor_bytes,
+                                write_variants)
+from tensor_cache import TensorCache, source_digest
+from tensor_pool import intra_op_threads
+
+FP8_MAX = {"float8_e4m3fn": 448.0, "float8_e5m2": 57344.0}
+# Scratch size per FP8 quantization tile (MiB)
+DEFAULT_TILE_MB = 64
+# Memory budget for tensors in flight with workers > 1 (MiB)
+DEFAULT_INFLIGHT_MB = 4096
+BACKENDS = ("torch-cuda", "torch-cpu", "numpy")
+# Bump when a kernel's output changes, so partial outputs of older runs aren't resumed
+KERNEL_VERSION = 1
+# ``auto`` on a host without a usable CUDA device; with one, torch-cuda goes first
+AUTO_ORDER = ("numpy", "torch-cpu")
+
+
+def output_params(scaled: bool, policy: QuantPolicy | None) -> dict:
+    """Everything besides the source, the target dtype and the backend that decides an FP8 output's bytes."""
+    policy = policy or QuantPolicy.load()
+    return {"kernel": KERNEL_VERSION, "scaled": scaled, "policy": {"rules": policy.rules, "default": policy.default}}
+
+
+# ---------------- backends ----------------
+
+class TorchBackend:
+    """Tiled kernels on a torch device; outputs stay on the input's device."""
+
+    def __init__(self, device: str = "cpu"):
+        import torch
+        if device == "cuda" and not torch.cuda.is_available():
+            raise RuntimeError("CUDA is not available")
+        self.torch = torch
+        self.device = torch.device(device)
+        self.name = f"torch-{self.device.type}"
+
+    def asarray(self, x):
+        torch = self.torch
+        if isinstance(x, torch.Tensor):
+            return x
+        if x.dtype.name == "bfloat16":
+            return torch.from_numpy(x.view("i2")).view(torch.bfloat16)
+        if x.dtype.name in FP8_MAX:
+            return torch.from_numpy(x.view("u1")).view(getattr(torch, x.dtype.name))
+        return torch.from_numpy(x)
+
+    def cast(self, x, st_dtype: str):
+        return x.to(getattr(self.torch, TORCH_DTYPE_NAMES[st_dtype]))
+
+    def synchronize(self) -> None:
+        if self.device.type == "cuda":
+            self.torch.cuda.synchronize()
+
+    def _absmax(self, flat, buf):
+        # Streaming absmax through the tile buffer
+        torch = self.torch
+        step, numel = buf.numel(), flat.numel()
+        max_val = torch.zeros((), dtype=flat.dtype, device=flat.device)
+        for i in range(0, numel, step):
+            tile = buf[:min(step, numel - i)]
+            torch.abs(flat[i:i + step], out=tile)
+            max_val = torch.maximum(max_val, tile.amax())
+        return max_val
+
+    def quantize(self, weight, quant_dtypes, tile_bytes: int) -> dict:
+        torch = self.torch
+        flat = weight.to(self.device).reshape(-1)
+        outs = {q: torch.empty(weight.shape, dtype=getattr(torch, q), device=weight.device) for q in quant_dtypes}
+        numel = flat.numel()
+        if numel == 0: return outs
+
+        step = max(1, min(numel, tile_bytes // flat.element_size()))
+        buf = torch.empty(step, dtype=flat.dtype, device=self.device)
+        max_val = self._absmax(flat, buf)
+
+        for q, out in outs.items():
+            scale = torch.max(max_val / FP8_MAX[q], torch.tensor(1e-12, device=self.device, dtype=flat.dtype))
+            # All-zero weights stay zero, without a `max_val == 0` branch that would force a device sync
+            scale = torch.where(max_val == 0, torch.ones_like(scale), scale)
+
+            dst = out.view(-1)
+            for i in range(0, numel, step):
+                tile = buf[:min(step, numel - i)]
+                torch.div(flat[i:i + step], scale, out=tile)
+                tile.mul_(127.0).round_().div_(127.0).mul_(scale)
+                dst[i:i + step].copy_(tile)
+        return outs
+
+    def quantize_scaled(self, weight, quant_dtypes, tile_bytes: int) -> dict:
+        torch = self.torch
+        flat = weight.to(self.device).reshape(-1)
+        outs = {q: torch.empty(weight.shape, dtype=getattr(torch, q), device=weight.device) for q in quant_dtypes}
+        numel = flat.numel()
+        one = torch.ones((), dtype=torch.float32, device=self.device)
+        if numel == 0: return {q: (out, one.cpu()) for q, out in outs.items()}
+
+        step = max(1, min(numel, tile_bytes // 4))
+        buf = torch.empty(step, dtype=torch.float32, device=self.device)
+        max_val = self._absmax(flat, buf if flat.dtype == torch.float32
+                               else torch.empty(step, dtype=flat.dtype, device=self.device))
+
+        scaled = {}
+        for q, out in outs.items():
+            fp8_max = FP8_MAX[q]
+            scale = torch.where(max_val == 0, one, torch.clamp(max_val.float() / fp8_max, min=1e-12))
+            dst = out.view(-1)
+            for i in range(0, numel, step):
+                tile = buf[:min(step, numel - i)]
+                # Widen first: dividing the 16-bit slice would round in 16 bits before the float32 tile
+                tile.copy_(flat[i:i + step])
+                tile.div_(scale)
+                dst[i:i + step].copy_(tile.clamp_(-fp8_max, fp8_max))
+            scaled[q] = (out, scale.reshape(()).cpu())
+        return scaled
+
+    def dequantize(self, q, scale, st_dtype: str):
+        return (q.to(self.device).float() * scale.to(self.device)).to(getattr(self.torch, TORCH_DTYPE_NAMES[st_dtype]))
+
+
+class NumpyBackend:
+    """The same tiled kernels on NumPy arrays; FP8 and BF16 come from ml_dtypes."""
+
+    name = "numpy"
+
+    def __init__(self):
+        import numpy as np
+        import ml_dtypes
+        self.np = np
+        self.dtypes = {"F16": np.float16, "F32": np.float32, "F64": np.float64, "BF16": ml_dtypes.bfloat16,
+                       "float8_e4m3fn": ml_dtypes.float8_e4m3fn, "float8_e5m2": ml_dtypes.float8_e5m2}
+
+    def asarray(self, x):
+        if isinstance(x, self.np.ndarray):
+            return x
+        # torch tensor: .numpy() has no bfloat16 / float8, so go through a same-width integer view
+        import torch
+        name = str(x.dtype).replace("torch.", "")
+        x = x.detach().cpu()
+        if name == "bfloat16":
+            return x.view(torch.int16).numpy().view(self.dtypes["BF16"])
+        if name in FP8_MAX:
+            return x.view(torch.uint8).numpy().view(self.dtypes[name])
+        return x.numpy()
+
+    def cast(self, x, st_dtype: str):
+        return x.astype(self.dtypes[st_dtype])
+
+    def synchronize(self) -> None:
+        pass
+
+    def _absmax(self, flat, buf):
+        np = self.np
+        step, numel = buf.size, flat.size
+        max_val = flat.dtype.type(0)
+        for i in range(0, numel, step):
+            tile = buf[:min(step, numel - i)]
+            np.abs(flat[i:i + step], out=tile)
+            max_val = np.maximum(max_val, tile.max())
+        return max_val
+
+    def quantize(self, weight, quant_dtypes, tile_bytes: int) -> dict:
+        np = self.np
+        flat = weight.reshape(-1)
+        outs = {q: np.empty(weight.shape, dtype=self.dtypes[q]) for q in quant_dtypes}
+        numel = flat.size
+        if numel == 0: return outs
+
+        step = max(1, min(numel, tile_bytes // flat.itemsize))
+        buf = np.empty(step, dtype=flat.dtype)
+        max_val = self._absmax(flat, buf)
+        t = flat.dtype.type
+
+        # e5m2's range (57344) times 127 overflows F16 to inf, as it does on the torch backend; no warning per tile
+        with np.errstate(over="ignore"):
+            for q, out in outs.items():
+                scale = t(1) if max_val == 0 else np.maximum(max_val / t(FP8_MAX[q]), t(1e-12))
+                dst = out.reshape(-1)
+                for i in range(0, numel, step):
+                    tile = buf[:min(step, numel - i)]
+                    np.divide(flat[i:i + step], scale, out=tile)
+                    tile *= t(127.0)
+                    np.rint(tile, out=tile)
+                    tile /= t(127.0)
+                    tile *= scale
+                    dst[i:i + step] = tile
+        return outs
+
+    def quantize_scaled(self, weight, quant_dtypes, tile_bytes: int) -> dict:
+        np = self.np
+        flat = weight.reshape(-1)
+        outs = {q: np.empty(weight.shape, dtype=self.dtypes[q]) for q in quant_dtypes}
+        numel = flat.size
+        if numel == 0: return {q: (out, np.float32(1)) for q, out in outs.items()}
+
+        step = max(1, min(numel, tile_bytes // 4))
+        buf = np.empty(step, dtype=np.float32)
+        max_val = np.float32(self._absmax(flat, buf if flat.dtype == np.float32 else np.empty(step, dtype=flat.dtype)))
+
+        scaled = {}
+        for q, out in outs.items():
+            fp8_max = np.float32(FP8_MAX[q])
+            scale = np.float32(1) if max_val == 0 else np.maximum(max_val / fp8_max, np.float32(1e-12))
+            dst = out.reshape(-1)
+            for i in range(0, numel, step):
+                tile = buf[:min(step, numel - i)]
+                # Widen first, as the torch kernel does, whatever NumPy's promotion rules make of f16 / f32
+                tile[...] = flat[i:i + step]
+                tile /= scale
+                np.clip(tile, -fp8_max, fp8_max, out=tile)
+                dst[i:i + step] = tile
+            scaled[q] = (out, np.array(scale, dtype=np.float32))
+        return scaled
+
+    def dequantize(self, q, scale, st_dtype: str):
+        return (q.astype(self.np.float32) * self.np.float32(scale)).astype(self.dtypes[st_dtype])
+
+
+def auto_order() -> tuple[str, ...]:
+    """Backends ``auto`` tries, in order: torch-cuda first where CUDA is available, then `AUTO_ORDER`."""
+    if importlib.util.find_spec("torch") is not None:
+        try:
+            import torch
+            if torch.cuda.is_available():
+                return ("torch-cuda",) + AUTO_ORDER
+        except Exception as e:  # a broken torch install still leaves numpy
+            logging.debug(f"torch CUDA probe failed: {e}")
+    return AUTO_ORDER
+
+
+def make_backend(name: str = "auto"):
+    """Backend by name; ``auto`` tries torch-cuda on a CUDA host, then numpy, then torch-cpu."""
+    if name == "auto":
+        for candidate in auto_order():
+            try:
+                return make_backend(candidate)
+            except (ImportError, RuntimeError):
+                continue
+        raise ImportError("No FP8 backend available: install torch, or numpy + ml_dtypes")
+    if name == "torch-cuda":
+        return TorchBackend("cuda")
+    if name == "torch-cpu":
+        return TorchBackend("cpu")
+    if name == "numpy":
+        return NumpyBackend()
+    raise ValueError(f"Unknown FP8 backend: {name} (choose from auto, {', '.join(BACKENDS)})")
+
+
+def fp8_available() -> bool:
+    """Whether some backend can be built, without importing torch or NumPy."""
+    found = lambda mod: importlib.util.find_spec(mod) is not None
+    return found("torch") or (found("numpy") and found("ml_dtypes"))
+
+
+def available_backends() -> list[str]:
+    names = []
+    for name in BACKENDS:
+        try:
+            make_backend(name)
+        except (ImportError, RuntimeError):
+            continue
+        names.append(name)
+    return names
+
+
+# ---------------- quantizer ----------------
+
+class FP8Quantizer:
+    def __init__(self, quant_dtype: str = "float8_e5m2", *, backend: str = "auto", tile_mb: int = DEFAULT_TILE_MB,
+                 workers: int = 1, inflight_mb: int = DEFAULT_INFLIGHT_MB, scaled: bool = False,
+                 policy: QuantPolicy | str | None = None, timing: bool = False, resume: bool = False,
+                 cache: TensorCache | None = None, transcode: bool = False):
+        if quant_dtype not in FP8_MAX: raise ValueError(f"Unsupported: {quant_dtype}")
+        self.quant_dtype = quant_dtype
+        self.backend = make_backend(backend)
+        self.tile_bytes = tile_mb << 20
+        # Independent tensors are quantized on a thread pool (torch and NumPy kernels release the GIL)
+        self.workers = max(1, workers)
+        self.inflight_bytes = inflight_mb << 20
+        # Scaled FP8: weights stored as w / scale with a float32 .scale_weight each (ComfyUI *_scaled modes)
+        self.scaled = scaled
+        # Per-layer precision; a path is loaded as a policy file, None is the built-in guard
+        self.policy = policy if isinstance(policy, QuantPolicy) else QuantPolicy.load(policy)
+        self.timing = timing
+        self.timings = []
+        # Keep .partial outputs (plus a journal) when stopped, and continue them on the next run
+        self.resume = resume
+        self.cache = cache
+        # .pt / .ckpt sources are first written once to <src>.safetensors and converted from there
+        self.transcode = transcode
+        self._scales = {}
+
+    def quantize(self, weight, name: str, quant_dtypes) -> dict:
+        """Quantize *weight* to every FP8 dtype in *quant_dtypes* (absmax shared): ``{quant_dtype: array}``.
+
+        In scaled mode the values are ``(array, float32 scale)`` pairs.
+        """
+        weight = self.backend.asarray(weight)
+        kernel = self.backend.quantize_scaled if self.scaled else self.backend.quantize
+        if not self.timing:
+            return kernel(weight, quant_dtypes, self.tile_bytes)
+        start = time.perf_counter()
+        outs = kernel(weight, quant_dtypes, self.tile_bytes)
+        self.backend.synchronize()
+        self.timings.append((name, time.perf_counter() - start, math.prod(weight.shape)))
+        return outs
+
+    def print_timings(self, top: int | None = None):
+        if not self.timings: return
+        total = sum(t for _, t, _ in self.timings)
+        print(f"  FP8 timing ({self.backend.name}): {len(self.timings)} tensors quantized in {total:.2f}s (slowest first)")
+        for name, t, numel in sorted(self.timings, key=lambda x: x[1], reverse=True)[:top]:
+            print(f"    {t * 1000:9.1f} ms  {numel / max(t, 1e-9) / 1e9:6.2f} Gelem/s  {name}")
+
+    def layout(self, shards, quant_dtype: str, unet_only: bool = True):
+        return fp8_layout(shards, quant_dtype=quant_dtype, unet_only=unet_only, policy=self.policy,
+                          scaled=self.scaled)
+
+    def _convert(self, name, tensor, dtypes) -> dict:
+        # write_variants callback: {out safetensors dtype: array} for one source tensor
+        quant_names = {st: q for q, st in QUANT_ST_DTYPES.items()}
+        outs = {}
+        quant = [quant_names[d] for d in dtypes if d in quant_names]
+        if quant:
+            for q, t in self.quantize(tensor, name, quant).items():
+                if self.scaled:
+                    t, self._scales[(q, name)] = t
+                outs[QUANT_ST_DTYPES[q]] = t
+        for d in dtypes:
+            if d not in quant_names:
+                outs[d] = self.backend.cast(self.backend.asarray(tensor), d)
+        return outs
+
+    def _convert_cached(self, name, tensor, dtypes) -> dict:
+        # _convert behind the tensor cache: hits come back as raw bytes (plus the 4-byte scale when scaled)
+        quant_names = {st: q for q, st in QUANT_ST_DTYPES.items()}
+        if not any(d in quant_names for d in dtypes):
+            return self._convert(name, tensor, dtypes)
+        digest = source_digest(tensor_bytes(tensor))
+        params = dict(op="fp8", src=str(tensor.dtype).replace("torch.", ""), shape=list(tensor.shape),
+                      kernel=KERNEL_VERSION, backend=self.backend.name, scaled=self.scaled, tile=self.tile_bytes)
+        keys = {d: self.cache.key(digest, dtype=d, **params) for d in dtypes if d in quant_names}
+        outs, missing = {}, [d for d in dtypes if d not in keys]
+        for d, key in keys.items():
+            data = self.cache.get(key)
+            if data is None:
+                missing.append(d)
+            elif self.scaled:
+                data = memoryview(data)
+                outs[d], self._scales[(quant_names[d], name)] = data[:-4], data[-4:]
+            else:
+                outs[d] = data
+        if missing:
+            for d, t in self._convert(name, tensor, missing).items():
+                if d in keys:
+                    # Writers take the raw bytes just as well, and a GPU result is copied back only once
+                    t = tensor_bytes(t)
+                    if self.scaled:
+                        scale = self._scales[(quant_names[d], name)] = tensor_bytes(self._scales[(quant_names[d], name)])
+                        self.cache.put(keys[d], t, scale)
+                    else:
+                        self.cache.put(keys[d], t)
+                outs[d] = t
+        return outs
+
+    def _derived(self, out_dtypes, name):
+        # scale_weight tensors (written right after their weight) and the scaled_fp8 marker;
+        # *out_dtypes* maps names to their dtype in this output (a policy may mix FP8 formats)
+        if name.endswith("scaled_fp8"):
+            return b""
+        weight = name[:-len("scale_weight")] + "weight"
+        return self._scales[({st: q for q, st in QUANT_ST_DTYPES.items()}[out_dtypes[weight]], weight)]
+
+    def convert_file(self, src, dst, unet_only=True, should_stop=None, progress=None) -> bool:
+        return self.convert_variants(src, [(self.quant_dtype, dst, unet_only)], should_stop, progress)[dst]
+
+    def convert_variants(self, src, variants, should_stop=None, progress=None) -> dict:
+        """Write every ``(quant_dtype, dst, unet_only)`` of *variants* from one read of *src*.
+
+        Each source tensor is read once and its absmax computed once; each FP8
+        dtype is quantized once and written to every output that wants it.
+        Returns ``{dst: ok}`` — False when *should_stop* fired or nothing was
+        selected. *progress(i, total)* is called per tensor.
+        """
+        try:
+            if not (src.endswith(".safetensors") or is_shard_index(src)) and self.transcode:
+                src = transcode(src, should_stop)
+                if src is None: return {dst: False for _, dst, _ in variants}
+            if src.endswith(".safetensors") or is_shard_index(src):
+                return self._convert_streamed(src, variants, should_stop, progress)
+            return self._convert_loaded(src, variants, should_stop)
+        finally:
+            self._scales.clear()
+            if isinstance(self.backend, TorchBackend) and self.backend.device.type == "cuda":
+                self.backend.torch.cuda.empty_cache()
+
+    def _convert_streamed(self, src, variants, should_stop, progress) -> dict:
+        # Header-driven: skipped tensors never leave disk, each tensor is written as soon as it is quantized
+        shards = [(p, read_header(p)[0]) for p in shard_paths(src)]
+        total = sum(len(t) for _, t in shards)
+        results = {dst: False for _, dst, _ in variants}
+        layouts, out_dtypes = {}, {}
+        for q, dst, unet_only in variants:
+            layout = self.layout(shards, q, unet_only)
+            logging.info(f"[FP8] {os.path.basename(dst)}: {len(layout)} of {total} tensors selected. Unet Only: {unet_only}")
+            if layout:
+                layouts[dst], out_dtypes[dst] = layout, {name: dtype for _, name, dtype, _ in layout}
+        if not layouts: return results
+
+        if self.workers > 1 and isinstance(self.backend, TorchBackend):
+            self.backend.torch.set_num_threads(intra_op_threads(self.workers))
+        # FP8 sources that stay in their format are copied as-is, unless scaled mode needs their scale
+        convert = self._convert_cached if self.cache else self._convert
+        if write_variants(src, layouts, convert, convert_dtypes=FP8_ST_DTYPES if self.scaled else (),
+                          should_stop=should_stop, progress=progress, workers=self.workers,
+                          budget_bytes=self.inflight_bytes,
+                          derived=lambda dst, name: self._derived(out_dtypes[dst], name),
+                          arrays=isinstance(self.backend, NumpyBackend), resume=self._fingerprint()):
+            results.update((dst, True) for dst in layouts)
+        if self.timing: self.print_timings()
+        return results
+
+    def _fingerprint(self) -> dict | None:
+        if not self.resume: return None
+        return {**output_params(self.scaled, self.policy), "backend": self.backend.name}
+
+    def _convert_loaded(self, src, variants, should_stop) -> dict:
+        # .pt / .ckpt: memory-mapped, weights-only load; the same layout rules apply and each
+        # tensor is written as soon as it is converted, so storages are paged in one at a time
+        state = load_state_dict(src)
+        infos = tensor_infos(state)
+        results = {}
+        for quant_dtype, dst, unet_only in variants:
+            layout = self.layout([(src, infos)], quant_dtype, unet_only)
+            logging.info(f"[FP8] {os.path.basename(dst)}: {len(layout)} of {len(infos)} tensors selected. Unet Only: {unet_only}")
+            results[dst] = bool(layout) and self._write_loaded(state, infos, layout, dst, should_stop)
+        if self.timing: self.print_timings()
+        return results
+
+    def _write_loaded(self, state, infos, layout, dst, should_stop) -> bool:
+        out_dtypes = {name: dtype for _, name, dtype, _ in layout}
+        out = StreamWriter(dst, [(name, dtype, shape) for _, name, dtype, shape in layout])
+        try:
+            for path, name, dtype, _ in layout:
+                if should_stop and should_stop():
+                    out.abort()
+                    return False
+                if path is None:
+                    out.write(name, self._derived(out_dtypes, name))
+                elif dtype == infos[name]["dtype"] and not (self.scaled and dtype in FP8_ST_DTYPES):
+                    out.write(name, state[name])
+                else:
+                    out.write(name, self._convert(name, state[name], [dtype])[dtype])
+        except BaseException:
+            out.abort()
+            raise
+        out.close()
+        return True
+
+
+# ---------------- parity / benchmark ----------------
+
+def _sample(numel: int, seed: int = 0):
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    a = rng.standard_normal(numel, dtype=np.float32)
+    a[: numel // 64] *= 40.0  # a few outliers so the absmax actually matters
+    a[numel // 64: numel // 32] = 0.0
+    return a
+
+
+def parity(numel: int = 1 << 20, dtypes=("F16", "BF16", "F32"), tile_mb: int = 1) -> bool:
+    """Quantize the same sample with every available backend and compare the FP8 bytes to the first one."""
+    names = available_backends()
+    if len(names) < 2:
+        print(f"Need two backends to compare, found: {', '.join(names) or 'none'}")
+        return True
+    sample = _sample(numel)
+    ok = True
+    for scaled in (False, True):
+        for st in dtypes:
+            for q in FP8_MAX:
+                ref = None
+                for name in names:
+                    qz = FP8Quantizer(q, backend=name, tile_mb=tile_mb, scaled=scaled)
+                    b = qz.backend
+                    x = b.cast(b.asarray(sample), st)
+                    out = qz.quantize(x, "parity", [q])[q]
+                    raw = tensor_bytes(out[0] if scaled else out)
+                    if scaled and ref is None:
+                        # scaled FP8 round trip: w ≈ q * scale_weight, within FP8 precision of the absmax
+                        back = b.dequantize(*out, "F32")
+                        err = float(abs(tensor_bytes(back).view("f4") - tensor_bytes(b.cast(x, "F32")).view("f4")).max())
+                        print(f"  {'':8} {st:>4} → {q:<13} scaled round trip ({name}): max abs error {err:.4g}")
+                    if ref is None:
+                        ref_name, ref = name, raw
+                        continue
+                    diff = int((raw != ref).sum())
+                    status = "OK" if diff == 0 else "MISMATCH"
+                    ok &= diff == 0
+                    print(f"  {status:8} {st:>4} → {q:<13} {'scaled' if scaled else 'plain ':6} "
+                          f"{name} vs {ref_name}: {diff} of {numel} bytes differ")
+    return ok
+
+
+def bench(mb: int = 256, repeat: int = 3, st: str = "F16", tile_mb: int = DEFAULT_TILE_MB) -> dict:
+    """Best-of-*repeat* throughput in GB/s of source bytes, per backend and FP8 dtype."""
+    from safetensors_stream import DTYPE_SIZES
+    sample = _sample((mb << 20) // DTYPE_SIZES[st])
+    results = {}
+    for name in available_backends():
+        for q in FP8_MAX:
+            qz = FP8Quantizer(q, backend=name, tile_mb=tile_mb)
+            b = qz.backend
+            x = b.cast(b.asarray(sample), st)
+            if isinstance(b, TorchBackend): x = x.to(b.device)
+            best = float("inf")
+            for _ in range(repeat):
+                start = time.perf_counter()
+                qz.quantize(x, "bench", [q])
+                b.synchronize()
+                best = min(best, time.perf_counter() - start)
+            results[f"{name}/{q}"] = round((mb << 20) / best / 1e9, 3)
+            print(f"  {name:10} {st} → {q:<13} {results[f'{name}/{q}']:8.3f} GB/s")
+    return results
+
+
+def coldstart(src: str, backends=None) -> dict:
+    """Seconds for a fresh interpreter to import this module and convert *src*, per backend.
+
+    Each run is its own process, so interpreter start and backend imports are
+    included — the cost a one-off conversion really pays.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    results = {}
+    for name in backends or BACKENDS:
+        with tempfile.TemporaryDirectory() as tmp:
+            code = (f"import sys; sys.path.insert(0, {here!r}); from fp8_engine import FP8Quantizer; "
+                    f"sys.exit(0 if FP8Quantizer(backend={name!r}).convert_file({src!r}, {os.path.join(tmp, 'out.safetensors')!r}) else 1)")
+            start = time.perf_counter()
+            proc = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+            elapsed = time.perf_counter() - start
+        if proc.returncode != 0:
+            print(f"  {name:10} unavailable ({(proc.stderr.strip().splitlines() or ['failed'])[-1]})")
+            continue
+        results[name] = round(elapsed, 3)
+        print(f"  {name:10} {elapsed:7.2f} s  (import + convert {os.path.basename(src)})")
+    return results
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="FP8 engine parity check and benchmarks")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("parity", help="Compare every available backend byte-for-byte")
+    p.add_argument("--numel", type=int, default=1 << 20, help="Elements in the random sample (default: 1M)")
+    b = sub.add_parser("bench", help="Quantization throughput per backend")
+    b.add_argument("--mb", type=int, default=256, help="Sample size in MiB of source dtype (default: 256)")
+    b.add_argument("--repeat", type=int, default=3, help="Runs per backend; the best is reported (default: 3)")
+    b.add_argument("--dtype", choices=("F16", "BF16", "F32"), default="F16", help="Source dtype (default: F16)")
+    b.add_argument("--json", help="Also write the results to this JSON file")
+    c = sub.add_parser("coldstart", help="Time a fresh-process conversion of one file per backend")
+    c.add_argument("--src", required=True, help="A (small) .safetensors checkpoint to quantize")
+    c.add_argument("--backend", action="append", choices=BACKENDS, help="Only these backends (repeatable)")
+    args = ap.parse_args()
+
+    if args.cmd == "coldstart":
+        coldstart(args.src, args.backend)
+        return
+    print(f"Backends: {', '.join(available_backends()) or 'none'}")
+    if args.cmd == "parity":
+        sys.exit(0 if parity(args.numel) else 1)
+    results = bench(args.mb, args.repeat, args.dtype)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"dtype": args.dtype, "mb": args.mb, "gb_per_s": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -51,12 +51,18 @@ except ImportError:
     uploader = None
     UPLOADER_AVAILABLE = False
 
-try:
-    import torch
-    from safetensors.torch import save_file, load_file
-    TORCH_AVAILABLE = True
-except ImportError:
-    TORCH_AVAILABLE = False
+import conversion_api
+from safetensors_stream import checkpoint_stem, is_shard_index, shard_paths
+from conversion_plan import plan_dequantize, plan_fp8_quantize, predict_outputs
+from fp8_engine import BACKENDS, DEFAULT_INFLIGHT_MB as FP8_INFLIGHT_MB, FP8Quantizer, fp8_available, output_params
+from quant_policy import QuantPolicy
+from batch_scheduler import Scheduler, raise_if_disk_full
+from quant_pool import plan_pool, quantize_cmd, warm
+from build_manifest import Manifest, RemoteFiles, read_record
+from tensor_cache import DEFAULT_CACHE_GB, TensorCache
+
+# torch is only imported once a stage actually needs it; this just checks that some FP8 backend exists
+FP8_AVAILABLE = fp8_available()
 
 # --- CONFIGURATION GROUPS ---
 QUANT_GROUPS = [
@@ -73,60 +79,16 @@ QUANT_GROUPS = [
 ]
 QUANTIZATION_OPTIONS = [item for sublist in QUANT_GROUPS for item in sublist]
 
-# --- FP8 LOGIC ---
-if TORCH_AVAILABLE:
-    class FP8Quantizer:
-        def __init__(self, quant_dtype: str = "float8_e5m2"):
-            if not hasattr(torch, quant_dtype): raise ValueError(f"Unsupported: {quant_dtype}")
-            self.quant_dtype = quant_dtype
-
-        def quantize_weights(self, weight: torch.Tensor) -> torch.Tensor:
-            if not weight.is_floating_point(): return weight
-            target_device = torch.device("cuda") if torch.cuda.is_available() else torch.device("cpu")
-            weight_on_target = weight.to(target_device)
-            max_val = torch.max(torch.abs(weight_on_target))
-            if max_val == 0:
-                target_torch_dtype = getattr(torch, self.quant_dtype)
-                return torch.zeros_like(weight_on_target, dtype=target_torch_dtype)
-            scale = max_val / 127.0 
-            scale = torch.max(scale, torch.tensor(1e-12, device=target_device, dtype=weight_on_target.dtype))
-            quantized = torch.round(weight_on_target / scale * 127.0) / 127.0 * scale
-            return quantized.to(dtype=getattr(torch, self.quant_dtype))
-
-        def apply_quantization_to_file(self, src_path, dst_path, unet_only=True, check_stop_func=None):
-            if src_path.endswith(".safetensors"): state_dict = load_file(src_path)
-            else: state_dict = torch.load(src_path, map_location="cpu")
-            
-            quantized_dict = {}
-            total = len(state_dict)
-            logging.info(f"[FP8] Loaded {total} tensors. Unet Only: {unet_only}")
-
-            for i, (name, param) in enumerate(state_dict.items()):
-                if check_stop_func and check_stop_func(): return False
-                if unet_only and "model.diffusion_model" not in name: continue 
-                if i % 100 == 0: logging.info(f"[FP8] Processing {i}/{total}...")
-                
-                if isinstance(param, torch.Tensor) and param.is_floating_point():
-                    quantized_dict[name] = self.quantize_weights(param)
-                else:
-                    quantized_dict[name] = param
-            
-            if not quantized_dict: return False
-            save_file(quantized_dict, dst_path)
-            del state_dict; del quantized_dict
-            if torch.cuda.is_available(): torch.cuda.empty_cache()
-            return True
-else:
-    class FP8Quantizer:
-        def __init__(self, *args, **kwargs): pass
-
 # --- GUI UTILS ---
 class DualOutput:
-    def __init__(self, original_stream, text_widget):
+    """Tees a stream into the log widget; with *threads*, only writes from those thread ids are mirrored."""
+    def __init__(self, original_stream, text_widget, threads=None):
         self.original_stream = original_stream
         self.text_widget = text_widget
+        self.threads = threads
     def write(self, message):
         self.original_stream.write(message)
+        if self.threads is not None and threading.get_ident() not in self.threads: return
         if message.strip() and not message.startswith('\r'): 
             def update():
                 try:
@@ -192,6 +154,7 @@ class ProgressPopup(tk.Toplevel):
         elif status == "ERROR": lbl.config(bg="#ff9999", text="Error")
         elif status == "SKIP": lbl.config(bg="#eeeeee", text="-")
         elif status == "CANCEL": lbl.config(bg="#ffcc00", text="Cancel")
+        elif status == "WAIT_DISK": lbl.config(bg="#ffb366", text="Disk full")
         else: lbl.config(bg="#cccccc", text="...")
 
 # --- MAIN APP ---
@@ -210,10 +173,12 @@ class ConverterApp:
         self.custom_file_data = {} 
         
         self.is_running = False
+        # Scheduler threads currently uploading; their stdout / stderr is mirrored to the log
+        self.upload_threads = set()
         self.quant_vars_gen = {}
         self.quant_vars_up = {}
         self.quant_vars_keep = {}
-        self.current_process = None
+        self.processes = set()
         self.stop_requested = False
         self.progress_window = None
         
@@ -333,7 +298,7 @@ class ConverterApp:
         # 4. Quants
         f_quant = tk.LabelFrame(self.content_frame, text="4. Quantization", padx=5, pady=5)
         f_quant.pack(fill="x", padx=5, pady=5)
-        if not TORCH_AVAILABLE: tk.Label(f_quant, text="⚠️ Torch missing. FP8 disabled.", fg="red").grid(row=0, column=0, columnspan=10)
+        if not FP8_AVAILABLE: tk.Label(f_quant, text="⚠️ Torch / NumPy + ml_dtypes missing. FP8 disabled.", fg="red").grid(row=0, column=0, columnspan=10)
         for col_idx, group in enumerate(QUANT_GROUPS):
             base_col = col_idx * 5  
             tk.Label(f_quant, text="Type", font="Arial 8 bold").grid(row=1, column=base_col, sticky="w")
@@ -349,7 +314,7 @@ class ConverterApp:
                 self.quant_vars_up[q] = vu
                 self.quant_vars_keep[q] = vk
                 state = "normal"
-                if "FP8" in q and not TORCH_AVAILABLE: state = "disabled"
+                if "FP8" in q and not FP8_AVAILABLE: state = "disabled"
                 def sync(g=vg, u=vu, k=vk): 
                     if g.get(): 
                         u.set(True)
@@ -407,6 +372,39 @@ class ConverterApp:
         self.keep_convert_var = tk.BooleanVar(value=False)
         tk.Checkbutton(f_c, text="Keep Dequant Source", variable=self.keep_dequant_var, fg="orange").pack(side="left", padx=10)
         tk.Checkbutton(f_c, text="Keep GGUF Source (CONVERT)", variable=self.keep_convert_var, fg="orange").pack(side="left")
+        self.fp8_workers_var = tk.IntVar(value=1)
+        tk.Label(f_c, text="FP8 Workers:").pack(side="left", padx=(10, 0))
+        tk.Spinbox(f_c, from_=1, to=max(1, os.cpu_count() or 1), width=4, textvariable=self.fp8_workers_var).pack(side="left")
+        self.fp8_scaled_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(f_c, text="Scaled FP8 (scale_weight)", variable=self.fp8_scaled_var).pack(side="left", padx=10)
+        self.fp8_backend_var = tk.StringVar(value="auto")
+        tk.Label(f_c, text="FP8 Backend:").pack(side="left")
+        ttk.Combobox(f_c, textvariable=self.fp8_backend_var, values=("auto", *BACKENDS), width=10, state="readonly").pack(side="left")
+        f_p = tk.Frame(self.footer_frame)
+        f_p.pack(pady=(5, 0))
+        self.fp8_policy_var = tk.StringVar()
+        tk.Label(f_p, text="FP8 Policy (JSON, empty = built-in):").pack(side="left")
+        tk.Entry(f_p, textvariable=self.fp8_policy_var, width=60).pack(side="left", padx=5)
+        tk.Button(f_p, text="Browse", command=self.browse_policy).pack(side="left")
+        self.fp8_resume_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(f_p, text="Resumable FP8", variable=self.fp8_resume_var).pack(side="left", padx=10)
+        self.fp8_transcode_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(f_p, text="Transcode .pt once", variable=self.fp8_transcode_var).pack(side="left")
+        f_k = tk.Frame(self.footer_frame)
+        f_k.pack(pady=(5, 0))
+        self.cache_dir_var = tk.StringVar()
+        tk.Label(f_k, text="Tensor Cache (folder, empty = off):").pack(side="left")
+        tk.Entry(f_k, textvariable=self.cache_dir_var, width=50).pack(side="left", padx=5)
+        tk.Button(f_k, text="Browse", command=self.browse_cache).pack(side="left")
+        self.cache_gb_var = tk.IntVar(value=DEFAULT_CACHE_GB)
+        tk.Label(f_k, text="Max GB:").pack(side="left", padx=(10, 0))
+        tk.Spinbox(f_k, from_=1, to=10000, width=6, textvariable=self.cache_gb_var).pack(side="left")
+        self.disk_budget_var = tk.IntVar(value=0)
+        tk.Label(f_k, text="Disk Budget GB (0 = off):").pack(side="left", padx=(10, 0))
+        tk.Spinbox(f_k, from_=0, to=100000, width=7, textvariable=self.disk_budget_var).pack(side="left")
+        self.quant_jobs_var = tk.IntVar(value=0)
+        tk.Label(f_k, text="Quant Jobs (0 = auto):").pack(side="left", padx=(10, 0))
+        tk.Spinbox(f_k, from_=0, to=max(1, os.cpu_count() or 1), width=4, textvariable=self.quant_jobs_var).pack(side="left")
         f_sets.columnconfigure(2, weight=1)
 
         # 6. Actions
@@ -576,6 +574,14 @@ class ConverterApp:
         f = filedialog.askopenfilename(filetypes=ftypes)
         if f: self.python_path_var.set(os.path.normpath(f))
     
+    def browse_policy(self):
+        f = filedialog.askopenfilename(filetypes=[("Policy JSON", "*.json"), ("All Files", "*.*")])
+        if f: self.fp8_policy_var.set(os.path.normpath(f))
+
+    def browse_cache(self):
+        d = filedialog.askdirectory()
+        if d: self.cache_dir_var.set(os.path.normpath(d))
+
     def restart(self):
         target = self.python_path_var.get()
         if not os.path.exists(target): return messagebox.showerror("Error", "Python not found")
@@ -598,8 +604,8 @@ class ConverterApp:
         if messagebox.askyesno("Cancel", "Stop processing?"):
             self.stop_requested = True
             logging.warning("STOP REQUESTED")
-            if self.current_process:
-                try: self.current_process.kill()
+            for proc in list(self.processes):
+                try: proc.kill()
                 except: pass
 
     def process_queue(self):
@@ -621,6 +627,9 @@ class ConverterApp:
         up_only = [q for q, v in self.quant_vars_up.items() if v.get()]
         if not gen and not up_only: return messagebox.showerror("Error", "Select at least one Generate or Upload option.")
         
+        bad = self.preflight(gen)
+        if bad: return messagebox.showerror("Invalid Inputs", "\n".join(bad))
+
         self.stop_requested = False
         steps = []
         SORT_ORDER = ["IQ2_XS", "IQ2_S", "Q2_K", "IQ3_XXS", "IQ3_S", "IQ3_M", "Q3_K_S", "Q3_K_M", "Q3_K_L",
@@ -646,12 +655,46 @@ class ConverterApp:
         self.btn_run.config(state="disabled")
         threading.Thread(target=self.run_main_logic, args=(gen, up_only)).start()
 
+    def preflight(self, gen_list):
+        # Header-only check of every safetensors source; no tensor data is read
+        bad = []
+        try: policy = QuantPolicy.load(self.fp8_policy_var.get())
+        except (OSError, ValueError) as e: return [f"FP8 policy: {e}"]
+        for f in self.source_files:
+            if not (f.lower().endswith(".safetensors") or is_shard_index(f.lower())): continue
+            plans = []
+            for q in gen_list:
+                if "FP8" in q:
+                    dtype = "float8_e5m2" if "E5M2" in q else "float8_e4m3fn"
+                    plans.append(plan_fp8_quantize(f, quant_dtype=dtype, unet_only=("All" not in q),
+                                                   policy=policy, scaled=self.fp8_scaled_var.get()))
+            if any("FP8" not in q for q in gen_list):
+                plans.append(plan_dequantize(f, dtype="fp16", strip_fp8=True))
+            errors = [e for p in plans for e in p["errors"]]
+            if errors: bad.append(f"{os.path.basename(f)}: {'; '.join(errors)}")
+        return bad
+
     def run_main_logic(self, gen_list, up_list):
         try:
             strategy = self.cleanup_mode.get()
             keep_list = [q for q, v in self.quant_vars_keep.items() if v.get()]
             keep_dequant = self.keep_dequant_var.get()
             keep_convert = self.keep_convert_var.get()
+            try: fp8_workers = max(1, self.fp8_workers_var.get())
+            except tk.TclError: fp8_workers = 1
+            fp8_scaled = self.fp8_scaled_var.get()
+            fp8_resume = self.fp8_resume_var.get()
+            try: cache_gb = max(1, self.cache_gb_var.get())
+            except tk.TclError: cache_gb = DEFAULT_CACHE_GB
+            cache = TensorCache(self.cache_dir_var.get(), cache_gb) if self.cache_dir_var.get() else None
+            try: disk_budget = max(0, self.disk_budget_var.get()) << 30
+            except tk.TclError: disk_budget = 0
+            # llama-quantize levels run at once per model; 0 sizes the pool from the cores and free RAM
+            try: quant_jobs = max(0, self.quant_jobs_var.get())
+            except tk.TclError: quant_jobs = 0
+            fp8_opts = dict(backend=self.fp8_backend_var.get(), workers=fp8_workers, scaled=fp8_scaled,
+                            policy=QuantPolicy.load(self.fp8_policy_var.get()), resume=fp8_resume, cache=cache,
+                            transcode=self.fp8_transcode_var.get())
             out_mode = self.out_mode_var.get()
             up_mode = self.upload_mode_var.get()
             
@@ -659,168 +702,69 @@ class ConverterApp:
                 from huggingface_hub import login
                 login(token=self.hf_token.get(), add_to_git_credential=False)
 
-            batch_results = []
+            # Every model's steps go into one dependency graph; independent steps of different
+            # models (one's upload, another's quantization) overlap within the resource budgets
+            sched = Scheduler(disk_budget=disk_budget or None,
+                              on_state=lambda task, cell, state: self.msg_queue.put(("UPDATE_GRID", *cell, state)),
+                              should_stop=lambda: self.stop_requested)
+            # Targets whose build record is current on the Hub (same LFS hash) aren't made again
+            remote = RemoteFiles(self.hf_token.get()) if self.do_upload.get() and UPLOADER_AVAILABLE else None
+            def remote_sha(m, q, path):
+                if not remote or q not in up_list: return None
+                r_gguf, d_gguf, r_fp8, d_fp8 = self.upload_targets(m, up_mode, out_mode)
+                fp8 = "FP8" in q
+                return remote.sha256(r_fp8 if fp8 else r_gguf, d_fp8 if fp8 else d_gguf, os.path.basename(path))
+            models = [self.add_model_tasks(sched, i, f, gen_list, up_list, fp8_opts, cache, out_mode, keep_dequant, keep_convert,
+                                           remote_sha, quant_jobs) for i, f in enumerate(self.source_files)]
+
+            # Each artifact is uploaded as soon as its own step finishes and deleted once its own upload
+            # succeeded, so model N uploads while model N+1 quantizes. "After All Complete" holds back
+            # every upload / cleanup until all models are converted
+            all_steps = [k for m in models for k in m["tasks"]]
+            do_upload = self.do_upload.get() and UPLOADER_AVAILABLE
+            uploads = {}
+            for m in models:
+                uploads[m["id"]] = {}
+                for q, step in m["artifacts"].items():
+                    if not (do_upload and q in up_list): continue
+                    key = uploads[m["id"]][q] = f"{step}:upload"
+                    sched.add(key, lambda m=m, q=q: self.upload_model(m, [q], up_mode, out_mode), needs={"net": 1},
+                              requires=[step], after=all_steps if strategy == "all_end" else [])
+            all_uploads = [k for ups in uploads.values() for k in ups.values()]
+            for m in models:
+                deletes = []
+                for q, step in m["artifacts"].items():
+                    up = uploads[m["id"]].get(q)
+                    deletes.append(f"{step}:cleanup")
+                    # A fixed quant's space was claimed by its quantize step (the UnFixed file it renames)
+                    sched.add(deletes[-1], lambda m=m, q=q: self.cleanup_model(m, keep_list, keep_dequant, keep_convert, [q]),
+                              requires=[up or step], after=[*all_steps, *all_uploads] if strategy == "all_end" else [],
+                              frees=[] if q in keep_list else [step, step.replace(" fix-5d", " quantize")])
+
+                ups = list(uploads[m["id"]].values())
+                sched.add(f"{m['id']}:upload", lambda ups=ups: self._summary_state(sched, ups), after=ups,
+                          cells=[(m["model_display"], "Upload")])
+                # Intermediates (CONVERT, dequant, fix file) go once every quant of the model is done
+                sched.add(f"{m['id']}:cleanup", lambda m=m: self.cleanup_model(m, keep_list, keep_dequant, keep_convert),
+                          after=[*m["tasks"], *deletes], cells=[(m["model_display"], "Cleanup")])
+            # The streams are swapped once for the whole run: uploads run on several scheduler threads
+            # at once, and each mirrors the uploader's output to the log while it registers its thread
+            old_stdout, old_stderr = sys.stdout, sys.stderr
+            sys.stdout = DualOutput(old_stdout, self.log_display, self.upload_threads)
+            sys.stderr = DualOutput(old_stderr, self.log_display, self.upload_threads)
+            try:
+                sched.run()
+            finally:
+                sys.stdout, sys.stderr = old_stdout, old_stderr
 
-            for f in self.source_files:
-                if self.stop_requested: break
-                
-                # --- FIX: CLEANUP BEFORE EVERY MODEL ---
-                # We must delete the fix file before starting a new model, 
-                # otherwise convert.py crashes on the second model.
-                fix_file = "fix_5d_tensors_wan.safetensors"
-                if os.path.exists(fix_file):
-                    try:
-                        os.remove(fix_file)
-                        logging.info(f"Loop Cleanup: Removed old '{fix_file}'")
-                    except Exception as e:
-                        logging.warning(f"Could not remove fix file: {e}")
-                # ---------------------------------------
-
-                model_base = os.path.basename(f)
-                name = re.sub(r'-(f16|F16|BF16|CONVERT|UnFixed|FIXED)$', '', os.path.splitext(model_base)[0], flags=re.IGNORECASE)
-                
-                if out_mode == "custom":
-                    dat = self.custom_file_data.get(f, {})
-                    out_dir = dat["out"].get() if "out" in dat else os.path.dirname(f)
-                else:
-                    base = self.out_dir_var.get() if self.out_dir_var.get() else os.path.dirname(f)
-                    out_dir = os.path.join(base, name) if out_mode == "folder" else base
-                
-                os.makedirs(out_dir, exist_ok=True)
-                generated_files = []
-
-                # --- FP8 Logic ---
-                fp8_targets = ["FP8_E5M2", "FP8_E5M2 (All)", "FP8_E4M3FN", "FP8_E4M3FN (All)"]
-                for q in fp8_targets:
-                    if q in gen_list or q in up_list:
-                        if self.stop_requested: break
-                        self.msg_queue.put(("UPDATE_GRID", model_base, q, "RUNNING"))
-                        
-                        suffix = "_All" if "All" in q else ""
-                        base_q_name = q.split(" ")[0]
-                        expected_path = os.path.join(out_dir, f"{name}-{base_q_name}{suffix}.safetensors")
-                        
-                        if q in gen_list:
-                            try:
-                                if TORCH_AVAILABLE:
-                                    dtype_str = "float8_e5m2" if "E5M2" in q else "float8_e4m3fn"
-                                    qzer = FP8Quantizer(dtype_str)
-                                    ok = qzer.apply_quantization_to_file(f, expected_path, unet_only=("All" not in q), check_stop_func=lambda: self.stop_requested)
-                                    if ok: 
-                                        generated_files.append(expected_path)
-                                        self.msg_queue.put(("UPDATE_GRID", model_base, q, "DONE"))
-                                    else: self.msg_queue.put(("UPDATE_GRID", model_base, q, "CANCEL"))
-                                else: self.msg_queue.put(("UPDATE_GRID", model_base, q, "ERROR"))
-                            except Exception as e:
-                                logging.error(f"FP8 Err: {e}")
-                                self.msg_queue.put(("UPDATE_GRID", model_base, q, "ERROR"))
-                        
-                        elif q in up_list:
-                            if os.path.exists(expected_path):
-                                generated_files.append(expected_path)
-                                self.msg_queue.put(("UPDATE_GRID", model_base, q, "DONE"))
-                            else:
-                                self.msg_queue.put(("UPDATE_GRID", model_base, q, "SKIP"))
-
-                # --- GGUF Logic ---
-                # Deduplicate tasks
-                raw_combined = gen_list + up_list
-                unique_tasks = list(set(raw_combined))
-                
-                all_gguf_active = [q for q in unique_tasks if "FP8" not in q]
-                
-                if all_gguf_active:
-                    gguf_gen_needed = [q for q in gen_list if "FP8" not in q]
-                    gguf_src = None
-                    
-                    if gguf_gen_needed:
-                        if self.stop_requested: break
-                        self.msg_queue.put(("UPDATE_GRID", model_base, "GGUF Prep", "RUNNING"))
-                        
-                        if f.lower().endswith(".safetensors"):
-                            curr = f
-                            dq = os.path.join(out_dir, f"{name}-dequant.safetensors")
-                            if os.path.exists("dequantize_fp8v2.py"):
-                                # Ensure -u is passed
-                                self.run_cmd([sys.executable, "-u", "dequantize_fp8v2.py", "--src", f, "--dst", dq, "--strip-fp8", "--dtype", "fp16"])
-                                if os.path.exists(dq): 
-                                    curr = dq; generated_files.append(dq)
-                            
-                            conv = os.path.join(out_dir, f"{name}-CONVERT.gguf")
-                            # Ensure -u is passed
-                            self.run_cmd([sys.executable, "-u", "convert.py", "--src", curr, "--dst", conv])
-                            if os.path.exists(conv): gguf_src = conv; generated_files.append(conv)
-                        elif f.lower().endswith(".gguf"):
-                            gguf_src = f
-
-                        if gguf_src: self.msg_queue.put(("UPDATE_GRID", model_base, "GGUF Prep", "DONE"))
-                        else: self.msg_queue.put(("UPDATE_GRID", model_base, "GGUF Prep", "ERROR"))
-                    
-                    for q in all_gguf_active:
-                        if self.stop_requested: break
-                        self.msg_queue.put(("UPDATE_GRID", model_base, q, "RUNNING"))
-                        expected_path = os.path.join(out_dir, f"{name}-{q}.gguf")
-
-                        if q in gen_list:
-                            if not gguf_src: 
-                                self.msg_queue.put(("UPDATE_GRID", model_base, q, "SKIP"))
-                                continue
-
-                            if q in ["F16", "BF16"]:
-                                try:
-                                    shutil.copy(gguf_src, expected_path)
-                                    generated_files.append(expected_path)
-                                    self.msg_queue.put(("UPDATE_GRID", model_base, q, "DONE"))
-                                except: self.msg_queue.put(("UPDATE_GRID", model_base, q, "ERROR"))
-                                continue
-
-                            unfixed = os.path.join(out_dir, f"{name}-{q}-UnFixed.gguf")
-                            if self.run_cmd([self.quant_cmd, gguf_src, unfixed, q]):
-                                final = unfixed
-                                fixes = glob.glob("fix_5d_tensors_*.safetensors")
-                                if fixes:
-                                    fixed = os.path.join(out_dir, f"{name}-{q}-FIXED.gguf")
-                                    # Ensure -u is passed
-                                    self.run_cmd([sys.executable, "-u", "fix_5d_tensors.py", "--src", unfixed, "--dst", fixed, "--fix", fixes[0], "--overwrite"])
-                                    if os.path.exists(fixed): final = fixed
-                                
-                                try: os.rename(final, expected_path); generated_files.append(expected_path)
-                                except: generated_files.append(final)
-                                
-                                if os.path.exists(unfixed) and os.path.abspath(unfixed) != os.path.abspath(expected_path):
-                                    try: os.remove(unfixed)
-                                    except: pass
-
-                                self.msg_queue.put(("UPDATE_GRID", model_base, q, "DONE"))
-                            else:
-                                self.msg_queue.put(("UPDATE_GRID", model_base, q, "ERROR"))
-                        
-                        elif q in up_list:
-                            if os.path.exists(expected_path):
-                                generated_files.append(expected_path)
-                                self.msg_queue.put(("UPDATE_GRID", model_base, q, "DONE"))
-                            else:
-                                self.msg_queue.put(("UPDATE_GRID", model_base, q, "SKIP"))
-
-                # Dedupe generated files list
-                generated_files = list(set(generated_files))
-
-                res_obj = { "name": name, "files": generated_files, "model_display": model_base, "src_path": f }
-                batch_results.append(res_obj)
-
-                if strategy == "per_model" and not self.stop_requested:
-                    self.handle_upload_cleanup(res_obj, keep_list, up_list, up_mode, out_mode, keep_dequant, keep_convert)
-
-            if strategy == "all_end" and not self.stop_requested:
-                logging.info("Batch Cleanup...")
-                for item in batch_results:
-                    if self.stop_requested: break
-                    self.handle_upload_cleanup(item, keep_list, up_list, up_mode, out_mode, keep_dequant, keep_convert)
+            if fp8_resume and self.stop_requested:
+                logging.info("[FP8] Progress kept; run again with Resumable FP8 to continue")
 
             if self.shutdown_var.get() and not self.stop_requested:
                 if platform.system() == "Windows": subprocess.run(["shutdown", "/s", "/t", "60"])
                 else: subprocess.run(["sudo", "shutdown", "-h", "+1"])
             
+            if cache: logging.info(cache.summary())
             if not self.stop_requested: messagebox.showinfo("Done", "Finished")
 
         except Exception as e:
@@ -830,6 +774,252 @@ class ConverterApp:
             self.is_running = False
             self.btn_run.config(state="normal")
 
+    def add_model_tasks(self, sched, idx, f, gen_list, up_list, fp8_opts, cache, out_mode, keep_dequant, keep_convert,
+                        remote_sha=None, quant_jobs=0):
+        """Add the FP8 / GGUF prep / quantize / fix-5d steps of source *f* to *sched*; returns the model record.
+
+        ``m["artifacts"]`` maps each quant to the key of the step that leaves its output on disk.
+        Targets whose build record (`build_manifest`) is current locally or on the Hub
+        (*remote_sha(m, q, path)*) are not made again.
+        """
+        model_base = os.path.basename(f)
+        name = re.sub(r'-(f16|F16|BF16|CONVERT|UnFixed|FIXED)$', '', checkpoint_stem(model_base), flags=re.IGNORECASE)
+        
+        if out_mode == "custom":
+            dat = self.custom_file_data.get(f, {})
+            out_dir = dat["out"].get() if "out" in dat else os.path.dirname(f)
+        else:
+            base = self.out_dir_var.get() if self.out_dir_var.get() else os.path.dirname(f)
+            out_dir = os.path.join(base, name) if out_mode == "folder" else base
+        
+        os.makedirs(out_dir, exist_ok=True)
+        m = {"id": f"{idx}:{model_base}", "name": name, "files": [], "model_display": model_base, "src_path": f,
+             "tasks": [], "artifacts": {}, "fp8": {}, "gguf_src": None, "fix": None, "adopted": False}
+        files = m["files"]
+        src_bytes = sum(os.path.getsize(p) for p in shard_paths(f) if os.path.exists(p))
+        cpus = os.cpu_count() or 1
+        # Predicted output sizes (from the headers) for the disk budget; unknown sizes count as 0
+        sizes = predict_outputs(f, gen_list, scaled=fp8_opts["scaled"], policy=fp8_opts["policy"])
+        manifest = Manifest(f, self.quant_cmd)
+
+        def add(step, fn, requires=(), after=(), frees=(), cells=None, **kw):
+            key = f"{m['id']}:{step}"
+            sched.add(key, fn, requires=[f"{m['id']}:{s}" for s in requires], after=[f"{m['id']}:{s}" for s in after],
+                      frees=[f"{m['id']}:{s}" for s in frees], cells=[(model_base, step)] if cells is None else cells,
+                      where=out_dir, **kw)
+            m["tasks"].append(key)
+            return key
+
+        def existing(path):
+            # Upload-only targets come from an earlier run
+            if not os.path.exists(path): return "SKIP"
+            files.append(path)
+
+        def up_to_date(q, path, params=None):
+            # A current target only gets its grid step and, when on disk, the upload / cleanup of the file
+            state = manifest.status(path, q, params, remote_sha(m, q, path) if remote_sha else None)
+            if state: logging.info(f"{os.path.basename(path)}: up to date ({state}), skipped")
+            if state == "remote":
+                add(q, lambda: True)
+            elif state == "local":
+                m["artifacts"][q] = add(q, lambda p=path: existing(p))
+            return state
+
+        # --- FP8 Logic ---
+        fp8_targets = ["FP8_E5M2", "FP8_E5M2 (All)", "FP8_E4M3FN", "FP8_E4M3FN (All)"]
+        fp8_paths = {}
+        for q in fp8_targets:
+            suffix = ("_All" if "All" in q else "") + ("_scaled" if fp8_opts["scaled"] else "")
+            base_q_name = q.split(" ")[0]
+            fp8_paths[q] = os.path.join(out_dir, f"{name}-{base_q_name}{suffix}.safetensors")
+
+        # All requested FP8 variants are generated in a single read of the source
+        fp8_params = output_params(fp8_opts["scaled"], fp8_opts["policy"])
+        fp8_gen = [q for q in fp8_targets if q in gen_list and not up_to_date(q, fp8_paths[q], fp8_params)]
+        if fp8_gen:
+            def fp8():
+                if not FP8_AVAILABLE: return False
+                variants = [("float8_e5m2" if "E5M2" in q else "float8_e4m3fn", fp8_paths[q], "All" not in q) for q in fp8_gen]
+                m["fp8"] = FP8Quantizer(**fp8_opts).convert_variants(
+                    f, variants, should_stop=lambda: self.stop_requested,
+                    progress=lambda i, n: i % 100 == 0 and logging.info(f"[FP8] {model_base}: {i}/{n}..."))
+                for q in fp8_gen:
+                    if m["fp8"].get(fp8_paths[q]): manifest.record(fp8_paths[q], q, fp8_params)
+            add("FP8", fp8, cells=[(model_base, q) for q in fp8_gen], report_done=False,
+                needs={"cpu": fp8_opts["workers"], "ram": min(src_bytes, FP8_INFLIGHT_MB << 20), "disk": 1},
+                space=sum(sizes.get(q, 0) for q in fp8_gen))
+
+            def fp8_result(path):
+                if path not in m["fp8"]: return "ERROR"
+                if not m["fp8"][path]: return "CANCEL"
+                files.append(path)
+            for q in fp8_gen:
+                m["artifacts"][q] = add(q, lambda p=fp8_paths[q]: fp8_result(p), after=["FP8"])
+
+        for q in fp8_targets:
+            if q in up_list and q not in gen_list:
+                m["artifacts"][q] = add(q, lambda p=fp8_paths[q]: existing(p))
+
+        # --- GGUF Logic ---
+        all_gguf_active = [q for q in dict.fromkeys(gen_list + up_list) if "FP8" not in q]
+        gguf_gen_needed = [q for q in gen_list if "FP8" not in q
+                           and not up_to_date(q, os.path.join(out_dir, f"{name}-{q}.gguf"))]
+
+        if gguf_gen_needed:
+            def prep():
+                if f.lower().endswith(".gguf"):
+                    m["gguf_src"] = f
+                    return True
+                if not (f.lower().endswith(".safetensors") or is_shard_index(f.lower())): return False
+
+                # convert.py drops its 5-D fix file into the working directory: converts hold the
+                # "convert" lock, start without a stale file and move theirs next to the outputs
+                for stale in glob.glob("fix_5d_tensors_*.safetensors"):
+                    try: os.remove(stale); logging.info(f"Removed stale '{stale}'")
+                    except OSError as e: logging.warning(f"Could not remove fix file: {e}")
+
+                curr = f
+                conv = os.path.join(out_dir, f"{name}-CONVERT.gguf")
+
+                # A CONVERT.gguf without a build record isn't ours to delete: a readable one is adopted (with
+                # the fix file next to it, if any); its record says so, and adopted files are never cleaned up
+                if read_record(conv) is None and os.path.isfile(conv) and conversion_api.gguf_readable(conv):
+                    fixes = glob.glob(os.path.join(glob.escape(out_dir), f"{glob.escape(name)}-fix_5d_tensors_*.safetensors"))
+                    fix = os.path.basename(fixes[0]) if fixes else None
+                    if manifest.adopt(conv, "CONVERT", extra={"fix": fix}):
+                        logging.info(f"{os.path.basename(conv)}: no build record, adopted as is "
+                                     f"({os.path.getsize(conv) / 1024**3:.2f} GB, 5-D fix file: {fix or 'none'})")
+
+                # A kept CONVERT.gguf is reused while its build record (and fix file) is current;
+                # an adopted one stays out of the files cleaned up with the model
+                rec = read_record(conv) or {}
+                fix = rec.get("fix")
+                if manifest.status(conv, "CONVERT") == "local" and (not fix or os.path.exists(os.path.join(out_dir, fix))):
+                    logging.info(f"{os.path.basename(conv)}: up to date, reused")
+                    m["gguf_src"] = conv
+                    if fix: m["fix"] = os.path.join(out_dir, fix)
+                    m["adopted"] = bool(rec.get("adopted"))
+                    if not m["adopted"]:
+                        files.append(conv)
+                        if fix: files.append(m["fix"])
+                    return True
+                # Only a CONVERT.gguf this tool made and recorded as now stale is rebuilt over; one it
+                # didn't make (unrecorded, unreadable, or adopted) is moved aside first
+                if os.path.exists(conv):
+                    if rec and not rec.get("adopted"):
+                        os.remove(conv)
+                    else:
+                        os.replace(conv, conv + ".unrecorded")
+                        logging.warning(f"{os.path.basename(conv)}: not reusable and not made here, "
+                                        f"moved to {os.path.basename(conv)}.unrecorded")
+
+                # Direct path: dequantize + convert in one pass, no intermediate file
+                logging.info("Converting to GGUF F16 (direct)...")
+                res = conversion_api.convert_direct(f, conv, dtype="fp16", should_stop=lambda: self.stop_requested,
+                                                    cache=cache)
+                logging.info(res.describe())
+                if res.cancelled: return "CANCEL"
+                res.raise_disk_full()
+
+                if not res:
+                    logging.warning("Falling back to dequantize + convert.py")
+                    dq = os.path.join(out_dir, f"{name}-dequant.safetensors")
+                    res = conversion_api.dequantize(f, dq, dtype="fp16", strip_fp8=True, cache=cache)
+                    logging.info(res.describe())
+                    res.raise_disk_full()
+                    if res:
+                        curr = dq; files.append(dq)
+
+                    res = conversion_api.convert_gguf(curr, conv)
+                    logging.info(res.describe())
+                    # The dequant file's only consumer is convert.py
+                    if os.path.exists(dq) and not keep_dequant: os.remove(dq)
+                    if not res and os.path.exists(conv): os.remove(conv)
+                    res.raise_disk_full()
+
+                # The direct path names its fix file; convert.py's is found in the working directory
+                fixes = [res.details["fix"]] if res and res.details.get("fix") else glob.glob("fix_5d_tensors_*.safetensors")
+                if fixes:
+                    m["fix"] = os.path.join(out_dir, f"{name}-{os.path.basename(fixes[0])}")
+                    shutil.move(fixes[0], m["fix"]); files.append(m["fix"])
+                if not os.path.exists(conv): return False
+                m["gguf_src"] = conv; files.append(conv)
+                manifest.record(conv, "CONVERT", sha256=False, extra={"fix": os.path.basename(m["fix"]) if m["fix"] else None})
+            gguf_input = f.lower().endswith(".gguf")
+            add("GGUF Prep", prep, lock="convert", needs={"cpu": cpus, "ram": 2 * src_bytes, "disk": 1},
+                space=0 if gguf_input else sizes.get("CONVERT", 0) + (sizes.get("dequant", 0) if keep_dequant else 0),
+                scratch=0 if gguf_input or keep_dequant else sizes.get("dequant", 0))
+        
+        # The quant levels share one page-cached CONVERT.gguf and split the cores. The pool is
+        # sized from that file (about twice an FP8 source): a kept one, else its predicted size
+        conv = os.path.join(out_dir, f"{name}-CONVERT.gguf")
+        gguf_bytes = (src_bytes if f.lower().endswith(".gguf") else
+                      os.path.getsize(conv) if os.path.isfile(conv) else sizes.get("CONVERT") or src_bytes)
+        pool = plan_pool(gguf_bytes, sum(q not in ["F16", "BF16"] for q in gguf_gen_needed), jobs=quant_jobs)
+        if gguf_gen_needed: logging.info(f"{model_base}: {pool.describe()}")
+        for q in all_gguf_active:
+            expected_path = os.path.join(out_dir, f"{name}-{q}.gguf")
+
+            if q not in gguf_gen_needed:
+                if q not in gen_list: m["artifacts"][q] = add(q, lambda p=expected_path: existing(p))
+                continue
+
+            if q in ["F16", "BF16"]:
+                def copy(dst=expected_path, q=q):
+                    try:
+                        shutil.copy(m["gguf_src"], dst)
+                    except OSError:
+                        if os.path.exists(dst): os.remove(dst)
+                        raise
+                    files.append(dst)
+                    manifest.record(dst, q)
+                m["artifacts"][q] = add(q, copy, requires=["GGUF Prep"], needs={"disk": 1}, space=sizes.get(q, 0))
+                continue
+
+            unfixed = os.path.join(out_dir, f"{name}-{q}-UnFixed.gguf")
+            def quantize(q=q, unfixed=unfixed):
+                warm(m["gguf_src"])
+                if self.run_cmd(quantize_cmd(self.quant_cmd, m["gguf_src"], unfixed, q, pool)): return True
+                # Never keep a half-written GGUF; a full disk pauses the task instead of failing it
+                if os.path.exists(unfixed): os.remove(unfixed)
+                if self.stop_requested: return "CANCEL"
+                raise_if_disk_full(out_dir)
+                return False
+
+            def fix_5d(q=q, unfixed=unfixed, dst=expected_path):
+                final = unfixed
+                if m["fix"]:
+                    fixed = os.path.join(out_dir, f"{name}-{q}-FIXED.gguf")
+                    res = conversion_api.fix_5d(unfixed, fixed, m["fix"])
+                    logging.info(res.describe())
+                    if not res and os.path.exists(fixed): os.remove(fixed)
+                    res.raise_disk_full()
+                    if res: final = fixed
+                
+                try: os.rename(final, dst); files.append(dst)
+                except OSError: files.append(final)
+                # Without its 5-D fix the output is kept but not recorded, so the next run redoes it
+                if os.path.exists(dst) and (final != unfixed or not m["fix"]): manifest.record(dst, q)
+                
+                if os.path.exists(unfixed) and os.path.abspath(unfixed) != os.path.abspath(dst):
+                    try: os.remove(unfixed)
+                    except OSError: pass
+            add(f"{q} quantize", quantize, requires=["GGUF Prep"], cells=[(model_base, q)], report_done=False,
+                needs={"cpu": pool.threads, "ram": pool.job_ram}, space=sizes.get(q, 0))
+            # The FIXED copy sits next to the UnFixed one until it replaces it
+            m["artifacts"][q] = add(f"{q} fix-5d", fix_5d, requires=[f"{q} quantize"], cells=[(model_base, q)],
+                                    needs={"disk": 1}, scratch=sizes.get(q, 0))
+
+        # CONVERT.gguf goes as soon as its last consumer (the quantizes and copies) is done
+        if gguf_gen_needed and not keep_convert:
+            def convert_cleanup():
+                conv = m["gguf_src"]
+                if conv and conv != f and not m["adopted"] and os.path.exists(conv):
+                    os.remove(conv); logging.info(f"Deleted {os.path.basename(conv)}")
+            users = [q if q in ["F16", "BF16"] else f"{q} quantize" for q in gguf_gen_needed]
+            add("CONVERT cleanup", convert_cleanup, after=users, frees=["GGUF Prep"], cells=[])
+        return m
+
     def _check_file_match_quant(self, fname, q):
         if "FP8" in q:
             base_q = q.split(" ")[0] 
@@ -839,11 +1029,17 @@ class ConverterApp:
         if q in ["F16", "BF16"]: return f"-{q}.gguf" in fname
         return f"-{q}.gguf" in fname
 
-    def handle_upload_cleanup(self, item, keep_list, up_list, up_mode, out_mode, keep_dequant, keep_convert):
-        if self.stop_requested: return
+    @staticmethod
+    def _summary_state(sched, keys):
+        """Grid state for a cell covering the tasks *keys*: the worst of their states."""
+        states = {sched.tasks[k].state for k in keys}
+        for state in ("ERROR", "CANCEL"):
+            if state in states: return state
+        return "DONE" if "DONE" in states else "SKIP"
+
+    def upload_targets(self, item, up_mode, out_mode):
+        """``(gguf repo, gguf folder, fp8 repo, fp8 folder)`` the outputs of *item* are uploaded to."""
         name = item['name']
-        files = item['files']
-        disp = item['model_display']
         src = item['src_path']
         
         r_gguf = self.hf_repo_gguf.get()
@@ -861,54 +1057,53 @@ class ConverterApp:
         if out_mode == "folder" and up_mode == "global":
             d_gguf = f"{d_gguf}/{name}" if d_gguf else name
             d_fp8 = f"{d_fp8}/{name}" if d_fp8 else name
+        return r_gguf, d_gguf, r_fp8, d_fp8
 
-        if self.do_upload.get() and UPLOADER_AVAILABLE:
-            self.msg_queue.put(("UPDATE_GRID", disp, "Upload", "RUNNING"))
-            
-            files_to_upload = []
-            for f in files:
-                if f.endswith("-CONVERT.gguf") or f.endswith("-UnFixed.gguf") or f.endswith("-dequant.safetensors"): continue
-                fname = os.path.basename(f)
-                should_upload = False
-                for q in up_list:
-                    if self._check_file_match_quant(fname, q):
-                        should_upload = True
-                        break
-                if should_upload: files_to_upload.append(f)
-
-            # FIX 2: Deduplicate the upload list.
-            # If the same file was added multiple times, it crashes the uploader.
-            files_to_upload = list(set(files_to_upload))
-
-            fp8s = [f for f in files_to_upload if "FP8" in f]
-            ggufs = [f for f in files_to_upload if "FP8" not in f]
-            
-            old_stdout = sys.stdout
-            old_stderr = sys.stderr
-            sys.stdout = DualOutput(old_stdout, self.log_display)
-            sys.stderr = DualOutput(old_stderr, self.log_display)
-            
-            try:
-                # Log what we are trying to upload
-                if fp8s: logging.info(f"Uploading FP8: {len(fp8s)} files to {r_fp8}")
-                if ggufs: logging.info(f"Uploading GGUF: {len(ggufs)} files to {r_gguf}")
-
-                if fp8s and r_fp8: uploader.main(token=self.hf_token.get(), repo_id=r_fp8, local_paths_args=fp8s, dest_folder=d_fp8, non_interactive=True)
-                if ggufs and r_gguf: uploader.main(token=self.hf_token.get(), repo_id=r_gguf, local_paths_args=ggufs, dest_folder=d_gguf, non_interactive=True)
-                self.msg_queue.put(("UPDATE_GRID", disp, "Upload", "DONE"))
-            except Exception as e:
-                logging.error(f"Up Err: {e}")
-                self.msg_queue.put(("UPDATE_GRID", disp, "Upload", "ERROR"))
-            finally: 
-                sys.stdout = old_stdout
-                sys.stderr = old_stderr
-        else:
-            self.msg_queue.put(("UPDATE_GRID", disp, "Upload", "SKIP"))
+    def upload_model(self, item, up_list, up_mode, out_mode):
+        files = item['files']
+        r_gguf, d_gguf, r_fp8, d_fp8 = self.upload_targets(item, up_mode, out_mode)
+
+        if not (self.do_upload.get() and UPLOADER_AVAILABLE): return "SKIP"
+
+        files_to_upload = []
+        for f in files:
+            if f.endswith("-CONVERT.gguf") or f.endswith("-UnFixed.gguf") or f.endswith("-dequant.safetensors"): continue
+            fname = os.path.basename(f)
+            should_upload = False
+            for q in up_list:
+                if self._check_file_match_quant(fname, q):
+                    should_upload = True
+                    break
+            if should_upload: files_to_upload.append(f)
+
+        # FIX 2: Deduplicate the upload list.
+        # If the same file was added multiple times, it crashes the uploader.
+        files_to_upload = list(set(files_to_upload))
 
-        self.msg_queue.put(("UPDATE_GRID", disp, "Cleanup", "RUNNING"))
-        for p in files:
+        fp8s = [f for f in files_to_upload if "FP8" in f]
+        ggufs = [f for f in files_to_upload if "FP8" not in f]
+        
+        self.upload_threads.add(threading.get_ident())
+        try:
+            # Log what we are trying to upload
+            if fp8s: logging.info(f"Uploading FP8: {len(fp8s)} files to {r_fp8}")
+            if ggufs: logging.info(f"Uploading GGUF: {len(ggufs)} files to {r_gguf}")
+
+            if fp8s and r_fp8: uploader.main(token=self.hf_token.get(), repo_id=r_fp8, local_paths_args=fp8s, dest_folder=d_fp8, non_interactive=True)
+            if ggufs and r_gguf: uploader.main(token=self.hf_token.get(), repo_id=r_gguf, local_paths_args=ggufs, dest_folder=d_gguf, non_interactive=True)
+        except Exception as e:
+            logging.error(f"Up Err: {e}")
+            return False
+        finally: 
+            self.upload_threads.discard(threading.get_ident())
+
+    def cleanup_model(self, item, keep_list, keep_dequant, keep_convert, quants=None):
+        """Delete the outputs of *quants*, or with None the model's intermediates; kept files stay."""
+        for p in set(item['files']):
             if not os.path.exists(p): continue
             fname = os.path.basename(p)
+            is_artifact = any(self._check_file_match_quant(fname, q) for q in (quants or item['artifacts']))
+            if is_artifact != (quants is not None): continue
             should_keep = False
             
             # Keep logic
@@ -919,22 +1114,27 @@ class ConverterApp:
             
             if keep_dequant and "-dequant.safetensors" in fname: should_keep = True
             if keep_convert and "-CONVERT.gguf" in fname: should_keep = True
+            # A kept CONVERT.gguf needs its fix file when it is reused
+            if keep_convert and "fix_5d_tensors_" in fname: should_keep = True
 
             if not should_keep: 
                 try: os.remove(p); logging.info(f"Deleted {fname}")
                 except: pass
-        self.msg_queue.put(("UPDATE_GRID", disp, "Cleanup", "DONE"))
 
     def run_cmd(self, cmd, step=""):
         logging.info(f"CMD: {' '.join(cmd)}")
         try:
-            self.current_process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
-            for l in iter(self.current_process.stdout.readline, ''):
-                logging.info(l.strip())
-                if self.stop_requested: 
-                    self.current_process.kill(); return False
-            self.current_process.stdout.close()
-            return (self.current_process.wait() == 0)
+            proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+            # Several steps may run commands at once; cancel kills all of them
+            self.processes.add(proc)
+            try:
+                for l in iter(proc.stdout.readline, ''):
+                    logging.info(l.strip())
+                    if self.stop_requested: 
+                        proc.kill(); return False
+                proc.stdout.close()
+                return (proc.wait() == 0)
+            finally: self.processes.discard(proc)
         except: return False
 
     def save_settings(self, f):
@@ -952,7 +1152,17 @@ class ConverterApp:
             "q_up": [k for k,v in self.quant_vars_up.items() if v.get()],
             "q_keep": [k for k,v in self.quant_vars_keep.items() if v.get()],
             "k_dequant": self.keep_dequant_var.get(),
-            "k_convert": self.keep_convert_var.get()
+            "k_convert": self.keep_convert_var.get(),
+            "fp8_workers": self.fp8_workers_var.get(),
+            "fp8_scaled": self.fp8_scaled_var.get(),
+            "fp8_backend": self.fp8_backend_var.get(),
+            "fp8_policy": self.fp8_policy_var.get(),
+            "fp8_resume": self.fp8_resume_var.get(),
+            "fp8_transcode": self.fp8_transcode_var.get(),
+            "cache_dir": self.cache_dir_var.get(),
+            "cache_gb": self.cache_gb_var.get(),
+            "disk_budget": self.disk_budget_var.get(),
+            "quant_jobs": self.quant_jobs_var.get()
         }
         try: json.dump(d, open(f, 'w'), indent=4)
         except Exception as e:
@@ -975,6 +1185,16 @@ class ConverterApp:
             if "shut" in d: self.shutdown_var.set(d["shut"])
             if "k_dequant" in d: self.keep_dequant_var.set(d["k_dequant"])
             if "k_convert" in d: self.keep_convert_var.set(d["k_convert"])
+            if "fp8_workers" in d: self.fp8_workers_var.set(d["fp8_workers"])
+            if "fp8_scaled" in d: self.fp8_scaled_var.set(d["fp8_scaled"])
+            if "fp8_backend" in d: self.fp8_backend_var.set(d["fp8_backend"])
+            if "fp8_policy" in d: self.fp8_policy_var.set(d["fp8_policy"])
+            if "fp8_resume" in d: self.fp8_resume_var.set(d["fp8_resume"])
+            if "fp8_transcode" in d: self.fp8_transcode_var.set(d["fp8_transcode"])
+            if "cache_dir" in d: self.cache_dir_var.set(d["cache_dir"])
+            if "cache_gb" in d: self.cache_gb_var.set(d["cache_gb"])
+            if "disk_budget" in d: self.disk_budget_var.set(d["disk_budget"])
+            if "quant_jobs" in d: self.quant_jobs_var.set(d["quant_jobs"])
             
             for v in self.quant_vars_gen.values(): v.set(False)
             for v in self.quant_vars_up.values(): v.set(False)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+"""pt_checkpoint.py — safe, lazy access to .pt / .pth / .ckpt checkpoints
+
+``torch.load(src, map_location="cpu")`` unpickles the whole checkpoint into
+RAM and runs whatever code the pickle contains. `load_state_dict` loads with
+``mmap=True, weights_only=True`` instead: only tensors and plain containers
+are accepted, and tensor storages stay in the file until they are touched,
+so converters can stream them one at a time like a .safetensors source.
+Legacy (pre-zipfile) checkpoints can't be memory-mapped and are read whole,
+still weights-only.
+
+`transcode` writes a checkpoint once into ``<src>.safetensors`` (tagged with
+the source's size and mtime), so later runs get header-driven, zero-copy
+access through the safetensors path; a stale copy is rewritten.
+
+    python pt_checkpoint.py --src model.ckpt              # tensors, dtypes, total size
+    python pt_checkpoint.py --src model.ckpt --transcode  # write model.ckpt.safetensors
+"""
+
+import argparse
+import os
+import sys
+
+from safetensors_stream import TORCH_DTYPE_NAMES, StreamWriter, read_header, tensor_nbytes
+
+# safetensors dtype string for a torch dtype name
+_ST_DTYPES = {name: st for st, name in TORCH_DTYPE_NAMES.items()}
+
+
+def load_state_dict(path: str) -> dict:
+    """``{name: tensor}`` of the checkpoint at *path*, memory-mapped where the format allows.
+
+    A Lightning-style ``{"state_dict": {...}}`` wrapper is unwrapped; entries
+    that aren't tensors (step counters, hyperparameters) are dropped.
+    """
+    import torch
+    try:
+        obj = torch.load(path, map_location="cpu", mmap=True, weights_only=True)
+    except RuntimeError as e:
+        # mmap needs the zipfile format (torch >= 1.6); older files are read whole
+        if "mmap" not in str(e) and "zipfile" not in str(e):
+            raise
+        obj = torch.load(path, map_location="cpu", weights_only=True)
+    if isinstance(obj, dict) and isinstance(obj.get("state_dict"), dict):
+        obj = obj["state_dict"]
+    if not isinstance(obj, dict):
+        raise ValueError(f"{path}: expected a state dict, got {type(obj).__name__}")
+    return {name: t for name, t in obj.items() if isinstance(t, torch.Tensor)}
+
+
+def tensor_infos(state: dict) -> dict:
+    """``{name: {"dtype", "shape"}}`` for *state*, with safetensors dtype strings, like `read_header`."""
+    return {name: {"dtype": _ST_DTYPES[str(t.dtype).replace("torch.", "")], "shape": list(t.shape)}
+            for name, t in state.items()}
+
+
+def transcoded_path(src: str) -> str:
+    return src + ".safetensors"
+
+
+def _source_stamp(src: str) -> dict:
+    st = os.stat(src)
+    return {"transcoded_from": os.path.basename(src), "source_size": str(st.st_size),
+            "source_mtime_ns": str(st.st_mtime_ns)}
+
+
+def is_transcoded(src: str) -> bool:
+    """True if `transcoded_path` of *src* exists and was made from the current *src*."""
+    try:
+        metadata = read_header(transcoded_path(src))[1]
+    except (OSError, ValueError):
+        return False
+    return all(metadata.get(k) == v for k, v in _source_stamp(src).items())
+
+
+def transcode(src: str, should_stop=None) -> str | None:
+    """Write *src* as ``<src>.safetensors`` unless an up-to-date copy exists; returns its path.
+
+    Tensors are written one at a time from the memory-mapped checkpoint, so
+    peak RAM stays near the largest tensor. Returns None (and leaves nothing
+    behind) when *should_stop* returns true.
+    """
+    dst = transcoded_path(src)
+    if is_transcoded(src):
+        return dst
+    state = load_state_dict(src)
+    infos = tensor_infos(state)
+    layout = [(name, info["dtype"], info["shape"]) for name, info in infos.items()]
+    out = StreamWriter(dst, layout, _source_stamp(src))
+    try:
+        for name, t in state.items():
+            if should_stop and should_stop():
+                out.abort()
+                return None
+            out.write(name, t)
+    except BaseException:
+        out.abort()
+        raise
+    out.close()
+    return dst
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Inspect a .pt / .ckpt checkpoint or transcode it to .safetensors")
+    ap.add_argument("--src", required=True, help="Input .pt / .pth / .ckpt file")
+    ap.add_argument("--transcode", action="store_true", help="Write <src>.safetensors for zero-copy reuse")
+    args = ap.parse_args()
+
+    try:
+        if args.transcode:
+            print(f"✅ {transcode(args.src)}")
+            return
+        infos = tensor_infos(load_state_dict(args.src))
+    except Exception as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    for name, info in infos.items():
+        print(f"  {info['dtype']:<8} {str(info['shape']):<24} {name}")
+    total = sum(tensor_nbytes(i["dtype"], i["shape"]) for i in infos.values())
+    print(f"  {len(infos)} tensors, {total / 2**30:.2f} GiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+"""quant_policy.py — per-layer precision rules for the FP8 quantizer
+
+A policy is a JSON file of ordered rules; the first rule that matches a
+floating-point tensor decides what happens to it:
+
+    {
+      "default": "fp8",
+      "rules": [
+        {"ndim": 1, "action": "fp16"},
+        {"pattern": "norm|time_emb|proj_in|proj_out|guidance_in", "action": "fp16"},
+        {"pattern": "^model\\\\.diffusion_model\\\\.blocks\\\\.0\\\\.", "action": "bf16"}
+      ]
+    }
+
+*pattern* is a regular expression searched in the tensor name, *ndim* (optional)
+restricts a rule to tensors of that rank. Actions:
+
+    keep      store the source bytes unchanged
+    fp16      store as F16            bf16      store as BF16
+    fp8       the FP8 dtype of the output being written
+    fp8_e4m3  always F8_E4M3          fp8_e5m2  always F8_E5M2
+    skip      leave the tensor out
+
+The rules are compiled into one regular expression (per tensor rank) and
+decisions are cached per (name, rank), so a policy costs one lookup per
+tensor however many rules it has. Non-float tensors are always copied unchanged.
+
+    python quant_policy.py --dump                           # print the built-in policy
+    python quant_policy.py --policy my.json --src model.safetensors   # show every decision
+"""
+
+import argparse
+import json
+import re
+import sys
+from collections import Counter
+
+ACTIONS = ("keep", "fp16", "bf16", "fp8", "fp8_e4m3", "fp8_e5m2", "skip")
+# safetensors dtype per action; "fp8" is filled in per output, "keep" / "skip" have none
+ACTION_ST_DTYPES = {"fp16": "F16", "bf16": "BF16", "fp8_e4m3": "F8_E4M3", "fp8_e5m2": "F8_E5M2"}
+
+# The quality guard both converters have always applied: vectors and sensitive layers stay F16
+DEFAULT_POLICY = {
+    "default": "fp8",
+    "rules": [
+        {"ndim": 1, "action": "fp16"},
+        {"pattern": "norm|time_emb|proj_in|proj_out|guidance_in", "action": "fp16"},
+    ],
+}
+
+
+class QuantPolicy:
+    def __init__(self, rules=(), default: str = "fp8"):
+        if default not in ACTIONS:
+            raise ValueError(f"Unknown default action '{default}' (choose from {', '.join(ACTIONS)})")
+        self.rules = list(rules)
+        self.default = default
+        for i, rule in enumerate(self.rules):
+            if rule.get("action") not in ACTIONS:
+                raise ValueError(f"Rule {i}: unknown action '{rule.get('action')}' (choose from {', '.join(ACTIONS)})")
+            try:
+                compiled = re.compile(rule.get("pattern", ""))
+            except re.error as e:
+                raise ValueError(f"Rule {i}: bad pattern '{rule.get('pattern')}': {e}") from None
+            # The rules share one regex whose named groups identify them
+            if compiled.groupindex:
+                raise ValueError(f"Rule {i}: pattern '{rule.get('pattern')}' has named groups "
+                                 f"({', '.join(compiled.groupindex)}); use plain (...) or (?:...)")
+        self._matchers = {}
+        self._cache = {}
+
+    def _matcher(self, ndim: int):
+        """One regex for all rules that apply at rank *ndim*; group ``r<i>`` is rule *i*."""
+        if ndim not in self._matchers:
+            # Alternatives are tried in order, so under fullmatch the first matching rule wins
+            alternatives = [f"(?P<r{i}>.*?(?:{rule.get('pattern', '')}).*)" for i, rule in enumerate(self.rules)
+                            if rule.get("ndim", ndim) == ndim]
+            self._matchers[ndim] = re.compile("|".join(alternatives), re.DOTALL) if alternatives else None
+        return self._matchers[ndim]
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "QuantPolicy":
+        return cls(d.get("rules", ()), d.get("default", "fp8"))
+
+    @classmethod
+    def load(cls, path: str | None = None) -> "QuantPolicy":
+        """Policy from the JSON file at *path*, or the built-in one when *path* is empty."""
+        if not path:
+            return cls.from_dict(DEFAULT_POLICY)
+        with open(path, encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+    def action(self, name: str, ndim: int) -> str:
+        key = (name, ndim)
+        action = self._cache.get(key)
+        if action is None:
+            matcher = self._matcher(ndim)
+            m = matcher.fullmatch(name) if matcher else None
+            # The matching alternative's group, not `lastgroup`: that one names the last group to close
+            rule = next((int(g[1:]) for g, v in m.groupdict().items() if v is not None), None) if m else None
+            action = self.rules[rule]["action"] if rule is not None else self.default
+            self._cache[key] = action
+        return action
+
+    def output_dtype(self, name: str, info: dict, quant_st: str) -> str | None:
+        """safetensors dtype for a floating-point tensor, or None when it is skipped."""
+        action = self.action(name, len(info["shape"]))
+        if action == "skip":
+            return None
+        if action == "keep":
+            return info["dtype"]
+        return quant_st if action == "fp8" else ACTION_ST_DTYPES[action]
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Inspect an FP8 quantization policy")
+    ap.add_argument("--policy", help="Policy JSON (default: the built-in policy)")
+    ap.add_argument("--src", help="Show the decision for every tensor of this .safetensors / index.json")
+    ap.add_argument("--dump", action="store_true", help="Print the built-in policy as JSON")
+    args = ap.parse_args()
+
+    if args.dump:
+        print(json.dumps(DEFAULT_POLICY, indent=2))
+        return
+    try:
+        policy = QuantPolicy.load(args.policy)
+    except (OSError, ValueError) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    if not args.src:
+        print(f"{len(policy.rules)} rule(s), default '{policy.default}': OK")
+        return
+
+    from safetensors_stream import read_header, shard_paths
+    from conversion_plan import FLOAT_ST_DTYPES
+    counts = Counter()
+    for path in shard_paths(args.src):
+        for name, info in read_header(path)[0].items():
+            action = policy.action(name, len(info["shape"])) if info["dtype"] in FLOAT_ST_DTYPES else "keep"
+            counts[action] += 1
+            print(f"  {action:<9} {info['dtype']:<8} {name}")
+    print("  " + ", ".join(f"{a}: {n}" for a, n in counts.most_common()))
+
+
+if __name__ == "__main__":
+    main()
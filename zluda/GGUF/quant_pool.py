@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+"""quant_pool.py — run several llama-quantize levels of one CONVERT.gguf at once
+
+Every GGUF level (Q4_K_M, Q5_K_S, Q8_0, ...) is a separate llama-quantize run
+over the same F16 source. Run one after another, each run re-reads the whole
+source and a single process rarely keeps every core busy. `plan_pool` sizes
+a bounded pool instead:
+
+* ``jobs``    — how many levels run at the same time: at most one per
+  `_MIN_THREADS` cores, and no more than fit in the free RAM left once the
+  shared source sits in the page cache,
+* ``threads`` — the cores split evenly among them, passed as llama-quantize's
+  ``nthreads`` argument,
+* ``job_ram`` — the estimated private memory of one run.
+
+The batch scheduler enforces the bound: each quantize task needs ``threads``
+cores and ``job_ram`` bytes. `warm` asks the OS to read the source ahead
+(``posix_fadvise(WILLNEED)``), so the concurrent runs share one copy in the
+page cache instead of each going to disk.
+"""
+
+import logging
+import os
+from dataclasses import dataclass
+
+from batch_scheduler import available_ram
+
+# Below this many threads per run, another concurrent run costs more than it gains
+_MIN_THREADS = 4
+# llama-quantize maps the source and converts one tensor at a time; its private memory is a few
+# copies of the largest tensor, estimated as this fraction of the source (and at least _MIN_JOB_RAM)
+_JOB_RAM_FRACTION = 0.125
+_MIN_JOB_RAM = 1 << 30
+
+
+@dataclass
+class QuantPool:
+    jobs: int
+    threads: int
+    job_ram: int
+
+    def describe(self) -> str:
+        return f"{self.jobs} concurrent llama-quantize run(s) x {self.threads} thread(s)"
+
+
+def plan_pool(gguf_bytes: int, n_quants: int, *, jobs: int = 0, cores: int | None = None,
+              free_ram: int | None = None) -> QuantPool:
+    """Pool for *n_quants* levels of a *gguf_bytes* CONVERT.gguf; *jobs* > 0 overrides the automatic size.
+
+    *gguf_bytes* is the F16 GGUF llama-quantize reads, not the (FP8) checkpoint it was made from.
+    """
+    cores = cores or os.cpu_count() or 1
+    job_ram = max(_MIN_JOB_RAM, int(gguf_bytes * _JOB_RAM_FRACTION))
+    if jobs <= 0:
+        free_ram = available_ram() if free_ram is None else free_ram
+        by_ram = (free_ram - gguf_bytes) // job_ram
+        jobs = min(cores // _MIN_THREADS, by_ram)
+    jobs = max(1, min(jobs, n_quants, cores))
+    return QuantPool(jobs, max(1, cores // jobs), job_ram)
+
+
+def warm(path: str) -> None:
+    """Start reading *path* into the page cache; a no-op where posix_fadvise is unavailable (Windows)."""
+    if not hasattr(os, "posix_fadvise"):
+        return
+    try:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        finally:
+            os.close(fd)
+    except OSError as e:
+        logging.debug(f"posix_fadvise({path}): {e}")
+
+
+def quantize_cmd(quant_cmd: str, src: str, dst: str, q: str, pool: QuantPool) -> list[str]:
+    return [quant_cmd, src, dst, q, str(pool.threads)]
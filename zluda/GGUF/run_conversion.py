@@ -1,10 +1,12 @@
 import os
 import sys
+import argparse
 import subprocess
 import logging
 import re
 import glob
 import shutil
+import time
 from datetime import datetime
 
 # --- CONFIGURATION ---
@@ -38,70 +40,15 @@ except ImportError:
     uploader = None
     UPLOADER_AVAILABLE = False
 
-try:
-    import torch
-    from safetensors.torch import save_file, load_file
-    TORCH_AVAILABLE = True
-except ImportError:
-    TORCH_AVAILABLE = False
-
-# --- FP8 LOGIC ---
-if TORCH_AVAILABLE:
-    class FP8Quantizer:
-        def __init__(self, quant_dtype: str = "float8_e5m2"):
-            if not hasattr(torch, quant_dtype): raise ValueError(f"Unsupported: {quant_dtype}")
-            self.quant_dtype = quant_dtype
-
-        def quantize_weights(self, weight: torch.Tensor, name: str) -> torch.Tensor:
-            if not weight.is_floating_point(): return weight
-            
-            # Quality Guards (Skip sensitive layers)
-            if weight.ndim == 1: return weight.to(dtype=torch.float16)
-            for kw in ["norm", "time_emb", "proj_in", "proj_out", "guidance_in"]:
-                if kw in name: return weight.to(dtype=torch.float16)
-
-            target_device = torch.device("cuda") if torch.cuda.is_available() else torch.device("cpu")
-            weight_on_target = weight.to(target_device)
-            max_val = torch.max(torch.abs(weight_on_target))
-            
-            if max_val == 0:
-                target_torch_dtype = getattr(torch, self.quant_dtype)
-                return torch.zeros_like(weight_on_target, dtype=target_torch_dtype)
-            
-            divisor = 57344.0 if "e5m2" in self.quant_dtype else 448.0
-            scale = max_val / divisor
-            scale = torch.max(scale, torch.tensor(1e-12, device=target_device, dtype=weight_on_target.dtype))
-            
-            quantized = torch.round(weight_on_target / scale * 127.0) / 127.0 * scale
-            return quantized.to(dtype=getattr(torch, self.quant_dtype))
-
-        def convert_file(self, src, dst, unet_only=True):
-            logging.info(f"FP8 Conversion ({self.quant_dtype}) -> {os.path.basename(dst)}")
-            try:
-                if src.endswith(".safetensors"): state_dict = load_file(src)
-                else: state_dict = torch.load(src, map_location="cpu")
-                
-                new_dict = {}
-                total = len(state_dict)
-                for i, (name, param) in enumerate(state_dict.items()):
-                    if unet_only and "model.diffusion_model" not in name: continue
-                    if i % 200 == 0: print(f"  Processing tensor {i}/{total}...", end="\r")
-                    
-                    if isinstance(param, torch.Tensor) and param.is_floating_point():
-                        new_dict[name] = self.quantize_weights(param, name)
-                    else:
-                        new_dict[name] = param
-                print("")
-                save_file(new_dict, dst)
-                del state_dict; del new_dict
-                if torch.cuda.is_available(): torch.cuda.empty_cache()
-                return True
-            except Exception as e:
-                logging.error(f"FP8 Error: {e}")
-                return False
-else:
-    class FP8Quantizer:
-        def __init__(self, *args, **kwargs): pass
+import conversion_api
+from safetensors_stream import checkpoint_stem, is_shard_index, shard_paths
+from conversion_plan import plan_dequantize, plan_fp8_quantize, predict_outputs, print_plan
+from fp8_engine import BACKENDS, DEFAULT_INFLIGHT_MB as FP8_INFLIGHT_MB, FP8Quantizer, output_params
+from quant_policy import QuantPolicy
+from tensor_cache import DEFAULT_CACHE_GB, TensorCache
+from batch_scheduler import Scheduler, raise_if_disk_full
+from quant_pool import plan_pool, quantize_cmd, warm
+from build_manifest import Manifest, RemoteFiles, read_record
 
 # --- HELPER FUNCTIONS ---
 def get_input(prompt_text, default=None):
@@ -119,6 +66,24 @@ def run_cmd(cmd):
         logging.error("Command Failed.")
         return False
 
+def fp8_progress(i, total):
+    if i % 200 == 0: print(f"  Processing tensor {i}/{total}...", end="\r")
+
+def plan_inputs(input_files, selected_quants, workers=1, inflight_mb=FP8_INFLIGHT_MB, scaled=False, policy=None):
+    """ Header-only plans for every safetensors input (no tensor data is read) """
+    plans = {}
+    for fpath in input_files:
+        if not (fpath.endswith(".safetensors") or is_shard_index(fpath)): continue
+        plans[fpath] = []
+        for q in selected_quants:
+            if "FP8" in q:
+                dtype = "float8_e5m2" if "E5M2" in q else "float8_e4m3fn"
+                plans[fpath].append(plan_fp8_quantize(fpath, quant_dtype=dtype, unet_only=("(All)" not in q),
+                                                      policy=policy, scaled=scaled, workers=workers, inflight_bytes=inflight_mb << 20))
+        if any("FP8" not in q for q in selected_quants):
+            plans[fpath].append(plan_dequantize(fpath, dtype="fp16", strip_fp8=True))
+    return plans
+
 def interactive_repo_select(api, token, label="GGUF"):
     """ Fetches user repos and allows selection via number """
     try:
@@ -169,8 +134,310 @@ def interactive_repo_select(api, token, label="GGUF"):
         print(f"Error fetching repos: {e}")
         return input(f"Enter Repo ID manually for {label}: ").strip()
 
+# --- BATCH GRAPH ---
+def add_model_tasks(sched, idx, fpath, *, out_root, use_subfolder, selected_quants, fp8_opts, quant_cmd, quant_jobs, cache,
+                    keep_dequant, keep_convert, upload, cleanup_mode):
+    """ Add one model's FP8 / GGUF prep / quantize / fix-5d steps to the scheduler, each output with its own upload / cleanup.
+    Outputs whose build record (build_manifest) is current locally or on the Hub are not made again """
+    model_base = os.path.basename(fpath)
+    name = re.sub(r'-(f16|F16|BF16|CONVERT|UnFixed|FIXED)$', '', checkpoint_stem(model_base), flags=re.IGNORECASE)
+    
+    out_dir = os.path.join(out_root, name) if use_subfolder else out_root
+    os.makedirs(out_dir, exist_ok=True)
+
+    m = {"gguf_src": None, "dq": None, "fix": None, "adopted": False}
+    outputs = {}    # step -> files it produced
+    tasks = []
+    artifacts = []  # steps leaving an output to upload / clean up
+    manifest = Manifest(fpath, quant_cmd)
+    src_bytes = sum(os.path.getsize(p) for p in shard_paths(fpath) if os.path.exists(p))
+    cpus = os.cpu_count() or 1
+    # Predicted output sizes (from the headers) for the disk budget; unknown sizes count as 0
+    sizes = predict_outputs(fpath, selected_quants, scaled=fp8_opts["scaled"], policy=fp8_opts["policy"])
+
+    def add(step, fn, requires=(), after=(), frees=(), **kw):
+        sched.add(f"{idx}:{step}", fn, requires=[f"{idx}:{s}" for s in requires], after=[f"{idx}:{s}" for s in after],
+                  frees=[f"{idx}:{s}" for s in frees], cells=[(name, step)], where=out_dir, **kw)
+        tasks.append(step)
+
+    if upload:
+        # Dest folder per model (append name)
+        d_f = f"{upload['dest_fp8']}/{name}" if upload["dest_fp8"] else name
+        d_g = f"{upload['dest_gguf']}/{name}" if upload["dest_gguf"] else name
+
+        # If dest folder was explicitly root "/", we don't append name
+        if upload["dest_fp8"] == "/": d_f = ""
+        if upload["dest_gguf"] == "/": d_g = ""
+
+    def up_to_date(path, q, params=None):
+        # "remote" / "local" when the output's build record is current (on the Hub / on disk)
+        remote_sha = None
+        if upload:
+            fp8 = "FP8" in q
+            remote_sha = upload["remote"].sha256(upload["repo_fp8" if fp8 else "repo_gguf"], d_f if fp8 else d_g,
+                                                 os.path.basename(path))
+        state = manifest.status(path, q, params, remote_sha)
+        if state: logging.info(f"{os.path.basename(path)}: up to date ({state}), skipped")
+        # A current local file still has to go up when uploading
+        if state == "local" and upload:
+            add(f"{q} reuse", lambda: outputs.__setitem__(f"{q} reuse", [path]))
+            artifacts.append(f"{q} reuse")
+        return state
+
+    # --- FP8 ---
+    fp8_quants = [q for q in selected_quants if "FP8" in q]
+    fp8_params = output_params(fp8_opts["scaled"], fp8_opts["policy"])
+    variants = []
+    variant_quants = {}
+    for q in fp8_quants:
+        is_e5m2 = "E5M2" in q
+        is_all = "(All)" in q
+        dtype = "float8_e5m2" if is_e5m2 else "float8_e4m3fn"
+        suffix = ("_All" if is_all else "") + ("_scaled" if fp8_opts["scaled"] else "")
+        
+        dst = os.path.join(out_dir, f"{name}-{q.split(' ')[0]}{suffix}.safetensors")
+        if up_to_date(dst, q, fp8_params): continue
+        variants.append((dtype, dst, not is_all))
+        variant_quants[dst] = q
+
+    # All FP8 variants are written in a single read of the source
+    if variants:
+        def fp8():
+            for _, dst, _ in variants:
+                logging.info(f"FP8 Conversion -> {os.path.basename(dst)}")
+            try:
+                results = FP8Quantizer(**fp8_opts).convert_variants(fpath, variants, progress=fp8_progress)
+            except Exception:
+                if fp8_opts["resume"]: logging.info("FP8 progress kept; rerun with --resume to continue")
+                raise
+            print("")
+            outputs["FP8"] = [dst for _, dst, _ in variants if results[dst]]
+            for dst in outputs["FP8"]:
+                manifest.record(dst, variant_quants[dst], fp8_params)
+            return all(results.values())
+        add("FP8", fp8, needs={"cpu": fp8_opts["workers"], "ram": min(src_bytes, fp8_opts["inflight_mb"] << 20), "disk": 1},
+            space=sum(sizes.get(q, 0) for q in variant_quants.values()))
+        artifacts.append("FP8")
+
+    # --- GGUF ---
+    gguf_quants = [q for q in selected_quants if "FP8" not in q
+                   and not up_to_date(os.path.join(out_dir, f"{name}-{q}.gguf"), q)]
+    if gguf_quants:
+        def prep():
+            if fpath.endswith(".gguf"):
+                m["gguf_src"] = fpath
+                return True
+            if not (fpath.endswith(".safetensors") or is_shard_index(fpath)): return "SKIP"
+
+            # convert.py drops its 5-D fix file into the working directory: converts hold the
+            # "convert" lock, start without a stale file and move theirs next to the outputs
+            for stale in glob.glob("fix_5d_tensors_*.safetensors"):
+                os.remove(stale)
+
+            curr = fpath
+            conv = os.path.join(out_dir, f"{name}-CONVERT.gguf")
+
+            # A CONVERT.gguf without a build record isn't ours to delete: a readable one is adopted (with
+            # the fix file next to it, if any); its record says so, and adopted files are never cleaned up
+            if read_record(conv) is None and os.path.isfile(conv) and conversion_api.gguf_readable(conv):
+                fixes = glob.glob(os.path.join(glob.escape(out_dir), f"{glob.escape(name)}-fix_5d_tensors_*.safetensors"))
+                fix = os.path.basename(fixes[0]) if fixes else None
+                if manifest.adopt(conv, "CONVERT", extra={"fix": fix}):
+                    logging.info(f"{os.path.basename(conv)}: no build record, adopted as is "
+                                 f"({os.path.getsize(conv) / 1024**3:.2f} GB, 5-D fix file: {fix or 'none'})")
+
+            # A kept CONVERT.gguf is reused while its build record (and fix file) is current
+            rec = read_record(conv) or {}
+            fix = rec.get("fix")
+            if manifest.status(conv, "CONVERT") == "local" and (not fix or os.path.exists(os.path.join(out_dir, fix))):
+                logging.info(f"{os.path.basename(conv)}: up to date, reused")
+                m["gguf_src"] = conv
+                m["fix"] = os.path.join(out_dir, fix) if fix else None
+                m["adopted"] = bool(rec.get("adopted"))
+                return True
+            # Only a CONVERT.gguf this tool made and recorded as now stale is rebuilt over; one it
+            # didn't make (unrecorded, unreadable, or adopted) is moved aside first
+            if os.path.exists(conv):
+                if rec and not rec.get("adopted"):
+                    os.remove(conv)
+                else:
+                    os.replace(conv, conv + ".unrecorded")
+                    logging.warning(f"{os.path.basename(conv)}: not reusable and not made here, "
+                                    f"moved to {os.path.basename(conv)}.unrecorded")
+
+            res = None
+            # Direct path: dequantize + convert in one pass, no intermediate file
+            if not os.path.exists(conv):
+                logging.info("Converting to GGUF F16 (direct)...")
+                res = conversion_api.convert_direct(fpath, conv, dtype="fp16", cache=cache)
+                logging.info(res.describe())
+                res.raise_disk_full()
+                if not res: logging.warning("Falling back to dequantize + convert.py")
+
+            if not os.path.exists(conv):
+                m["dq"] = os.path.join(out_dir, f"{name}-dequant.safetensors")
+                logging.info("Dequantizing (FP8 check)...")
+                res = conversion_api.dequantize(fpath, m["dq"], dtype="fp16", strip_fp8=True, cache=cache)
+                logging.info(res.describe())
+                res.raise_disk_full()
+                if res: curr = m["dq"]
+
+                logging.info("Converting to GGUF F16...")
+                res = conversion_api.convert_gguf(curr, conv)
+                logging.info(res.describe())
+                # The dequant file's only consumer is convert.py
+                if os.path.exists(m["dq"]) and not keep_dequant: os.remove(m["dq"])
+                if not res and os.path.exists(conv): os.remove(conv)
+                res.raise_disk_full()
+
+            # The direct path names its fix file; convert.py's is found in the working directory
+            fixes = [res.details["fix"]] if res and res.details.get("fix") else glob.glob("fix_5d_tensors_*.safetensors")
+            if fixes:
+                m["fix"] = os.path.join(out_dir, f"{name}-{os.path.basename(fixes[0])}")
+                shutil.move(fixes[0], m["fix"])
+            if not os.path.exists(conv): return False
+            m["gguf_src"] = conv
+            manifest.record(conv, "CONVERT", sha256=False, extra={"fix": os.path.basename(m["fix"]) if m["fix"] else None})
+        gguf_input = fpath.endswith(".gguf")
+        add("GGUF Prep", prep, lock="convert", needs={"cpu": cpus, "ram": 2 * src_bytes, "disk": 1},
+            space=0 if gguf_input else sizes.get("CONVERT", 0) + (sizes.get("dequant", 0) if keep_dequant else 0),
+            scratch=0 if gguf_input or keep_dequant else sizes.get("dequant", 0))
+
+        # Run Quants: the levels share one page-cached CONVERT.gguf and split the cores. The pool is
+        # sized from that file (about twice an FP8 source): a kept one, else its predicted size
+        conv = os.path.join(out_dir, f"{name}-CONVERT.gguf")
+        gguf_bytes = (src_bytes if gguf_input else
+                      os.path.getsize(conv) if os.path.isfile(conv) else sizes.get("CONVERT") or src_bytes)
+        pool = plan_pool(gguf_bytes, sum(q not in ["F16", "BF16"] for q in gguf_quants), jobs=quant_jobs)
+        logging.info(f"{name}: {pool.describe()}")
+        for q in gguf_quants:
+            final_path = os.path.join(out_dir, f"{name}-{q}.gguf")
+            
+            if q in ["F16", "BF16"]:
+                def copy(q=q, final_path=final_path):
+                    try:
+                        shutil.copy(m["gguf_src"], final_path)
+                    except OSError:
+                        if os.path.exists(final_path): os.remove(final_path)
+                        raise
+                    outputs[q] = [final_path]
+                    manifest.record(final_path, q)
+                add(q, copy, requires=["GGUF Prep"], needs={"disk": 1}, space=sizes.get(q, 0))
+                artifacts.append(q)
+                continue
+
+            unfixed = os.path.join(out_dir, f"{name}-{q}-UnFixed.gguf")
+            def quantize(q=q, unfixed=unfixed):
+                logging.info(f"Quantizing {q}...")
+                warm(m["gguf_src"])
+                if run_cmd(quantize_cmd(quant_cmd, m["gguf_src"], unfixed, q, pool)): return os.path.exists(unfixed)
+                # Never keep a half-written GGUF; a full disk pauses the task instead of failing it
+                if os.path.exists(unfixed): os.remove(unfixed)
+                raise_if_disk_full(out_dir)
+                return False
+
+            def fix_5d(q=q, unfixed=unfixed, final_path=final_path):
+                # Fix Tensors
+                fixed_ok = not m["fix"]
+                if m["fix"]:
+                    logging.info("Applying Tensor Fix...")
+                    fixed = os.path.join(out_dir, f"{name}-{q}-FIXED.gguf")
+                    res = conversion_api.fix_5d(unfixed, fixed, m["fix"])
+                    logging.info(res.describe())
+                    if not res and os.path.exists(fixed): os.remove(fixed)
+                    res.raise_disk_full()
+                    if res:
+                        os.rename(fixed, final_path)
+                        os.remove(unfixed)
+                        fixed_ok = True
+                    else:
+                        os.rename(unfixed, final_path)
+                else:
+                    os.rename(unfixed, final_path)
+                
+                if os.path.exists(final_path):
+                    outputs[f"{q} fix-5d"] = [final_path]
+                    # Without its 5-D fix the output is kept but not recorded, so the next run redoes it
+                    if fixed_ok: manifest.record(final_path, q)
+            add(f"{q} quantize", quantize, requires=["GGUF Prep"], needs={"cpu": pool.threads, "ram": pool.job_ram},
+                space=sizes.get(q, 0))
+            # The FIXED copy sits next to the UnFixed one until it replaces it
+            add(f"{q} fix-5d", fix_5d, requires=[f"{q} quantize"], needs={"disk": 1}, scratch=sizes.get(q, 0))
+            artifacts.append(f"{q} fix-5d")
+        
+        # Cleanup Intermediates as soon as their last consumer is done: CONVERT.gguf after the
+        # quantizes and copies, the fix file after the fix-5d steps
+        def convert_cleanup():
+            gguf_src = m["gguf_src"]
+            if gguf_src and "CONVERT" in gguf_src and not keep_convert and not m["adopted"]:
+                if os.path.exists(gguf_src): os.remove(gguf_src)
+
+        def fix_cleanup():
+            # A kept CONVERT.gguf needs its fix file when it is reused
+            if m["fix"] and os.path.exists(m["fix"]) and not keep_convert and not m["adopted"]:
+                os.remove(m["fix"])
+        add("CONVERT cleanup", convert_cleanup, after=[t for t in tasks if t in gguf_quants or t.endswith(" quantize")],
+            frees=[] if keep_convert else ["GGUF Prep"])
+        add("Fix cleanup", fix_cleanup, after=[t for t in tasks if t.endswith(" fix-5d")])
+
+    # --- UPLOAD / CLEANUP ---
+    def upload_files(step):
+        fp8s = [f for f in outputs.get(step, []) if "FP8" in f]
+        ggufs = [f for f in outputs.get(step, []) if "FP8" not in f]
+
+        if fp8s and upload["repo_fp8"]:
+            logging.info(f"Uploading FP8 to {upload['repo_fp8']} -> {d_f}")
+            uploader.main(repo_id=upload["repo_fp8"], local_paths_args=fp8s, dest_folder=d_f)
+        
+        if ggufs and upload["repo_gguf"]:
+            logging.info(f"Uploading GGUF to {upload['repo_gguf']} -> {d_g}")
+            uploader.main(token=upload["token"], repo_id=upload["repo_gguf"], local_paths_args=ggufs, dest_folder=d_g)
+
+    def cleanup(step):
+        for f in outputs.get(step, []):
+            if os.path.exists(f): os.remove(f); logging.info(f"Deleted {os.path.basename(f)}")
+
+    # Each output is uploaded as soon as its own step finishes and deleted only after its own upload
+    # succeeded, so this model's uploads overlap the next model's conversion
+    for step in artifacts:
+        if upload:
+            add(f"{step} upload", lambda step=step: upload_files(step), requires=[step], needs={"net": 1})
+        if cleanup_mode:
+            # A fixed quant's space was claimed by its quantize step (the UnFixed file it renames)
+            add(f"{step} cleanup", lambda step=step: cleanup(step), requires=[f"{step} upload" if upload else step],
+                frees=[step, step.replace(" fix-5d", " quantize")])
+
 # --- MAIN WIZARD ---
 def main():
+    ap = argparse.ArgumentParser(description="Interactive GGUF & FP8 converter")
+    ap.add_argument("--plan", action="store_true", help="Only print a header-only plan for the selected files and quants, then exit")
+    ap.add_argument("--timing", action="store_true", help="Report the time spent quantizing each FP8 tensor")
+    ap.add_argument("--workers", type=int, default=1, help="Quantize this many FP8 tensors concurrently (default: 1)")
+    ap.add_argument("--max-inflight-mb", type=int, default=FP8_INFLIGHT_MB,
+                    help=f"Memory budget for tensors in flight with --workers > 1, in MiB (default: {FP8_INFLIGHT_MB})")
+    ap.add_argument("--fp8-backend", choices=("auto", *BACKENDS), default="auto",
+                    help="FP8 kernel (default: auto = torch-cuda when a CUDA device is available, else numpy, then torch-cpu)")
+    ap.add_argument("--fp8-policy", help="Per-layer precision rules for FP8 outputs, JSON (see quant_policy.py; default: built-in)")
+    ap.add_argument("--resume", action="store_true",
+                    help="Keep interrupted FP8 outputs as .partial + .journal and continue them on the next run")
+    ap.add_argument("--transcode-pt", action="store_true",
+                    help="Write .pt/.ckpt inputs once to <file>.safetensors and quantize FP8 from that (reused by later runs)")
+    ap.add_argument("--cache-dir", help="Tensor cache directory: reuse dequantized / FP8 tensors across runs (default: off)")
+    ap.add_argument("--cache-gb", type=float, default=DEFAULT_CACHE_GB,
+                    help=f"Tensor cache size limit in GiB, least recently used evicted first (default: {DEFAULT_CACHE_GB})")
+    ap.add_argument("--disk-budget-gb", type=float,
+                    help="Keep predicted outputs and intermediates on the output disk below this many GiB (default: off)")
+    ap.add_argument("--quant-jobs", type=int, default=0,
+                    help="llama-quantize levels run at once per model, sharing the cores (default: 0 = from cores and free RAM)")
+    args = ap.parse_args()
+    cache = TensorCache(args.cache_dir, args.cache_gb) if args.cache_dir else None
+
+    try:
+        fp8_policy = QuantPolicy.load(args.fp8_policy)
+    except (OSError, ValueError) as e:
+        logging.error(f"FP8 policy: {e}")
+        sys.exit(1)
+
     print("\n=== GGUF & FP8 CONVERTER (CLI v7) ===")
     
     # 1. Files
@@ -206,6 +473,26 @@ def main():
     
     print(f"Selected: {selected_quants}")
 
+    scaled_fp8 = False
+    if any("FP8" in q for q in selected_quants):
+        scaled_fp8 = get_input("Write scaled FP8 (per-weight scale_weight, for *_scaled loader modes)? (y/n)",
+                               default="n").lower() == "y"
+
+    # Preflight: reject bad inputs from their headers before any heavy work
+    plans = plan_inputs(input_files, selected_quants, args.workers, args.max_inflight_mb, scaled_fp8, fp8_policy)
+    if args.plan:
+        for fpath, file_plans in plans.items():
+            for plan in file_plans: print_plan(plan)
+        return
+    for fpath, file_plans in plans.items():
+        errors = [e for plan in file_plans for e in plan["errors"]]
+        if errors:
+            logging.error(f"Skipping {os.path.basename(fpath)}: {'; '.join(errors)}")
+            input_files.remove(fpath)
+    if not input_files:
+        print("No usable files left. Exiting.")
+        return
+
     # 4. Upload
     do_upload = False
     repo_gguf = ""
@@ -246,124 +533,22 @@ def main():
 
     # --- START PROCESSING ---
     quant_cmd = "./llama-quantize" if os.path.exists("./llama-quantize") else "llama-quantize"
-    
-    for fpath in input_files:
-        model_base = os.path.basename(fpath)
-        name = re.sub(r'-(f16|F16|BF16|CONVERT|UnFixed|FIXED)$', '', os.path.splitext(model_base)[0], flags=re.IGNORECASE)
-        
-        out_dir = os.path.join(out_root, name) if use_subfolder else out_root
-        os.makedirs(out_dir, exist_ok=True)
-
-        logging.info(f"\n>>> PROCESSING MODEL: {name}")
-        generated_files = []
-
-        # --- FP8 ---
-        fp8_quants = [q for q in selected_quants if "FP8" in q]
-        for q in fp8_quants:
-            is_e5m2 = "E5M2" in q
-            is_all = "(All)" in q
-            dtype = "float8_e5m2" if is_e5m2 else "float8_e4m3fn"
-            suffix = "_All" if is_all else ""
-            
-            dst = os.path.join(out_dir, f"{name}-{q.split(' ')[0]}{suffix}.safetensors")
-            
-            if TORCH_AVAILABLE:
-                qzer = FP8Quantizer(dtype)
-                if qzer.convert_file(fpath, dst, unet_only=(not is_all)):
-                    generated_files.append(dst)
-            else:
-                logging.error("Torch missing. Skipping FP8.")
-
-        # --- GGUF ---
-        gguf_quants = [q for q in selected_quants if "FP8" not in q]
-        if gguf_quants:
-            gguf_src = None
-            dq = None
-
-            # Convert to GGUF Source
-            if fpath.endswith(".safetensors"):
-                curr = fpath
-                dq = os.path.join(out_dir, f"{name}-dequant.safetensors")
-                
-                if os.path.exists("dequantize_fp8v2.py"):
-                    logging.info("Dequantizing (FP8 check)...")
-                    subprocess.run([sys.executable, "dequantize_fp8v2.py", "--src", fpath, "--dst", dq, "--strip-fp8", "--dtype", "fp16"])
-                    if os.path.exists(dq): curr = dq
-                
-                conv = os.path.join(out_dir, f"{name}-CONVERT.gguf")
-                if not os.path.exists(conv):
-                    logging.info("Converting to GGUF F16...")
-                    subprocess.run([sys.executable, "convert.py", "--src", curr, "--dst", conv])
-                
-                if os.path.exists(conv): gguf_src = conv
-            
-            elif fpath.endswith(".gguf"):
-                gguf_src = fpath
-
-            # Run Quants
-            if gguf_src:
-                for q in gguf_quants:
-                    final_path = os.path.join(out_dir, f"{name}-{q}.gguf")
-                    
-                    if q in ["F16", "BF16"]:
-                        shutil.copy(gguf_src, final_path)
-                        generated_files.append(final_path)
-                        continue
-
-                    unfixed = os.path.join(out_dir, f"{name}-{q}-UnFixed.gguf")
-                    logging.info(f"Quantizing {q}...")
-                    subprocess.run([quant_cmd, gguf_src, unfixed, q])
-                    
-                    if os.path.exists(unfixed):
-                        # Fix Tensors
-                        fixes = glob.glob("fix_5d_tensors_*.safetensors")
-                        if fixes:
-                            logging.info("Applying Tensor Fix...")
-                            fixed = os.path.join(out_dir, f"{name}-{q}-FIXED.gguf")
-                            subprocess.run([sys.executable, "fix_5d_tensors.py", "--src", unfixed, "--dst", fixed, "--fix", fixes[0], "--overwrite"])
-                            if os.path.exists(fixed):
-                                os.rename(fixed, final_path)
-                                os.remove(unfixed)
-                            else:
-                                os.rename(unfixed, final_path)
-                        else:
-                            os.rename(unfixed, final_path)
-                        
-                        if os.path.exists(final_path): generated_files.append(final_path)
-            
-            # Cleanup Intermediates
-            if gguf_src and "CONVERT" in gguf_src and not keep_convert:
-                if os.path.exists(gguf_src): os.remove(gguf_src)
-            if dq and os.path.exists(dq) and not keep_dequant:
-                os.remove(dq)
-
-        # --- UPLOAD ---
-        if do_upload:
-            fp8s = [f for f in generated_files if "FP8" in f]
-            ggufs = [f for f in generated_files if "FP8" not in f]
-            
-            # Dest folder per model (append name)
-            d_f = f"{dest_folder_fp8}/{name}" if dest_folder_fp8 else name
-            d_g = f"{dest_folder_gguf}/{name}" if dest_folder_gguf else name
-
-            # If dest folder was explicitly root "/", we don't append name
-            if dest_folder_fp8 == "/": d_f = ""
-            if dest_folder_gguf == "/": d_g = ""
-
-            if fp8s and repo_fp8:
-                logging.info(f"Uploading FP8 to {repo_fp8} -> {d_f}")
-                uploader.main(repo_id=repo_fp8, local_paths_args=fp8s, dest_folder=d_f)
-            
-            if ggufs and repo_gguf:
-                logging.info(f"Uploading GGUF to {repo_gguf} -> {d_g}")
-                uploader.main(token=token, repo_id=repo_gguf, local_paths_args=ggufs, dest_folder=d_g)
-
-        # --- CLEANUP ---
-        if cleanup_mode:
-            logging.info("Cleaning up local generated files...")
-            for f in generated_files:
-                if os.path.exists(f): os.remove(f)
-
+    fp8_opts = dict(backend=args.fp8_backend, timing=args.timing, workers=args.workers, inflight_mb=args.max_inflight_mb,
+                    scaled=scaled_fp8, policy=fp8_policy, resume=args.resume, cache=cache, transcode=args.transcode_pt)
+    upload = dict(token=token, repo_fp8=repo_fp8, dest_fp8=dest_folder_fp8, repo_gguf=repo_gguf,
+                  dest_gguf=dest_folder_gguf, remote=RemoteFiles(token)) if do_upload else None
+
+    # Every model's steps go into one dependency graph; independent steps of different models
+    # (one's upload, another's quantization) overlap within the resource budgets
+    sched = Scheduler(disk_budget=int(args.disk_budget_gb * 2**30) if args.disk_budget_gb else None,
+                      on_state=lambda task, cell, state: logging.info(f">>> {cell[0]} | {cell[1]}: {state}"))
+    for i, fpath in enumerate(input_files):
+        add_model_tasks(sched, i, fpath, out_root=out_root, use_subfolder=use_subfolder, selected_quants=selected_quants,
+                        fp8_opts=fp8_opts, quant_cmd=quant_cmd, quant_jobs=args.quant_jobs, cache=cache, keep_dequant=keep_dequant,
+                        keep_convert=keep_convert, upload=upload, cleanup_mode=cleanup_mode)
+    sched.run()
+
+    if cache: logging.info(cache.summary())
     print("\n--- All Tasks Complete ---")
 
 if __name__ == "__main__":
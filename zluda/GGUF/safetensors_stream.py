@@ -0,0 +1,550 @@
+#!/usr/bin/env python
+"""safetensors_stream.py — header-level helpers for streaming .safetensors I/O
+
+* `read_header` parses only the JSON header; no tensor data is touched.
+* `StreamWriter` lays the output header out up front from the known
+  names / dtypes / shapes, then takes tensor payloads one at a time, so a
+  converter never has to hold more than one tensor in memory.
+* `copy_range` / `StreamWriter.copy_from` move raw byte ranges from a source
+  file into the output kernel-side (`copy_file_range` / `sendfile`) or via
+  `mmap` slices, for tensors that need no decoding at all.
+* `TensorReader` gives thread-safe random access to the tensors of a file
+  through one shared mapping, as torch tensors or (torch-free) NumPy arrays.
+* Sharded checkpoints (``*.safetensors.index.json``) are resolved with
+  `shard_paths`; `preallocate` + ``StreamWriter(span=...)`` let several
+  processes fill disjoint spans of one merged output file.
+* `write_variants` reads each tensor of a checkpoint once and fans it out to
+  several outputs with different layouts, optionally converting tensors on a
+  bounded thread pool.
+* ``StreamWriter(resume=...)`` journals finished tensors next to the
+  ``.partial`` file, so an interrupted conversion restarts where it stopped.
+"""
+
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import warnings
+
+from tensor_pool import ordered_map
+
+# Bytes per element for every dtype string the safetensors format defines
+DTYPE_SIZES = {
+    "BOOL": 1, "U8": 1, "I8": 1, "F8_E4M3": 1, "F8_E5M2": 1,
+    "I16": 2, "U16": 2, "F16": 2, "BF16": 2,
+    "I32": 4, "U32": 4, "F32": 4,
+    "I64": 8, "U64": 8, "F64": 8,
+}
+# safetensors dtype string → torch dtype attribute name
+TORCH_DTYPE_NAMES = {
+    "BOOL": "bool", "U8": "uint8", "I8": "int8", "F8_E4M3": "float8_e4m3fn", "F8_E5M2": "float8_e5m2",
+    "I16": "int16", "U16": "uint16", "F16": "float16", "BF16": "bfloat16",
+    "I32": "int32", "U32": "uint32", "F32": "float32",
+    "I64": "int64", "U64": "uint64", "F64": "float64",
+}
+
+_MAX_HEADER_BYTES = 100 * 1024 * 1024
+_COPY_CHUNK       = 64 * 1024 * 1024
+# Resumable writers make data durable and extend the journal after this many bytes
+_JOURNAL_SYNC_BYTES = 256 * 1024 * 1024
+
+# torch.frombuffer warns for every tensor taken from a read-only mapping; `TensorReader` never writes to them
+warnings.filterwarnings("ignore", message="The given buffer is not writable", category=UserWarning)
+
+
+def numpy_dtype(st_dtype: str):
+    """NumPy dtype for a safetensors dtype string; BF16 / F8 come from ml_dtypes."""
+    import numpy as np
+    name = TORCH_DTYPE_NAMES[st_dtype]  # NumPy and ml_dtypes use the same names
+    if name in ("bfloat16", "float8_e4m3fn", "float8_e5m2"):
+        import ml_dtypes
+        return np.dtype(getattr(ml_dtypes, name))
+    return np.dtype(name)
+
+
+def read_header(path: str) -> tuple[dict, dict, int]:
+    """Return ``(tensors, metadata, data_start)`` for the file at *path*.
+
+    *tensors* maps name → ``{"dtype", "shape", "data_offsets"}``; offsets are
+    relative to *data_start*, the first byte after the header.
+    """
+    with open(path, "rb") as f:
+        raw = f.read(8)
+        if len(raw) != 8:
+            raise ValueError(f"{path}: not a .safetensors file (truncated header)")
+        (n,) = struct.unpack("<Q", raw)
+        if n > _MAX_HEADER_BYTES:
+            raise ValueError(f"{path}: header length {n} is not plausible")
+        header = json.loads(f.read(n))
+    metadata = header.pop("__metadata__", None) or {}
+    return header, metadata, 8 + n
+
+
+def is_shard_index(path: str) -> bool:
+    return path.endswith(".index.json")
+
+
+def read_shard_index(path: str) -> dict[str, str]:
+    """Return ``{tensor name: absolute shard path}`` from a ``*.safetensors.index.json``."""
+    with open(path, "r", encoding="utf-8") as f:
+        weight_map = json.load(f)["weight_map"]
+    base = os.path.dirname(os.path.abspath(path))
+    return {name: os.path.join(base, shard) for name, shard in weight_map.items()}
+
+
+def shard_paths(path: str) -> list[str]:
+    """Files making up the checkpoint at *path*: its shards in index order, or just *path*."""
+    if not is_shard_index(path):
+        return [path]
+    return list(dict.fromkeys(read_shard_index(path).values()))
+
+
+def checkpoint_stem(fname: str) -> str:
+    """*fname* without its extension; a shard index loses the whole ``.safetensors.index.json``."""
+    for ext in (".safetensors.index.json", ".index.json"):
+        if fname.endswith(ext):
+            return fname[:-len(ext)]
+    return os.path.splitext(fname)[0]
+
+
+def write_shard_index(path: str, shard_layouts: dict) -> None:
+    """Write a ``*.safetensors.index.json`` for ``{shard path: layout}``; shards must sit next to *path*."""
+    weight_map = {}
+    total = 0
+    for shard, layout in shard_layouts.items():
+        for name, dtype, shape in layout:
+            weight_map[name] = os.path.basename(shard)
+            total += tensor_nbytes(dtype, shape)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"metadata": {"total_size": total}, "weight_map": weight_map}, f, indent=2)
+
+
+def tensor_nbytes(dtype: str, shape) -> int:
+    n = DTYPE_SIZES[dtype]
+    for dim in shape:
+        n *= dim
+    return n
+
+
+def tensor_bytes(t):
+    """Return a buffer over the raw bytes of torch tensor or NumPy array *t* (no copy when contiguous)."""
+    if not hasattr(t, "detach"):
+        import numpy as np
+        return np.ascontiguousarray(t).reshape(-1).view(np.uint8)
+    import torch
+    return t.detach().cpu().contiguous().reshape(-1).view(torch.uint8).numpy()
+
+
+def _write_all(fd: int, buf) -> None:
+    view = memoryview(buf).cast("B")
+    while view:
+        view = view[os.write(fd, view):]
+
+
+def copy_range(src_fd: int, dst_fd: int, offset: int, size: int) -> None:
+    """Copy *size* bytes at *offset* of *src_fd* to the current position of *dst_fd*."""
+    if hasattr(os, "copy_file_range"):
+        try:
+            while size:
+                n = os.copy_file_range(src_fd, dst_fd, size, offset)
+                if n == 0: break
+                offset += n; size -= n
+        except OSError:
+            pass  # e.g. EXDEV on older kernels; fall through with what is left
+    if size and sys.platform.startswith("linux"):
+        try:
+            while size:
+                n = os.sendfile(dst_fd, src_fd, offset, size)
+                if n == 0: break
+                offset += n; size -= n
+        except OSError:
+            pass
+    if size:
+        with mmap.mmap(src_fd, 0, access=mmap.ACCESS_READ) as mm:
+            view = memoryview(mm)
+            try:
+                end = offset + size
+                while offset < end:
+                    step = min(_COPY_CHUNK, end - offset)
+                    _write_all(dst_fd, view[offset:offset + step])
+                    offset += step
+            finally:
+                view.release()
+
+
+class TensorReader:
+    """Random access to the tensors of a .safetensors file through one shared mmap.
+
+    Unlike a ``safe_open`` handle, `get` may be called from several threads at
+    once. Returned tensors are views into a read-only mapping: nothing is read
+    until they are used and, unlike a copy-on-write mapping, it charges no
+    commit on Windows. They must not be written to; convert (``.to`` /
+    ``.clone``) first. `get_array` results are flagged read-only by NumPy.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.tensors, self.metadata, self.data_start = read_header(path)
+        self._f = open(path, "rb")
+        self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def fileno(self) -> int:
+        return self._f.fileno()
+
+    def get(self, name: str):
+        import torch
+        info = self.tensors[name]
+        dtype = getattr(torch, TORCH_DTYPE_NAMES[info["dtype"]])
+        begin, end = info["data_offsets"]
+        if end == begin:
+            return torch.empty(info["shape"], dtype=dtype)
+        count = (end - begin) // DTYPE_SIZES[info["dtype"]]
+        return torch.frombuffer(self._mm, dtype=dtype, count=count, offset=self.data_start + begin).reshape(info["shape"])
+
+    def get_array(self, name: str):
+        """Like `get`, but a NumPy array over the mapping; never imports torch."""
+        import numpy as np
+        info = self.tensors[name]
+        dtype = numpy_dtype(info["dtype"])
+        begin, end = info["data_offsets"]
+        return np.frombuffer(self._mm, dtype=dtype, count=(end - begin) // dtype.itemsize,
+                             offset=self.data_start + begin).reshape(info["shape"])
+
+    def close(self) -> None:
+        try: self._mm.close()
+        except BufferError: pass  # tensors still alive; the mapping goes away with them
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def _plan(layout, metadata: dict | None) -> tuple[bytes, list[tuple[str, int]], int]:
+    """Return ``(header bytes incl. length prefix, [(name, size)], data size)`` for *layout*."""
+    header = {}
+    order = []
+    offset = 0
+    for name, dtype, shape in layout:
+        size = tensor_nbytes(dtype, shape)
+        header[name] = {"dtype": dtype, "shape": list(shape), "data_offsets": [offset, offset + size]}
+        order.append((name, size))
+        offset += size
+    if metadata:
+        header["__metadata__"] = {str(k): str(v) for k, v in metadata.items()}
+
+    blob = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    blob += b" " * (-len(blob) % 8)
+    return struct.pack("<Q", len(blob)) + blob, order, offset
+
+
+def planned_size(layout, metadata: dict | None = None) -> int:
+    """Exact size in bytes of the file a `StreamWriter` builds for *layout*."""
+    head, _, data_size = _plan(layout, metadata)
+    return len(head) + data_size
+
+
+def preallocate(path: str, layout, metadata: dict | None = None) -> None:
+    """Write the header of *layout* to ``<path>.partial`` and size the file for all of its data.
+
+    Writers created with ``StreamWriter(path, layout, metadata, span=...)`` then
+    fill it; `finalize` renames it into place once every span is done.
+    """
+    head, _, data_size = _plan(layout, metadata)
+    with open(path + ".partial", "wb") as f:
+        f.write(head)
+        f.truncate(len(head) + data_size)
+
+
+def finalize(path: str) -> None:
+    os.replace(path + ".partial", path)
+
+
+def discard_partial(path: str) -> None:
+    for suffix in (".partial", ".journal"):
+        try: os.remove(path + suffix)
+        except OSError: pass
+
+
+class StreamWriter:
+    """Incrementally build a .safetensors file from an up-front *layout*.
+
+    *layout* is an ordered list of ``(name, dtype, shape)``; tensors must then be
+    passed to `write` in that same order. Data goes to ``<path>.partial`` and is
+    only renamed to *path* by `close`, so an interrupted run never leaves a
+    half-written file under the final name.
+
+    With *span* = ``(start, stop)`` the writer only fills layout entries
+    ``start:stop`` of a file set up by `preallocate`; `close` then leaves the
+    file for the coordinator to `finalize`.
+
+    With *resume* (a JSON-able fingerprint of the source and parameters), the
+    names of finished tensors are journaled to ``<path>.journal``; `abort`
+    keeps the ``.partial`` file, and a later writer with the same layout and
+    fingerprint continues after the last journaled tensor (see `resumed`).
+    """
+
+    def __init__(self, path: str, layout, metadata: dict | None = None, *, span: tuple[int, int] | None = None,
+                 resume: dict | None = None):
+        if span is not None and resume is not None:
+            raise ValueError("A span writer can't be resumable")
+        self.path = path
+        self.tmp_path = path + ".partial"
+        self.journal_path = path + ".journal"
+        self.span = span
+        self.resumed = 0
+
+        head, self._order, data_size = _plan(layout, metadata)
+        self.data_start = len(head)
+        self.total_size = self.data_start + data_size
+        self._journal = None
+        self._pending, self._pending_bytes = [], 0
+
+        # Unbuffered, so raw fd copies and Python writes can be interleaved safely
+        if span is None:
+            self._next, self._stop = 0, len(self._order)
+            done = None
+            if resume is not None:
+                self._key = hashlib.sha256(head + json.dumps(resume, sort_keys=True).encode()).hexdigest()
+                done = self._journaled()
+            if done is None:
+                self._f = open(self.tmp_path, "wb", buffering=0)
+                _write_all(self._f.fileno(), head)
+                if resume is not None:
+                    self._rewrite_journal(0)
+            else:
+                self._f = open(self.tmp_path, "r+b", buffering=0)
+                self.restart_at(done)
+        else:
+            self._next, self._stop = span
+            self._f = open(self.tmp_path, "r+b", buffering=0)
+            self._f.seek(self.data_start + sum(size for _, size in self._order[:self._next]))
+
+    @property
+    def next_name(self) -> str | None:
+        """Name of the tensor the writer expects next, None once the layout is complete."""
+        return self._order[self._next][0] if self._next < self._stop else None
+
+    # --------- resume journal ---------
+
+    def _journaled(self) -> int | None:
+        """Number of finished tensors recorded for this exact layout + fingerprint, None if unusable."""
+        try:
+            with open(self.journal_path, encoding="utf-8") as f:
+                lines = f.read().split("\n")
+            if json.loads(lines[0]).get("key") != self._key:
+                return None
+            done = 0
+            for line in lines[1:]:
+                # A torn last line (crash mid-append) just ends the usable prefix
+                if done >= len(self._order) or not line or json.loads(line) != self._order[done][0]:
+                    break
+                done += 1
+            size = os.path.getsize(self.tmp_path)
+        except (OSError, ValueError, IndexError, AttributeError):
+            return None
+        return done if size >= self.data_start + sum(n for _, n in self._order[:done]) else None
+
+    def _rewrite_journal(self, done: int) -> None:
+        if self._journal: self._journal.close()
+        with open(self.journal_path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(json.dumps({"key": self._key}) + "\n")
+            f.writelines(json.dumps(name) + "\n" for name, _ in self._order[:done])
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(self.journal_path + ".tmp", self.journal_path)
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+
+    def restart_at(self, index: int) -> None:
+        """Continue a resumed file at layout entry *index*; entries before it are kept as written."""
+        self._next = self.resumed = index
+        self._f.seek(self.data_start + sum(size for _, size in self._order[:index]))
+        self._rewrite_journal(index)
+
+    def _record(self, name: str, size: int) -> None:
+        self._next += 1
+        if self._journal is None:
+            return
+        self._pending.append(name)
+        self._pending_bytes += size
+        if self._pending_bytes >= _JOURNAL_SYNC_BYTES:
+            self._sync_journal()
+
+    def _sync_journal(self) -> None:
+        # Data first, then the names that vouch for it
+        if not self._pending: return
+        os.fsync(self._f.fileno())
+        self._journal.writelines(json.dumps(name) + "\n" for name in self._pending)
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+        self._pending, self._pending_bytes = [], 0
+
+    def _expect(self, name: str) -> int:
+        if self._next >= self._stop:
+            raise ValueError(f"Unexpected tensor '{name}': layout is already complete")
+        expected, size = self._order[self._next]
+        if name != expected:
+            raise ValueError(f"Out-of-order write: got '{name}', expected '{expected}'")
+        return size
+
+    def write(self, name: str, data) -> None:
+        """Append *data* (a torch tensor, NumPy array or any bytes-like object) as tensor *name*."""
+        size = self._expect(name)
+        buf = tensor_bytes(data) if hasattr(data, "dtype") else data
+        n = memoryview(buf).nbytes
+        if n != size:
+            raise ValueError(f"'{name}': {n} bytes written, layout expects {size}")
+        _write_all(self._f.fileno(), buf)
+        self._record(name, size)
+
+    def copy_from(self, name: str, src_fd: int, offset: int, size: int) -> None:
+        """Append tensor *name* by copying *size* raw bytes at *offset* of *src_fd*."""
+        if size != self._expect(name):
+            raise ValueError(f"'{name}': source range is {size} bytes, layout expects {self._order[self._next][1]}")
+        copy_range(src_fd, self._f.fileno(), offset, size)
+        self._record(name, size)
+
+    def close(self) -> None:
+        if self._next != self._stop:
+            missing = self._stop - self._next
+            self.abort()
+            raise ValueError(f"{self.path}: {missing} tensor(s) were never written")
+        self._f.close()
+        if self._journal:
+            self._journal.close()
+            self._journal, self._pending = None, []
+            os.remove(self.journal_path)
+        if self.span is None:
+            finalize(self.path)
+
+    def abort(self) -> None:
+        """Stop writing; the ``.partial`` file is deleted, or kept for a later resume."""
+        if self._journal:
+            try: self._sync_journal()
+            finally:
+                self._f.close()
+                self._journal.close()
+            return
+        self._f.close()
+        if self.span is None:
+            discard_partial(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None: self.close()
+        else: self.abort()
+        return False
+
+
+def write_variants(src: str, layouts: dict, convert, *, convert_dtypes=(), should_stop=None, progress=None,
+                   workers: int = 1, budget_bytes: int = 0, derived=None, arrays: bool = False,
+                   resume: dict | None = None) -> bool:
+    """Build several outputs from checkpoint *src* while reading each tensor once.
+
+    *layouts* maps each output path to ``[(shard path, name, dtype, shape)]`` in
+    source order. Per tensor, *convert(name, tensor, dtypes)* is called once
+    with every output dtype that needs decoding and returns ``{dtype: tensor}``;
+    outputs that keep the source dtype get its raw bytes, unless that dtype is
+    in *convert_dtypes*. Returns False (leaving no outputs behind) when
+    *should_stop* returns true; *progress(i, total)* is called per tensor.
+
+    With *workers* > 1, *convert* runs on that many threads via
+    `tensor_pool.ordered_map`: outputs are still written in source order and
+    *budget_bytes* caps the source + converted bytes held by tensors in flight.
+
+    Layout entries with a shard path of None have no source tensor (e.g. the
+    ``scale_weight`` tensors of a scaled-FP8 output); they are written from
+    *derived(dst, name)* as soon as the output reaches them, so they should
+    follow the source tensor they are computed from.
+    With *arrays*, *convert* gets NumPy arrays instead of torch tensors.
+
+    With *resume* (a JSON-able fingerprint of the conversion parameters), the
+    outputs are resumable `StreamWriter`s keyed on it and on the size and mtime
+    of every source shard: a stop or crash keeps their ``.partial`` files and
+    a rerun only converts the tensors that were not finished.
+    """
+    readers = {path: TensorReader(path) for path in shard_paths(src)}
+    if resume is not None:
+        resume = {"params": resume, "sources": [[os.path.abspath(p), os.path.getsize(p), os.stat(p).st_mtime_ns]
+                                                for p in readers]}
+    writers = {}
+    try:
+        wanted = {}
+        for dst, layout in layouts.items():
+            w = writers[dst] = StreamWriter(dst, [(name, dtype, shape) for _, name, dtype, shape in layout],
+                                            resume=resume)
+            if w.resumed:
+                # Derived tensors come from their source tensor's conversion, so redo that one
+                start = w.resumed
+                while start < len(layout) and start > 0 and layout[start][0] is None:
+                    start -= 1
+                if start != w.resumed:
+                    w.restart_at(start)
+                logging.info(f"Resuming {os.path.basename(dst)} at tensor {start + 1}/{len(layout)}")
+            for path, name, dtype, _ in layout[w.resumed:]:
+                if path is None:
+                    continue
+                wanted.setdefault((path, name), []).append((w, dtype))
+        derived_names = {dst: {name for path, name, _, _ in layout if path is None} for dst, layout in layouts.items()}
+
+        def flush_derived(dst):
+            w = writers[dst]
+            while w.next_name in derived_names[dst]:
+                w.write(w.next_name, derived(dst, w.next_name))
+
+        def needed(key):
+            info = readers[key[0]].tensors[key[1]]
+            return list(dict.fromkeys(d for _, d in wanted[key] if d != info["dtype"] or d in convert_dtypes))
+
+        def load(key):
+            need = needed(key)
+            if not need:
+                return {}
+            r = readers[key[0]]
+            return convert(key[1], r.get_array(key[1]) if arrays else r.get(key[1]), need)
+
+        def cost(key):
+            need = needed(key)
+            if not need:
+                return 0
+            info = readers[key[0]].tensors[key[1]]
+            return tensor_nbytes(info["dtype"], info["shape"]) + sum(tensor_nbytes(d, info["shape"]) for d in need)
+
+        # Every layout is in source order, so walking the source in order feeds each writer in its own order
+        order = [(path, name) for path, r in readers.items() for name in r.tensors if (path, name) in wanted]
+        results = ordered_map(load, order, workers=workers, cost=cost, budget_bytes=budget_bytes)
+        try:
+            for i, ((path, name), outs) in enumerate(results):
+                if should_stop and should_stop():
+                    for w in writers.values(): w.abort()
+                    return False
+                if progress: progress(i, len(order))
+                r = readers[path]
+                info = r.tensors[name]
+                for w, dtype in wanted[(path, name)]:
+                    if dtype in outs:
+                        w.write(name, outs[dtype])
+                    else:
+                        begin, end = info["data_offsets"]
+                        w.copy_from(name, r.fileno(), r.data_start + begin, end - begin)
+                    flush_derived(w.path)
+                del outs
+        finally:
+            results.close()  # waits for in-flight workers before the readers go away
+        for dst, w in writers.items():
+            flush_derived(dst)
+            w.close()
+        return True
+    except BaseException:
+        for w in writers.values(): w.abort()
+        raise
+    finally:
+        for r in readers.values(): r.close()
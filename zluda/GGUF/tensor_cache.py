@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+"""tensor_cache.py — content-addressed on-disk cache for converted tensors
+
+Re-running a model with another set of targets, or re-releasing a finetune
+where most tensors are unchanged, used to dequantize / quantize every tensor
+again. `TensorCache` stores each converted tensor's raw bytes under a key
+made of the hash of the source tensor's raw bytes plus everything that
+decides the result (operation, dtypes, shape, scale mode, kernel), so a
+tensor is only converted again when its bytes or the parameters changed.
+
+Entries are plain files written atomically (temp file + rename), so several
+threads or worker processes may share one cache directory. A file's mtime is
+its last use; once the cache grows past its size limit the least recently
+used entries are evicted down to 90% of it.
+
+    python tensor_cache.py --dir D:/tensor-cache            # entries and size
+    python tensor_cache.py --dir D:/tensor-cache --clear    # delete every entry
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+DEFAULT_CACHE_GB = 50
+# Eviction frees space down to this fraction of the limit, so it doesn't run on every store
+_EVICT_TO = 0.9
+
+
+def source_digest(buf) -> str:
+    """Hash of the raw bytes of a source tensor (anything exposing the buffer protocol)."""
+    return hashlib.blake2b(memoryview(buf).cast("B"), digest_size=32).hexdigest()
+
+
+class TensorCache:
+    """Size-bounded LRU cache of tensor bytes in directory *root*; thread-safe."""
+
+    def __init__(self, root: str, max_gb: float = DEFAULT_CACHE_GB):
+        self.root = root
+        self.max_bytes = int(max_gb * 2**30)
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._size = None  # scanned on the first store
+        self.hits = self.misses = self.evictions = 0
+        self.bytes_hit = self.bytes_stored = 0
+
+    @staticmethod
+    def key(digest: str, **params) -> str:
+        """Cache key for the source tensor with *digest* converted with *params* (JSON-able)."""
+        return hashlib.blake2b((digest + json.dumps(params, sort_keys=True)).encode(), digest_size=20).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+
+    def get(self, key: str) -> bytearray | None:
+        """The stored bytes for *key*, or None on a miss."""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = bytearray(os.fstat(f.fileno()).st_size)
+                f.readinto(data)
+            os.utime(path)
+        except OSError:
+            with self._lock: self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+            self.bytes_hit += len(data)
+        return data
+
+    def put(self, key: str, *parts) -> None:
+        """Store the concatenation of the buffers *parts* under *key*; failures only skip the store."""
+        views = [memoryview(p).cast("B") for p in parts]
+        size = sum(v.nbytes for v in views)
+        path = self._path(key)
+        if size > self.max_bytes or os.path.exists(path):
+            return
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    for v in views: f.write(v)
+                os.replace(tmp, path)
+            except BaseException:
+                os.remove(tmp)
+                raise
+        except OSError:
+            return  # a full or read-only cache disk must not fail the conversion
+        with self._lock:
+            self.bytes_stored += size
+            self._size = self._scan_size() if self._size is None else self._size + size
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _entries(self) -> list[tuple[float, int, str]]:
+        entries = []
+        for sub in os.scandir(self.root):
+            if not sub.is_dir(): continue
+            for e in os.scandir(sub.path):
+                if e.is_file() and not e.name.endswith(".tmp"):
+                    st = e.stat()
+                    entries.append((st.st_mtime, st.st_size, e.path))
+        return entries
+
+    def _scan_size(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self) -> None:
+        for _, size, path in sorted(self._entries()):
+            if self._size <= self.max_bytes * _EVICT_TO:
+                break
+            try: os.remove(path)
+            except OSError: continue
+            self._size -= size
+            self.evictions += 1
+
+    def clear(self) -> int:
+        """Delete every entry; returns how many were removed."""
+        n = 0
+        with self._lock:
+            for _, _, path in self._entries():
+                try: os.remove(path); n += 1
+                except OSError: pass
+            self._size = 0
+        return n
+
+    # --------- statistics ---------
+
+    def counters(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "bytes_hit": self.bytes_hit, "bytes_stored": self.bytes_stored}
+
+    def merge(self, counters: dict) -> None:
+        """Add the `counters` of a cache used in another process."""
+        with self._lock:
+            for k, v in counters.items():
+                setattr(self, k, getattr(self, k) + v)
+            self._size = None
+
+    def summary(self) -> str:
+        lookups = self.hits + self.misses
+        rate = f" ({self.hits / lookups:.0%})" if lookups else ""
+        return (f"Tensor cache: {self.hits} hit(s){rate} / {self.misses} miss(es), "
+                f"{self.bytes_hit / 2**30:.2f} GiB reused, {self.bytes_stored / 2**30:.2f} GiB stored, "
+                f"{self.evictions} evicted")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Inspect or clear a tensor cache directory")
+    ap.add_argument("--dir", required=True, help="Cache directory")
+    ap.add_argument("--clear", action="store_true", help="Delete every cached tensor")
+    args = ap.parse_args()
+
+    cache = TensorCache(args.dir)
+    if args.clear:
+        print(f"Removed {cache.clear()} cached tensor(s)")
+        return
+    entries = cache._entries()
+    print(f"{len(entries)} cached tensor(s), {sum(size for _, size, _ in entries) / 2**30:.2f} GiB in {args.dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+"""tensor_pool.py — bounded, order-preserving thread pool for per-tensor work
+
+Torch kernels release the GIL, so converting independent tensors on a few
+threads keeps more cores busy. `ordered_map` hands results back strictly in
+input order (so output files stay deterministic) and only admits new work
+while the bytes held by in-flight items stay under a budget, so parallelism
+can't bring back the whole-model memory peak.
+"""
+
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+_END = object()
+
+
+def ordered_map(fn, items, *, workers: int = 1, cost=None, budget_bytes: int = 0):
+    """Yield ``(item, fn(item))`` for every item, in input order.
+
+    *cost(item)* is the number of bytes an item holds from submission until the
+    consumer has taken its result; with *budget_bytes* set, new items are only
+    submitted while the sum for in-flight items stays within it. An item larger
+    than the whole budget still runs, alone.
+    """
+    if workers <= 1:
+        for item in items:
+            yield item, fn(item)
+        return
+
+    pending = deque()
+    in_flight = 0
+    it = iter(items)
+    nxt = next(it, _END)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        try:
+            while nxt is not _END or pending:
+                while nxt is not _END and len(pending) < 2 * workers:
+                    c = cost(nxt) if cost else 0
+                    if pending and budget_bytes and in_flight + c > budget_bytes:
+                        break
+                    pending.append((nxt, c, pool.submit(fn, nxt)))
+                    in_flight += c
+                    nxt = next(it, _END)
+
+                item, c, fut = pending.popleft()
+                result = fut.result()
+                yield item, result
+                del result
+                in_flight -= c
+        finally:
+            for _, _, fut in pending:
+                fut.cancel()
+
+
+def intra_op_threads(workers: int) -> int:
+    """Torch intra-op threads per worker so *workers* threads don't oversubscribe the CPU."""
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
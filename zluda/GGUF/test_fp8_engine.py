@@ -0,0 +1,14 @@
+"""Backend parity of fp8_engine: every kernel must write the same FP8 bytes."""
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("ml_dtypes")
+pytest.importorskip("torch")
+
+import fp8_engine
+
+
+@pytest.mark.parametrize("st", ["F16", "BF16", "F32"])
+def test_backends_agree(st):
+    assert fp8_engine.parity(numel=1 << 16, dtypes=(st,), tile_mb=1)